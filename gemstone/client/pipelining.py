@@ -0,0 +1,275 @@
+"""
+Base class for the transports that pipeline the JSON RPC requests over persistent
+connections (see :py:mod:`gemstone.client.websocket` and :py:mod:`gemstone.client.tcp`).
+
+.. versionadded:: 0.13.0
+"""
+
+import abc
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import threading
+
+from tornado.gen import coroutine
+from tornado.ioloop import IOLoop
+
+from gemstone.errors import CalledServiceError
+
+__all__ = [
+    'PipelinedTransport'
+]
+
+
+class PipelinedTransport(abc.ABC):
+    """
+    Sends JSON RPC requests over a pool of persistent connections. The requests are
+    pipelined: any number of them can be in flight at the same time on every connection and
+    the responses, that the service sends in the order of completion, are matched by ``id``.
+    The ids of the calls are replaced on the wire with ids that are unique for the transport,
+    so the calls from different threads can not be confused.
+
+    The connections are handled by an IOLoop running in a background thread. They are opened
+    on demand (the requests are distributed round robin between them) and reopened after
+    they are lost (the requests in flight on a lost connection fail with
+    :py:class:`gemstone.errors.CalledServiceError`).
+
+    The errors are matched by the ids of the calls too. A response that can not be associated
+    with a request (for example the error for a message the service could not decode) fails
+    all the requests in flight on the connection, that is then closed.
+
+    The subclasses implement :py:meth:`open_connection`, :py:meth:`write` and
+    :py:meth:`close_connection`.
+
+    :param url: the URL of the endpoint
+    :param codec: the :py:class:`gemstone.codecs.BaseCodec` instance used for the payloads
+    :param max_connections: the number of connections of the pool
+    :param connect_timeout: how many seconds to wait for a connection to be established
+    """
+
+    def __init__(self, url, codec, max_connections=1, connect_timeout=None):
+        if max_connections <= 0:
+            raise ValueError("max_connections must be a positive number")
+
+        self.url = url
+        self.codec = codec
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+
+        self._io_loop = None
+        self._lock = threading.Lock()
+        self._connections = [None] * max_connections
+        self._next_connection = itertools.count()
+        self._ids = itertools.count(1)
+        # connection -> {wire id of the request: (future, {wire id: original id}, is batch)}
+        self._pending = {}
+        # wire id of a batch item -> wire id of the batch
+        self._batch_ids = {}
+
+    def send(self, body):
+        """
+        Sends a request. Can be called from any thread.
+
+        :param body: a ``dict`` (single request) or a ``list`` (batch request)
+        :return: a :py:class:`concurrent.futures.Future` that resolves to the response
+                 (``None`` for the notifications)
+        """
+        future = concurrent.futures.Future()
+        self._get_io_loop().add_callback(self._send, body, future)
+        return future
+
+    def close(self):
+        """
+        Closes the connections and stops the background IOLoop.
+        """
+        with self._lock:
+            io_loop, self._io_loop = self._io_loop, None
+        if io_loop is not None:
+            io_loop.add_callback(self._close, io_loop)
+
+    # region Implemented by the subclasses
+
+    @abc.abstractmethod
+    @coroutine
+    def open_connection(self):
+        """
+        Opens a connection. Every message received on it must be passed to
+        :py:meth:`on_message` and its closing must be reported with
+        :py:meth:`on_connection_closed`.
+
+        :return: the connection
+        """
+        pass
+
+    @abc.abstractmethod
+    @coroutine
+    def write(self, connection, data):
+        """
+        Sends a payload over a connection.
+
+        :param connection: a connection returned by :py:meth:`open_connection`
+        :param data: the serialized request (``bytes``)
+        """
+        pass
+
+    @abc.abstractmethod
+    def close_connection(self, connection):
+        """
+        :param connection: a connection returned by :py:meth:`open_connection`
+        """
+        pass
+
+    # endregion
+
+    def on_message(self, connection, message):
+        """
+        Handles a message received on a connection.
+
+        :param connection: the connection
+        :param message: the serialized response
+        """
+        try:
+            response = self.codec.loads(message)
+        except Exception:
+            response = None
+
+        pending = self._pending.get(connection, {})
+        if isinstance(response, list):
+            wire_ids = [item.get("id") for item in response if isinstance(item, dict)]
+            key = next((self._batch_ids[wire_id] for wire_id in wire_ids
+                        if wire_id in self._batch_ids), None)
+        elif isinstance(response, dict):
+            key = response.get("id")
+        else:
+            key = None
+
+        if key is None:
+            if pending:
+                # the request it belongs to can not be known, no response on this
+                # connection can be trusted
+                error = response.get("error") if isinstance(response, dict) else response
+                self._fail_connection(connection, CalledServiceError(
+                    "Unexpected response from the service: {!r}".format(error)))
+                self.close_connection(connection)
+            return
+        elif key not in pending:
+            return
+
+        future, ids, _ = self._resolve(connection, key)
+        if isinstance(response, list):
+            response = [_restore_id(item, ids) for item in response]
+        else:
+            response = _restore_id(response, ids)
+        if not future.done():
+            future.set_result(response)
+
+    def on_connection_closed(self, connection):
+        """
+        Fails the requests in flight on a lost connection.
+
+        :param connection: the connection
+        """
+        self._fail_connection(connection, CalledServiceError("The connection was closed"))
+
+    def _fail_connection(self, connection, error):
+        self._connections = [None if slot is not None and slot.done() and
+                             not slot.exception() and slot.result() is connection else slot
+                             for slot in self._connections]
+        for key in list(self._pending.get(connection, {})):
+            future = self._resolve(connection, key)[0]
+            if not future.done():
+                future.set_exception(error)
+        self._pending.pop(connection, None)
+
+    def _get_io_loop(self):
+        with self._lock:
+            if self._io_loop is None:
+                started = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(asyncio.new_event_loop())
+                    self._io_loop = IOLoop.current()
+                    started.set()
+                    self._io_loop.start()
+
+                threading.Thread(target=run, name="gemstone-transport", daemon=True).start()
+                started.wait()
+            return self._io_loop
+
+    @coroutine
+    def _send(self, body, future):
+        if not future.set_running_or_notify_cancel():
+            return
+
+        body, key, ids, is_batch = self._assign_ids(body)
+        connection = None
+        try:
+            connection = yield self._get_connection()
+            if key is not None:
+                self._pending.setdefault(connection, collections.OrderedDict())[key] = \
+                    (future, ids, is_batch)
+                for wire_id in ids if is_batch else ():
+                    self._batch_ids[wire_id] = key
+            yield self.write(connection, self.codec.dumps(body))
+        except Exception as e:
+            if key in self._pending.get(connection, {}):
+                self._resolve(connection, key)
+            if not future.done():
+                future.set_exception(CalledServiceError(e))
+            return
+
+        if key is None:
+            # only notifications, no response is sent
+            future.set_result(None)
+
+    def _assign_ids(self, body):
+        if isinstance(body, dict):
+            if body.get("id") is None:
+                return body, None, {}, False
+            wire_id = next(self._ids)
+            return dict(body, id=wire_id), wire_id, {wire_id: body["id"]}, False
+
+        items = []
+        ids = {}
+        for item in body:
+            if isinstance(item, dict) and item.get("id") is not None:
+                wire_id = next(self._ids)
+                ids[wire_id] = item["id"]
+                item = dict(item, id=wire_id)
+            items.append(item)
+        return items, min(ids) if ids else None, ids, True
+
+    @coroutine
+    def _get_connection(self):
+        index = next(self._next_connection) % self.max_connections
+        if self._connections[index] is None:
+            self._connections[index] = self.open_connection()
+        slot = self._connections[index]
+        try:
+            connection = yield slot
+        except Exception:
+            if self._connections[index] is slot:
+                self._connections[index] = None
+            raise
+        return connection
+
+    def _resolve(self, connection, key):
+        future, ids, is_batch = self._pending[connection].pop(key)
+        if is_batch:
+            for wire_id in ids:
+                self._batch_ids.pop(wire_id, None)
+        return future, ids, is_batch
+
+    def _close(self, io_loop):
+        for slot in self._connections:
+            if slot is not None and slot.done() and not slot.exception():
+                self.close_connection(slot.result())
+        self._connections = [None] * self.max_connections
+        io_loop.stop()
+
+
+def _restore_id(item, ids):
+    if isinstance(item, dict) and item.get("id") in ids:
+        item = dict(item, id=ids[item["id"]])
+    return item
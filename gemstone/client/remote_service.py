@@ -1,25 +1,105 @@
+import concurrent.futures
+import urllib.parse
 import urllib.request
 import os
+import socket
 
 from multiprocessing.pool import ThreadPool
-import simplejson as json
 
+from gemstone.codecs import JsonCodec, MsgPackCodec, get_default_codec, msgpack
+from gemstone.compression import GzipCompressor, get_available_compressors, get_compressor
+from gemstone.deadlines import TIMEOUT_HEADER, get_remaining_time, bind_context
+from gemstone.client.unix import UNIX_SCHEME, unix_opener
+from gemstone.client.websocket import WEBSOCKET_SCHEMES, WebSocketTransport
+from gemstone.client.tcp import TCP_SCHEME, TcpTransport
 from gemstone.client.structs import MethodCall, Notification, Result, BatchResult, AsyncMethodCall
-from gemstone.errors import CalledServiceError
+from gemstone.errors import CalledServiceError, DeadlineExceededError
 
 
 class RemoteService(object):
     RESPONSE_CODES = {
         -32001: "access_denied",
+        -32002: "batch_too_large",
+        -32003: "server_overloaded",
+        -32004: "rate_limited",
+        -32005: "deadline_exceeded",
         -32603: "internal_error",
         -32601: "method_not_found",
         -32602: "invalid_params"
     }
 
-    def __init__(self, service_endpoint, *, authentication_method=None):
+    def __init__(self, service_endpoint, *, authentication_method=None, codec=None,
+                 timeout=None, prefer_msgpack=False, compression=True,
+                 compress_requests=False, compression_min_size=1024):
+        """
+        Client for a remote microservice.
+
+        :param service_endpoint: the URL of the JSON RPC endpoint of the remote service.
+                                 The services that run on the same host can be called
+                                 over their Unix domain socket with a ``unix://`` URL (see
+                                 :py:mod:`gemstone.client.unix`). With a ``ws://`` or
+                                 ``wss://`` URL, the calls are pipelined over a single
+                                 persistent WebSocket connection (see
+                                 :py:class:`gemstone.client.websocket.WebSocketTransport`).
+                                 With a ``tcp://host:port`` URL, the calls are pipelined
+                                 over a pool of raw TCP connections (see
+                                 :py:class:`gemstone.client.tcp.TcpTransport`).
+        :param authentication_method: reserved for future use.
+        :param codec: a :py:class:`gemstone.codecs.BaseCodec` instance used to encode the
+                      requests and decode the responses. Defaults to the fastest available
+                      JSON codec.
+        :param timeout: how many seconds to wait for the responses. The timeout is sent to the
+                        remote service, that drops the calls it can not complete in time. When
+                        the client is used while handling a call that has a deadline (see
+                        :py:mod:`gemstone.deadlines`), the remaining time is used if it is
+                        shorter.
+        :param prefer_msgpack: if ``True`` and no ``codec`` is given, the requests are sent
+                               and the responses are requested as ``application/msgpack``
+                               (:py:class:`gemstone.codecs.MsgPackCodec`), so that the
+                               ``bytes`` parameters and results are sent without any
+                               encoding. Falls back to JSON if ``msgpack`` is not installed
+                               and for the ``ws://``, ``wss://`` and ``tcp://`` endpoints.
+                               The JSON responses (for example from the services that do not
+                               accept MessagePack) are still decoded.
+        :param compression: if ``True``, the HTTP responses are requested compressed (with
+                            the encodings of
+                            :py:func:`gemstone.compression.get_available_compressors`)
+        :param compress_requests: if ``True``, the large requests are compressed with
+                                  ``gzip``. Only for the services that support compressed
+                                  requests (0.13.0 or newer), the older ones reject them.
+        :param compression_min_size: the requests smaller than this many bytes are sent
+                                     uncompressed
+
+        .. versionchanged:: 0.13.0
+            Added the ``codec``, ``timeout``, ``prefer_msgpack``, ``compression``,
+            ``compress_requests`` and ``compression_min_size`` parameters and the
+            ``unix://``, ``ws://``, ``wss://`` and ``tcp://`` endpoints
+        """
         self.url = service_endpoint
         self.authentication_method = authentication_method
+        scheme = urllib.parse.urlsplit(service_endpoint).scheme
+        if codec is None:
+            # the persistent connections use the codec of the service, there is no negotiation
+            if prefer_msgpack and msgpack and scheme not in WEBSOCKET_SCHEMES + (TCP_SCHEME,):
+                codec = MsgPackCodec()
+            else:
+                codec = get_default_codec()
+        self.codec = codec
+        self.timeout = timeout
+        #: the encodings accepted for the responses, an empty list if the compression is
+        #: disabled
+        self.compressors = get_available_compressors() if compression else []
+        #: the encoding of the large requests, ``None`` if they are not compressed
+        self.request_compressor = GzipCompressor() if compress_requests else None
+        self.compression_min_size = compression_min_size
         self._thread_pool = None
+        #: the :py:class:`gemstone.client.pipelining.PipelinedTransport` used for the URLs
+        #: of the persistent connections, ``None`` for the HTTP URLs
+        self.transport = None
+        if scheme in WEBSOCKET_SCHEMES:
+            self.transport = WebSocketTransport(service_endpoint, self.codec)
+        elif scheme == TCP_SCHEME:
+            self.transport = TcpTransport(service_endpoint, self.codec)
 
     def _get_thread_pool(self):
         # lazily initialized
@@ -41,17 +121,17 @@ class RemoteService(object):
         req_id = request_object.id
 
         request_body = self.build_request_body(method_name, params, id=req_id)
-        http_request = self.build_http_request_obj(request_body)
+        if self.transport is not None:
+            response_body = self.send_pipelined_request(request_body)
+            return response_body if req_id else None
 
-        try:
-            response = urllib.request.urlopen(http_request)
-        except urllib.request.HTTPError as e:
-            raise CalledServiceError(e)
+        http_request = self.build_http_request_obj(request_body)
+        response = self.open_http_request(http_request)
 
         if not req_id:
             return
 
-        response_body = json.loads(response.read().decode())
+        response_body = self.get_response_codec(response).loads(self.read_response(response))
         return response_body
 
     def build_request_body(self, method_name, params, id=None):
@@ -67,12 +147,140 @@ class RemoteService(object):
 
     def build_http_request_obj(self, request_body):
         request = urllib.request.Request(self.url)
-        request.add_header("Content-Type", "application/json")
+        request.add_header("Content-Type", self.codec.content_type)
+        if self.codec.content_type == JsonCodec.content_type:
+            request.add_header("Accept", self.codec.content_type)
+        else:
+            request.add_header("Accept", "{}, {};q=0.5".format(self.codec.content_type,
+                                                               JsonCodec.content_type))
         request.add_header("User-Agent", "gemstone-client")
-        request.data = json.dumps(request_body).encode()
+        request.data = self.codec.dumps(request_body)
         request.method = "POST"
+
+        if self.compressors:
+            request.add_header("Accept-Encoding",
+                               ", ".join(compressor.encoding for compressor in self.compressors))
+        if self.request_compressor is not None and \
+                len(request.data) >= self.compression_min_size:
+            request.data = self.request_compressor.compress(request.data)
+            request.add_header("Content-Encoding", self.request_compressor.encoding)
+
+        timeout = self.get_timeout()
+        if timeout is not None:
+            if timeout <= 0:
+                raise DeadlineExceededError("The deadline of the call passed")
+            request.add_header(TIMEOUT_HEADER, "{:.3f}".format(timeout))
+        request.timeout = timeout
         return request
 
+    def get_response_codec(self, response):
+        """
+        Returns the codec for the body of a HTTP response, according to its
+        ``Content-Type`` header.
+
+        :param response: the response returned by :py:meth:`open_http_request`
+        :return: :py:attr:`codec`, or a JSON codec if the service answered with JSON
+        """
+        if self.codec.content_type == JsonCodec.content_type:
+            return self.codec
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type == JsonCodec.content_type:
+            return get_default_codec()
+        return self.codec
+
+    def read_response(self, response):
+        """
+        Reads the body of a HTTP response and decompresses it according to its
+        ``Content-Encoding`` header.
+
+        :param response: the response returned by :py:meth:`open_http_request`
+        :return: the body of the response (``bytes``)
+        :raises gemstone.errors.ContentEncodingError: when the body can not be decompressed
+        """
+        return b"".join(self.iter_response(response))
+
+    def iter_response(self, response):
+        """
+        Like :py:meth:`read_response`, but yields the parts of the body as soon as they are
+        received.
+        """
+        chunks = _iter_response_chunks(response)
+        if not self.compressors:
+            return chunks
+
+        encoding = response.headers.get("Content-Encoding", "identity").strip().lower()
+        if encoding == "identity":
+            return chunks
+        compressor = get_compressor(encoding, self.compressors)
+        if compressor is None:
+            raise CalledServiceError("Unsupported response encoding: {}".format(encoding))
+        return compressor.iter_decompress(chunks)
+
+    def get_timeout(self):
+        """
+        :return: the number of seconds the requests sent now can take, or ``None`` if they
+                 have no timeout
+        """
+        timeouts = [timeout for timeout in (self.timeout, get_remaining_time())
+                    if timeout is not None]
+        return min(timeouts) if timeouts else None
+
+    def open_http_request(self, request):
+        """
+        Sends a request built with :py:meth:`build_http_request_obj`.
+
+        :return: the HTTP response
+        :raises gemstone.errors.CalledServiceError: when the HTTP request fails
+        :raises gemstone.errors.DeadlineExceededError: when the response was not received
+                                                       in time
+        """
+        urlopen = unix_opener.open if request.type == UNIX_SCHEME else urllib.request.urlopen
+        try:
+            if request.timeout is not None:
+                return urlopen(request, timeout=request.timeout)
+            return urlopen(request)
+        except urllib.request.HTTPError as e:
+            raise CalledServiceError(e)
+        except urllib.request.URLError as e:
+            if isinstance(e.reason, socket.timeout):
+                raise DeadlineExceededError("The remote service did not respond in time")
+            raise
+        except socket.timeout:
+            raise DeadlineExceededError("The remote service did not respond in time")
+
+    def send_pipelined_request(self, request_body):
+        """
+        Sends a request over a persistent connection (see :py:attr:`transport`) and waits
+        for its response. The time the client is willing to wait is sent in the ``timeout``
+        field of every call.
+
+        :param request_body: a ``dict`` or a ``list`` (batch)
+        :return: the decoded response
+        :raises gemstone.errors.DeadlineExceededError: when the response was not received
+                                                       in time
+        """
+        timeout = self.get_timeout()
+        if timeout is not None:
+            if timeout <= 0:
+                raise DeadlineExceededError("The deadline of the call passed")
+            items = request_body if isinstance(request_body, list) else [request_body]
+            for item in items:
+                item["timeout"] = round(timeout, 3)
+
+        future = self.transport.send(request_body)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            raise DeadlineExceededError("The remote service did not respond in time")
+
+    def close(self):
+        """
+        Closes the persistent connections used for the ``ws://``, ``wss://`` and ``tcp://``
+        URLs.
+        """
+        if self.transport is not None:
+            self.transport.close()
+
     def call_method(self, method_name_or_object, params=None):
         """
         Calls the ``method_name`` method from the given service and returns a
@@ -107,7 +315,9 @@ class RemoteService(object):
         else:
             req_obj = MethodCall(method_name_or_object, params)
 
-        async_result_mp = thread_pool.apply_async(self.handle_single_request, args=(req_obj,))
+        # the deadline of the current call is propagated to the thread pool
+        async_result_mp = thread_pool.apply_async(bind_context(self.handle_single_request),
+                                                  args=(req_obj,))
         return AsyncMethodCall(req_obj=req_obj, async_resp_object=async_result_mp)
 
     def notify(self, method_name_or_object, params=None):
@@ -128,6 +338,68 @@ class RemoteService(object):
         self.handle_single_request(req_obj)
 
     def call_batch(self, *requests):
+        """
+        Calls multiple methods in a single batch request.
+
+        :param requests: :py:class:`gemstone.client.structs.MethodCall` and
+                         :py:class:`gemstone.client.structs.Notification` instances
+        :return: a :py:class:`gemstone.client.structs.BatchResult` instance
+        :raises gemstone.errors.CalledServiceError: when the service responds with an error
+                                                    that does not belong to a call (for
+                                                    example when the batch is invalid)
+        """
+        body, ids = self.build_batch_body(requests)
+
+        results = self.handle_batch_request(body)
+        if isinstance(results, dict):
+            raise CalledServiceError(results.get("error"))
+
+        batch_result = BatchResult()
+        for result in results:
+            result_obj = Result(result.get("result"), result.get("error"), result.get("id"),
+                                method_call=ids.get(result.get("id")))
+            batch_result.add_response(result_obj)
+        return batch_result
+
+    def iter_batch(self, *requests):
+        """
+        Just like :py:meth:`call_batch`, but yields the
+        :py:class:`gemstone.client.structs.Result` instances as soon as they are
+        received. Works best with the services that stream their batch responses
+        (see :py:attr:`gemstone.core.MicroService.stream_batch_responses`).
+
+        Example usage
+
+        ::
+
+            calls = [MethodCall("slow_method", [i]) for i in range(100)]
+            for result in service.iter_batch(*calls):
+                print(result.method_call, result.result)
+
+        :param requests: :py:class:`gemstone.client.structs.MethodCall` and
+                         :py:class:`gemstone.client.structs.Notification` instances
+        :return: a generator of :py:class:`gemstone.client.structs.Result` instances. The
+                 errors that do not belong to a call (for example when the batch is invalid)
+                 are yielded with ``method_call=None``.
+
+        .. versionadded:: 0.13.0
+        """
+        body, ids = self.build_batch_body(requests)
+        if self.transport is not None:
+            results = self.send_pipelined_request(body) or []
+            if isinstance(results, dict):
+                results = [results]
+        else:
+            request = self.build_http_request_obj(body)
+            response = self.open_http_request(request)
+            codec = self.get_response_codec(response)
+            results = codec.iter_array(self.iter_response(response))
+
+        for result in results:
+            yield Result(result.get("result"), result.get("error"), result.get("id"),
+                         method_call=ids.get(result.get("id")))
+
+    def build_batch_body(self, requests):
         body = []
         ids = {}
         for item in requests:
@@ -141,23 +413,27 @@ class RemoteService(object):
             ))
             if isinstance(item, MethodCall):
                 ids[body[-1]["id"]] = item
-
-        results = self.handle_batch_request(body)
-
-        batch_result = BatchResult()
-        for result in results:
-            result_obj = Result(result["result"], result["error"], result["id"],
-                                method_call=ids[result["id"]])
-            batch_result.add_response(result_obj)
-        return batch_result
+        return body, ids
 
     def handle_batch_request(self, body):
-        request = self.build_http_request_obj(body)
+        if self.transport is not None:
+            return self.send_pipelined_request(body) or []
 
-        try:
-            response = urllib.request.urlopen(request)
-        except urllib.request.HTTPError as e:
-            raise CalledServiceError(e)
+        request = self.build_http_request_obj(body)
+        response = self.open_http_request(request)
 
-        resp_body = json.loads(response.read().decode())
+        resp_body = self.get_response_codec(response).loads(self.read_response(response))
         return resp_body
+
+
+def _iter_response_chunks(response, chunk_size=65536):
+    read = getattr(response, "read1", None)
+    if read is None:
+        yield response.read()
+        return
+
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,72 @@
+"""
+Client for the raw TCP transport of the microservices (see :py:mod:`gemstone.core.tcp`),
+used by :py:class:`gemstone.client.RemoteService` for the ``tcp://host:port`` URLs.
+
+.. versionadded:: 0.13.0
+"""
+
+import struct
+import urllib.parse
+
+from tornado.gen import coroutine
+from tornado.iostream import StreamClosedError
+from tornado.tcpclient import TCPClient
+
+from gemstone.client.pipelining import PipelinedTransport
+
+__all__ = [
+    'TCP_SCHEME',
+    'FRAME_HEADER',
+    'TcpTransport'
+]
+
+TCP_SCHEME = "tcp"
+
+#: The header of the frames: the length of the payload (4 bytes, big endian)
+FRAME_HEADER = struct.Struct(">I")
+
+
+class TcpTransport(PipelinedTransport):
+    """
+    Pipelines the JSON RPC requests over a pool of persistent TCP connections, using length
+    prefixed frames (see :py:class:`gemstone.client.pipelining.PipelinedTransport`).
+
+    :param url: the ``tcp://host:port`` URL of the raw TCP listener
+    :param codec: the :py:class:`gemstone.codecs.BaseCodec` instance used for the payloads
+    :param max_connections: the number of connections of the pool
+    :param connect_timeout: how many seconds to wait for a connection to be established
+    """
+
+    def __init__(self, url, codec, max_connections=4, connect_timeout=None):
+        super(TcpTransport, self).__init__(url, codec, max_connections=max_connections,
+                                           connect_timeout=connect_timeout)
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme != TCP_SCHEME or not parsed.hostname or not parsed.port:
+            raise ValueError("Invalid raw TCP URL: {}".format(url))
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self._client = TCPClient()
+
+    @coroutine
+    def open_connection(self):
+        stream = yield self._client.connect(self.host, self.port, timeout=self.connect_timeout)
+        self._read_frames(stream)
+        return stream
+
+    @coroutine
+    def _read_frames(self, stream):
+        try:
+            while True:
+                header = yield stream.read_bytes(FRAME_HEADER.size)
+                length, = FRAME_HEADER.unpack(header)
+                payload = yield stream.read_bytes(length)
+                self.on_message(stream, payload)
+        except StreamClosedError:
+            self.on_connection_closed(stream)
+
+    @coroutine
+    def write(self, connection, data):
+        yield connection.write(FRAME_HEADER.pack(len(data)) + data)
+
+    def close_connection(self, connection):
+        connection.close()
@@ -0,0 +1,101 @@
+"""
+HTTP over Unix domain sockets, for calling the microservices that run on the same host
+(see :py:attr:`gemstone.core.MicroService.unix_socket`) without going through the TCP stack.
+
+The path of the socket is the percent-encoded host of a ``unix://`` URL, followed by the
+path of the JSON RPC endpoint:
+
+::
+
+    url = make_unix_url("/var/run/service.sock", "/api")
+    # "unix://%2Fvar%2Frun%2Fservice.sock/api"
+    service = RemoteService(url)
+
+.. versionadded:: 0.13.0
+"""
+
+import http.client
+import socket
+import urllib.parse
+import urllib.request
+
+__all__ = [
+    'UNIX_SCHEME',
+    'make_unix_url',
+    'parse_unix_url',
+    'UnixHTTPConnection',
+    'UnixHTTPHandler'
+]
+
+UNIX_SCHEME = "unix"
+
+
+def make_unix_url(socket_path, endpoint="/api"):
+    """
+    Builds a ``unix://`` URL.
+
+    :param socket_path: the path of the Unix domain socket
+    :param endpoint: the path of the JSON RPC endpoint
+    :return: the URL as a ``str``
+    """
+    return "{}://{}{}".format(UNIX_SCHEME, urllib.parse.quote(socket_path, safe=""), endpoint)
+
+
+def parse_unix_url(url):
+    """
+    The reverse of :py:func:`make_unix_url`.
+
+    :param url: a ``unix://`` URL
+    :return: a ``(socket_path, endpoint)`` tuple
+    :raises ValueError: when ``url`` is not a valid ``unix://`` URL
+    """
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme != UNIX_SCHEME or not parsed.netloc:
+        raise ValueError("Invalid Unix domain socket URL: {}".format(url))
+    return urllib.parse.unquote(parsed.netloc), parsed.path or "/"
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    :py:class:`http.client.HTTPConnection` that connects to a Unix domain socket.
+
+    :param socket_path: the path of the socket
+    """
+
+    def __init__(self, socket_path, **kwargs):
+        super(UnixHTTPConnection, self).__init__("localhost", **kwargs)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            if self.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class UnixHTTPHandler(urllib.request.AbstractHTTPHandler):
+    """
+    ``urllib`` handler for the ``unix://`` URLs.
+    """
+
+    def unix_open(self, request):
+        # request.host is the decoded path of the socket
+        return self.do_open(UnixHTTPConnection, request)
+
+    def unix_request(self, request):
+        # the path of the socket is not a valid Host header
+        if not request.has_header("Host"):
+            request.add_unredirected_header("Host", "localhost")
+        return self.do_request_(request)
+
+    # the HTTP errors are raised as for the http:// URLs
+    unix_response = urllib.request.HTTPErrorProcessor.http_response
+
+
+#: opens the ``unix://`` URLs, like :py:func:`urllib.request.urlopen`
+unix_opener = urllib.request.build_opener(UnixHTTPHandler)
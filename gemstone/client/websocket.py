@@ -0,0 +1,56 @@
+"""
+JSON RPC over a persistent WebSocket connection, used by
+:py:class:`gemstone.client.RemoteService` for the ``ws://`` and ``wss://`` URLs (see
+:py:attr:`gemstone.core.MicroService.websocket_endpoint`).
+
+.. versionadded:: 0.13.0
+"""
+
+from tornado.gen import coroutine
+from tornado.websocket import websocket_connect
+
+from gemstone.client.pipelining import PipelinedTransport
+
+__all__ = [
+    'WEBSOCKET_SCHEMES',
+    'WebSocketTransport'
+]
+
+WEBSOCKET_SCHEMES = ("ws", "wss")
+
+
+class WebSocketTransport(PipelinedTransport):
+    """
+    Pipelines the JSON RPC requests over a single persistent WebSocket connection (see
+    :py:class:`gemstone.client.pipelining.PipelinedTransport`).
+
+    :param url: the ``ws://`` or ``wss://`` URL of the endpoint
+    :param codec: the :py:class:`gemstone.codecs.BaseCodec` instance used for the payloads
+    :param connect_timeout: how many seconds to wait for the connection to be established
+    """
+
+    def __init__(self, url, codec, connect_timeout=None):
+        super(WebSocketTransport, self).__init__(url, codec, max_connections=1,
+                                                 connect_timeout=connect_timeout)
+
+    @coroutine
+    def open_connection(self):
+        opened = []
+
+        def on_message(message):
+            if message is None:
+                self.on_connection_closed(opened[0])
+            else:
+                self.on_message(opened[0], message)
+
+        connection = yield websocket_connect(self.url, connect_timeout=self.connect_timeout,
+                                             on_message_callback=on_message)
+        opened.append(connection)
+        return connection
+
+    @coroutine
+    def write(self, connection, data):
+        yield connection.write_message(data, binary=self.codec.binary)
+
+    def close_connection(self, connection):
+        connection.close()
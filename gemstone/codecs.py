@@ -0,0 +1,336 @@
+"""
+Serialization backends used for the JSON RPC payloads.
+
+A codec transforms Python objects into ``bytes`` and back, so that the request bodies
+never have to be decoded into ``str`` before being parsed. When the ``orjson`` package is
+installed, :py:func:`get_default_codec` will return a :py:class:`OrjsonCodec` instance,
+otherwise it will fall back to :py:class:`SimpleJsonCodec`.
+
+When the ``msgpack`` package is installed, the microservices also accept the
+``application/msgpack`` payloads (see :py:class:`MsgPackCodec` and
+:py:attr:`gemstone.core.MicroService.accepted_codecs`).
+
+Example usage
+
+::
+
+    class MyMicroService(gemstone.MicroService):
+        # ...
+        codec = gemstone.codecs.SimpleJsonCodec()
+        # ...
+
+    remote_service = RemoteService("http://10.0.0.1:8000/api", codec=OrjsonCodec())
+
+"""
+
+import abc
+import re
+
+import simplejson as json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from gemstone.errors import CodecDecodeError
+
+__all__ = [
+    'BaseCodec',
+    'JsonCodec',
+    'SimpleJsonCodec',
+    'OrjsonCodec',
+    'MsgPackCodec',
+    'get_default_codec',
+    'get_accepted_codecs'
+]
+
+
+class BaseCodec(abc.ABC):
+    """
+    Base class for the payload codecs.
+    """
+
+    #: The MIME type of the payloads produced and accepted by the codec.
+    content_type = None
+
+    #: ``False`` if the payloads are text (they are sent in the text frames of the WebSocket
+    #: connections).
+    binary = True
+
+    @abc.abstractmethod
+    def dumps(self, obj):
+        """
+        Serializes ``obj``.
+
+        :param obj: a Python object that can be represented by the codec.
+        :return: ``bytes``
+        """
+        pass
+
+    @abc.abstractmethod
+    def loads(self, data):
+        """
+        Deserializes ``data``.
+
+        :param data: ``bytes`` (or ``str``) with the serialized payload.
+        :return: the corresponding Python object
+        :raises gemstone.errors.CodecDecodeError: when ``data`` is not a valid payload.
+        """
+        pass
+
+    @abc.abstractmethod
+    def array_framing(self, length):
+        """
+        Used for streaming an array whose items are serialized one by one with
+        :py:meth:`dumps`.
+
+        :param length: the number of items of the array
+        :return: a ``(prefix, separator, suffix)`` tuple of ``bytes``
+        """
+        pass
+
+    @abc.abstractmethod
+    def iter_array(self, chunks):
+        """
+        Incrementally deserializes an array, yielding its items as soon as they are
+        completely received. If the payload is not an array, the deserialized payload is
+        yielded as the only item.
+
+        :param chunks: an iterable of ``bytes`` with consecutive parts of the payload
+        :return: a generator of deserialized items
+        :raises gemstone.errors.CodecDecodeError: when the payload is not valid.
+        """
+        pass
+
+    def __repr__(self):
+        return "<{}>".format(self.__class__.__name__)
+
+
+class JsonCodec(BaseCodec):
+    """
+    Base class for the JSON codecs.
+    """
+
+    content_type = "application/json"
+    binary = False
+
+    _STRUCTURAL_CHARS = re.compile(rb'[\[\]{}",]')
+    _STRING_CHARS = re.compile(rb'["\\]')
+
+    def array_framing(self, length):
+        return b"[", b",", b"]"
+
+    def iter_array(self, chunks):
+        chunks = iter(chunks)
+        buffer = b""
+        for chunk in chunks:
+            buffer += chunk
+            if buffer.strip():
+                break
+
+        if buffer.lstrip()[:1] != b"[":
+            # not an array, nothing to stream
+            yield self.loads(buffer + b"".join(chunks))
+            return
+
+        pos = buffer.index(b"[") + 1
+        item_start = pos
+        depth = 1
+        in_string = False
+
+        while True:
+            if in_string:
+                match = self._STRING_CHARS.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                elif match.group() == b'"':
+                    in_string = False
+                    pos = match.end()
+                    continue
+                elif match.end() < len(buffer):
+                    # skip the escaped character
+                    pos = match.end() + 1
+                    continue
+                else:
+                    # the escaped character was not received yet
+                    pos = match.start()
+            else:
+                match = self._STRUCTURAL_CHARS.search(buffer, pos)
+                if match:
+                    char = match.group()
+                    pos = match.end()
+                    if char == b'"':
+                        in_string = True
+                    elif char in b"[{":
+                        depth += 1
+                    elif char in b"]}":
+                        depth -= 1
+                        if depth == 0:
+                            item = buffer[item_start:match.start()]
+                            if item.strip():
+                                yield self.loads(item)
+                            return
+                    elif depth == 1:
+                        # the separator between two items of the array
+                        yield self.loads(buffer[item_start:match.start()])
+                        buffer = buffer[pos:]
+                        pos = item_start = 0
+                    continue
+                pos = len(buffer)
+
+            # we need more data
+            try:
+                buffer += next(chunks)
+            except StopIteration:
+                raise CodecDecodeError("Unexpected end of the array")
+
+
+class SimpleJsonCodec(JsonCodec):
+    """
+    JSON codec that uses the ``simplejson`` package.
+    """
+
+    def dumps(self, obj):
+        return json.dumps(obj).encode()
+
+    def loads(self, data):
+        try:
+            return json.loads(data)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise CodecDecodeError(str(e))
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    JSON codec that uses the ``orjson`` package. The objects that can not be serialized by
+    ``orjson`` (for example integers larger than 64 bits or ``decimal.Decimal`` instances)
+    are serialized with ``simplejson`` instead. ``orjson`` decodes the integers larger than
+    64 bits as floats, so the payloads that may contain such integers are decoded with
+    ``simplejson`` too.
+    """
+
+    # the numbers with too many digits to be 64 bits integers (some are floats or
+    # strings, they are decoded with simplejson too)
+    _LARGE_NUMBER = re.compile(rb'\d{20}|-\d{19}')
+    _LARGE_NUMBER_STR = re.compile(r'\d{20}|-\d{19}')
+
+    def __init__(self):
+        if not orjson:
+            raise RuntimeError("OrjsonCodec requires 'orjson' to run")
+        self._fallback = SimpleJsonCodec()
+
+    def dumps(self, obj):
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            return self._fallback.dumps(obj)
+
+    def loads(self, data):
+        pattern = self._LARGE_NUMBER_STR if isinstance(data, str) else self._LARGE_NUMBER
+        if pattern.search(data):
+            return self._fallback.loads(data)
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError as e:
+            raise CodecDecodeError(str(e))
+
+
+class MsgPackCodec(BaseCodec):
+    """
+    MessagePack codec that uses the ``msgpack`` package. The payloads are smaller than the
+    JSON ones and the ``bytes`` objects are sent as they are (they are not base64
+    encoded), so the parameters and the results can contain binary data. The ``str`` and
+    the ``bytes`` objects are kept distinct, the tuples are decoded as lists.
+
+    .. versionadded:: 0.13.0
+    """
+
+    content_type = "application/msgpack"
+
+    # fixarray, array 16 and array 32
+    _ARRAY_HEADERS = set(range(0x90, 0xa0)) | {0xdc, 0xdd}
+
+    def __init__(self):
+        if not msgpack:
+            raise RuntimeError("MsgPackCodec requires 'msgpack' to run")
+
+    def dumps(self, obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data):
+        if isinstance(data, str):
+            raise CodecDecodeError("MessagePack payloads must be bytes")
+        try:
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+        except (ValueError, TypeError) as e:
+            raise CodecDecodeError(str(e))
+
+    def array_framing(self, length):
+        return msgpack.Packer().pack_array_header(length), b"", b""
+
+    def iter_array(self, chunks):
+        chunks = iter(chunks)
+        buffer = b""
+        for chunk in chunks:
+            buffer += chunk
+            if buffer:
+                break
+
+        if not buffer or buffer[0] not in self._ARRAY_HEADERS:
+            # not an array, nothing to stream
+            yield self.loads(buffer + b"".join(chunks))
+            return
+
+        unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+        unpacker.feed(buffer)
+        # the number of items that were not received yet
+        remaining = None
+        try:
+            while True:
+                try:
+                    if remaining is None:
+                        remaining = unpacker.read_array_header()
+                    if not remaining:
+                        break
+                    item = unpacker.unpack()
+                except msgpack.OutOfData:
+                    # we need more data
+                    try:
+                        unpacker.feed(next(chunks))
+                    except StopIteration:
+                        raise CodecDecodeError("Unexpected end of the array")
+                    continue
+                remaining -= 1
+                yield item
+        except (ValueError, TypeError) as e:
+            raise CodecDecodeError(str(e))
+
+
+def get_default_codec():
+    """
+    Returns the fastest JSON codec available.
+
+    :return: a :py:class:`OrjsonCodec` instance if ``orjson`` is installed, a
+             :py:class:`SimpleJsonCodec` instance otherwise.
+    """
+    if orjson:
+        return OrjsonCodec()
+    return SimpleJsonCodec()
+
+
+def get_accepted_codecs():
+    """
+    Returns the codecs of the other content types that can be used, besides JSON.
+
+    :return: a list with a :py:class:`MsgPackCodec` instance if ``msgpack`` is installed,
+             an empty list otherwise.
+    """
+    if msgpack:
+        return [MsgPackCodec()]
+    return []
@@ -0,0 +1,364 @@
+"""
+Content encodings used to compress the HTTP bodies of the JSON RPC requests and responses.
+
+``gzip`` is always available. ``zstd`` and ``br`` are available when the ``zstandard``,
+respectively the ``brotli`` packages are installed. :py:func:`get_available_compressors`
+returns them in the order of preference.
+
+The microservices decompress the requests according to their ``Content-Encoding`` header and
+compress the responses with the encoding negotiated from the ``Accept-Encoding`` header (see
+:py:attr:`gemstone.core.MicroService.compressors`). :py:class:`gemstone.client.RemoteService`
+advertises the available encodings and, if enabled, compresses the large requests with
+``gzip``.
+
+.. versionadded:: 0.13.0
+"""
+
+import abc
+import collections
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from gemstone.errors import ContentEncodingError, ContentTooLargeError
+
+__all__ = [
+    'BaseCompressor',
+    'GzipCompressor',
+    'BrotliCompressor',
+    'ZstdCompressor',
+    'CompressionMetrics',
+    'get_available_compressors',
+    'get_compressor'
+]
+
+
+class BaseCompressor(abc.ABC):
+    """
+    Base class for the content encodings.
+    """
+
+    #: The name of the encoding, as used in the ``Content-Encoding`` and ``Accept-Encoding``
+    #: headers.
+    encoding = None
+
+    @abc.abstractmethod
+    def compress(self, data):
+        """
+        :param data: ``bytes``
+        :return: the compressed ``bytes``
+        """
+        pass
+
+    def decompressobj(self):
+        """
+        Used by the default implementation of :py:meth:`iter_decompress` (the encodings that
+        can not provide it override :py:meth:`iter_decompress` instead). Returns an
+        incremental decompressor whose output can be limited, with:
+
+        - ``feed(data)``: sets the next part of the compressed stream, only when
+          ``needs_input`` is ``True``
+        - ``read(max_length)``: decompresses the input that was fed and returns about
+          ``max_length`` bytes at most (everything that is available if ``None``)
+        - ``needs_input``: ``True`` when all the input was decompressed
+        - ``eof``: ``True`` after the end of the compressed stream
+        """
+        raise NotImplementedError()
+
+    def decompress(self, data, max_size=None):
+        """
+        :param data: the compressed ``bytes``
+        :param max_size: the maximum size of the decompressed data, or ``None``
+        :return: the decompressed ``bytes``
+        :raises gemstone.errors.ContentEncodingError: if ``data`` is not valid
+        :raises gemstone.errors.ContentTooLargeError: if ``data`` is larger than ``max_size``
+                                                      once decompressed
+        """
+        return b"".join(self.iter_decompress([data], max_size))
+
+    def iter_decompress(self, chunks, max_size=None):
+        """
+        Incrementally decompresses a stream. When ``max_size`` is given, the output of every
+        decompression step is limited by the remaining size, so the streams that decompress
+        to much more data (decompression bombs) are rejected before being decompressed.
+
+        :param chunks: an iterable of ``bytes`` with consecutive parts of the compressed data
+        :param max_size: the maximum size of the decompressed data, or ``None``
+        :return: a generator of decompressed ``bytes``
+        :raises gemstone.errors.ContentEncodingError: if the stream is not valid
+        :raises gemstone.errors.ContentTooLargeError: if the stream is larger than
+                                                      ``max_size`` once decompressed
+        """
+        decompressor = self.decompressobj()
+        size = 0
+        for chunk in chunks:
+            decompressor.feed(chunk)
+            while not decompressor.needs_input:
+                limit = max_size - size + 1 if max_size is not None else None
+                try:
+                    output = decompressor.read(limit)
+                except Exception as e:
+                    raise ContentEncodingError("Invalid {} payload: {}".format(self.encoding, e))
+                size += len(output)
+                if max_size is not None and size > max_size:
+                    raise ContentTooLargeError(
+                        "The decompressed payload is larger than {} bytes".format(max_size))
+                if output:
+                    yield output
+
+        if not decompressor.eof:
+            raise ContentEncodingError("Truncated {} payload".format(self.encoding))
+
+    def __repr__(self):
+        return "<{}>".format(self.__class__.__name__)
+
+
+class GzipCompressor(BaseCompressor):
+    """
+    The ``gzip`` encoding, from the standard library.
+
+    :param level: the compression level, from 1 (fastest) to 9 (smallest)
+    """
+
+    encoding = "gzip"
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompressobj(self):
+        return _GzipDecompressor()
+
+
+class _GzipDecompressor(object):
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._input = b""
+        self._output_pending = False
+
+    @property
+    def needs_input(self):
+        return not self._input and not self._output_pending
+
+    @property
+    def eof(self):
+        return self._decompressor.eof
+
+    def feed(self, data):
+        self._input = data
+
+    def read(self, max_length):
+        output = self._decompressor.decompress(self._input, max_length or 0)
+        self._input = self._decompressor.unconsumed_tail
+        # the output was truncated, zlib may hold more of it even without input
+        self._output_pending = bool(max_length) and len(output) >= max_length
+        return output
+
+
+class BrotliCompressor(BaseCompressor):
+    """
+    The ``br`` encoding, that uses the ``brotli`` package (version 1.2 or newer).
+
+    :param quality: the compression quality, from 0 (fastest) to 11 (smallest)
+    """
+
+    encoding = "br"
+
+    def __init__(self, quality=4):
+        if not _brotli_supported():
+            raise RuntimeError("BrotliCompressor requires 'brotli>=1.2' to run")
+        self.quality = quality
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.quality)
+
+    def decompressobj(self):
+        return _BrotliDecompressor()
+
+
+class _BrotliDecompressor(object):
+    def __init__(self):
+        self._decompressor = brotli.Decompressor()
+        self._input = b""
+
+    @property
+    def needs_input(self):
+        return not self._input and self._decompressor.can_accept_more_data()
+
+    @property
+    def eof(self):
+        return self._decompressor.is_finished()
+
+    def feed(self, data):
+        self._input = data
+
+    def read(self, max_length):
+        data = b""
+        if self._input and self._decompressor.can_accept_more_data():
+            data, self._input = self._input, b""
+        if max_length is None:
+            return self._decompressor.process(data)
+        # the decompressor keeps the input it could not decompress within the limit
+        return self._decompressor.process(data, output_buffer_limit=max_length)
+
+
+class ZstdCompressor(BaseCompressor):
+    """
+    The ``zstd`` encoding, that uses the ``zstandard`` package.
+
+    :param level: the compression level, from 1 (fastest) to 22 (smallest)
+    """
+
+    encoding = "zstd"
+
+    # the maximum size of the output of a decompression step
+    OUTPUT_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, level=3):
+        if not zstandard:
+            raise RuntimeError("ZstdCompressor requires 'zstandard' to run")
+        self.level = level
+
+    def compress(self, data):
+        # the content size is written in the frame header, as required by some decoders
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def iter_decompress(self, chunks, max_size=None):
+        # The output of zstandard's decompressobj() can not be limited and its read_to_iter()
+        # does not report the truncated frames. The output is limited with read_to_iter(),
+        # then the end of the frame is checked with decompressobj(), that can not produce
+        # more than the output that was already accepted.
+        data = b"".join(chunks)
+        size = 0
+        try:
+            for output in zstandard.ZstdDecompressor().read_to_iter(
+                    data, write_size=self.OUTPUT_CHUNK_SIZE):
+                size += len(output)
+                if max_size is not None and size > max_size:
+                    raise ContentTooLargeError(
+                        "The decompressed payload is larger than {} bytes".format(max_size))
+                yield output
+            decompressor = zstandard.ZstdDecompressor().decompressobj()
+            decompressor.decompress(data)
+        except zstandard.ZstdError as e:
+            raise ContentEncodingError("Invalid {} payload: {}".format(self.encoding, e))
+
+        if not decompressor.eof:
+            raise ContentEncodingError("Truncated {} payload".format(self.encoding))
+
+
+class CompressionMetrics(object):
+    """
+    Counts the compressed and decompressed payloads, per direction and encoding. Not thread
+    safe, the payloads must be recorded from the same thread (the IOLoop).
+    """
+
+    def __init__(self):
+        self._stats = collections.defaultdict(_EncodingStats)
+        self.skipped = collections.Counter()
+
+    def record(self, direction, encoding, original_size, compressed_size, duration,
+               offloaded=False):
+        """
+        :param direction: ``"requests"`` (decompressed) or ``"responses"`` (compressed)
+        :param encoding: the name of the encoding
+        :param original_size: the size of the uncompressed payload
+        :param compressed_size: the size of the compressed payload
+        :param duration: how many seconds the (de)compression took
+        :param offloaded: ``True`` if the (de)compression was executed outside the IOLoop
+        """
+        self._stats[direction, encoding].add(original_size, compressed_size, duration,
+                                             offloaded)
+
+    def record_skipped(self, direction):
+        """
+        Records a payload that was not compressed because it was too small.
+        """
+        self.skipped[direction] += 1
+
+    def get_metrics(self):
+        """
+        :return: a ``dict`` like ``{"responses": {"gzip": {"count": 10, ...}}, "skipped":
+                 {"responses": 3}}``
+        """
+        metrics = {}
+        for (direction, encoding), stats in sorted(self._stats.items()):
+            metrics.setdefault(direction, {})[encoding] = stats.to_dict()
+        metrics["skipped"] = dict(self.skipped)
+        return metrics
+
+
+class _EncodingStats(object):
+    def __init__(self):
+        self.count = 0
+        self.offloaded = 0
+        self.original_bytes = 0
+        self.compressed_bytes = 0
+        self.total_time = 0.0
+
+    def add(self, original_size, compressed_size, duration, offloaded):
+        self.count += 1
+        self.offloaded += int(offloaded)
+        self.original_bytes += original_size
+        self.compressed_bytes += compressed_size
+        self.total_time += duration
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "offloaded": self.offloaded,
+            "original_bytes": self.original_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "ratio": self.original_bytes / self.compressed_bytes if self.compressed_bytes
+            else None,
+            "total_time": self.total_time
+        }
+
+
+def get_available_compressors():
+    """
+    Returns the available encodings, in the order of preference.
+
+    :return: a list of :py:class:`BaseCompressor` instances: :py:class:`ZstdCompressor` and
+             :py:class:`BrotliCompressor` if the packages they require are installed and
+             :py:class:`GzipCompressor`
+    """
+    compressors = []
+    if zstandard:
+        compressors.append(ZstdCompressor())
+    if _brotli_supported():
+        compressors.append(BrotliCompressor())
+    compressors.append(GzipCompressor())
+    return compressors
+
+
+def get_compressor(encoding, compressors=None):
+    """
+    :param encoding: the name of an encoding, like ``"gzip"``
+    :param compressors: the :py:class:`BaseCompressor` instances to choose from (the
+                        available ones by default)
+    :return: the :py:class:`BaseCompressor` for ``encoding`` or ``None`` if it is not
+             supported
+    """
+    if compressors is None:
+        compressors = get_available_compressors()
+    for compressor in compressors:
+        if compressor.encoding == encoding:
+            return compressor
+    return None
+
+
+def _brotli_supported():
+    # the output of the decompression can be limited since brotli 1.2
+    return brotli is not None and hasattr(brotli.Decompressor, "can_accept_more_data")
@@ -0,0 +1,134 @@
+import collections
+
+from gemstone.errors import ServerOverloadedError
+
+__all__ = [
+    'AdmissionController'
+]
+
+
+class AdmissionController(object):
+    """
+    Decides whether the JSON RPC requests and calls are accepted or rejected because the
+    microservice is overloaded. The rejected requests are answered right away with a
+    "Server overloaded" error, without being dispatched, so the latency and the memory used
+    by the queued calls can not grow without bound.
+
+    The requests are checked in the following order:
+
+    - before the body of a HTTP request is parsed, the number of requests handled
+      concurrently by the microservice (``max_in_flight``)
+    - before a call is dispatched (after its parameters are validated and its result is
+      looked up in the cache), the number of concurrent calls of the method
+      (``exposed_method(max_in_flight=...)``) and the queue of the executor of the method
+      (see :py:class:`gemstone.core.executors.ManagedExecutor`)
+
+    All the methods must be called from the IOLoop.
+
+    :param max_in_flight: how many requests can be handled concurrently. If ``None``, the
+                          number of requests is not limited.
+    :param retry_after: the number of seconds after which the clients of the rejected
+                        requests are advised to retry (if the rejecting component does not
+                        provide its own hint).
+    """
+
+    def __init__(self, max_in_flight=None, retry_after=None):
+        if max_in_flight is not None and max_in_flight <= 0:
+            raise ValueError("max_in_flight must be a positive number")
+
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+
+        self.in_flight = 0
+        self._method_in_flight = collections.Counter()
+        self._rejected = collections.Counter()
+
+        self.abandoned_requests = 0
+        self.cancelled_calls = 0
+
+    def enter_request(self):
+        """
+        Admits a new HTTP request.
+
+        :raises gemstone.errors.ServerOverloadedError: when ``max_in_flight`` requests are
+                                                       already handled
+        """
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            self.reject(ServerOverloadedError("Too many requests in flight", "service"))
+        self.in_flight += 1
+
+    def exit_request(self):
+        """
+        Must be called when an admitted request was handled.
+        """
+        self.in_flight -= 1
+
+    def enter_call(self, descriptor):
+        """
+        Admits a new call of an exposed method.
+
+        :param descriptor: the :py:class:`gemstone.core.dispatch.MethodDescriptor` of the
+                           called method
+        :raises gemstone.errors.ServerOverloadedError: when the method or its executor is
+                                                       saturated
+        """
+        limit = descriptor.max_in_flight
+        if limit is not None and self._method_in_flight[descriptor.name] >= limit:
+            self.reject(ServerOverloadedError(
+                "Too many calls of '{}' in flight".format(descriptor.name), "method",
+                method=descriptor.name))
+
+        if descriptor.executor is not None:
+            try:
+                descriptor.executor.check_capacity()
+            except ServerOverloadedError as e:
+                self.reject(e)
+
+        self._method_in_flight[descriptor.name] += 1
+
+    def exit_call(self, descriptor):
+        """
+        Must be called when an admitted call completed.
+
+        :param descriptor: the :py:class:`gemstone.core.dispatch.MethodDescriptor` of the
+                           called method
+        """
+        self._method_in_flight[descriptor.name] -= 1
+        if not self._method_in_flight[descriptor.name]:
+            del self._method_in_flight[descriptor.name]
+
+    def reject(self, error):
+        """
+        Counts a rejection and raises ``error``. If ``error`` has no retry hint, the
+        ``retry_after`` of the controller is used.
+
+        :param error: a :py:class:`gemstone.errors.ServerOverloadedError` instance
+        """
+        self._rejected[error.reason] += 1
+        if error.retry_after is None:
+            error.retry_after = self.retry_after
+        raise error
+
+    def record_abandoned_request(self, cancelled_calls):
+        """
+        Counts a request whose client closed the connection before receiving the response.
+
+        :param cancelled_calls: how many calls of the request were cancelled
+        """
+        self.abandoned_requests += 1
+        self.cancelled_calls += cancelled_calls
+
+    def get_metrics(self):
+        """
+        :return: a ``dict`` with the number of requests in flight, the number of calls in
+                 flight for every method, the number of rejections by reason and the number
+                 of abandoned requests and of cancelled calls
+        """
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "methods_in_flight": dict(self._method_in_flight),
+            "rejected": dict(self._rejected),
+            "abandoned_requests": self.abandoned_requests,
+            "cancelled_calls": self.cancelled_calls
+        }
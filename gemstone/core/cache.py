@@ -0,0 +1,129 @@
+import collections
+import threading
+import time
+
+__all__ = [
+    'ResponseCache',
+    'make_cache_key'
+]
+
+
+class ResponseCache(object):
+    """
+    In-memory cache for the results of an exposed method, with LRU eviction and optional
+    expiration of the entries.
+
+    Used by the exposed methods declared with ``exposed_method(cache=...)``. Every
+    microservice instance has its own cache for every such method.
+
+    :param max_entries: the maximum number of cached results. When the cache is full, the
+                        least recently used entry is evicted.
+    :param ttl: the number of seconds a result is kept in the cache. If ``None``, the
+                results do not expire.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be a positive number")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be a positive number")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """
+        Looks up a result.
+
+        :param key: a key built with :py:func:`make_cache_key`
+        :return: a ``(found, result)`` tuple
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            expires_at, result = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, result
+
+    def set(self, key, result):
+        """
+        Stores a result in the cache.
+
+        :param key: a key built with :py:func:`make_cache_key`
+        :param result: the result of the method call
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """
+        Removes a result from the cache. If ``key`` is ``None``, removes all the results.
+
+        :param key: a key built with :py:func:`make_cache_key` or ``None``
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def get_metrics(self):
+        """
+        :return: a ``dict`` with the number of entries, hits, misses, evictions and
+                 expirations
+        """
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def make_cache_key(args, kwargs):
+    """
+    Builds a hashable key from the parameters of a call. The parameters should be already
+    bound against the signature of the method, so that the same call with positional
+    or with keyword parameters produces the same key.
+
+    :param args: the positional parameters
+    :param kwargs: the keyword parameters
+    :return: a hashable object
+    """
+    return _freeze(args), _freeze(kwargs)
+
+
+def _freeze(obj):
+    if isinstance(obj, dict):
+        return frozenset((k, _freeze(v)) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        return tuple(_freeze(item) for item in obj)
+    # the type is part of the key because 1 == 1.0 == True
+    return obj.__class__, obj
@@ -23,17 +23,24 @@ class Container(abc.ABC):
 
     """
 
+    #: The name of the executor used by the blocking methods of the container that do not
+    #: specify one with ``exposed_method(executor=...)``. If ``None``, the default executor
+    #: of the microservice is used.
+    executor = None
+
     def __init__(self):
         self.microservice = None
 
     def set_microservice(self, microservice):
         self.microservice = microservice
 
-    def get_executor(self):
+    def get_executor(self, name=None):
         """
-        Returns the executor instance used by the microservice.
+        Returns an executor instance used by the microservice.
+
+        :param name: the name of the executor. If ``None``, the default executor is returned.
         """
-        return self.microservice.get_executor()
+        return self.microservice.get_executor(name)
 
     def get_io_loop(self):
         """
@@ -1,8 +1,12 @@
 import functools
+import inspect
 import re
 
 import tornado.gen
 
+from gemstone.core.executors import PRIORITY_NORMAL, PRIORITY_LEVELS
+from gemstone.core.ratelimit import parse_rate
+
 __all__ = [
     'event_handler',
     'exposed_method'
@@ -32,7 +36,10 @@ def event_handler(event_name):
     return wrapper
 
 
-def exposed_method(name=None, private=False, is_coroutine=True, requires_handler_reference=False):
+def exposed_method(name=None, private=False, is_coroutine=None, requires_handler_reference=False,
+                   check_types=False, cache=None, single_flight=False, executor=None,
+                   max_in_flight=None, priority=PRIORITY_NORMAL, rate_limit=None, burst=None,
+                   rate_limit_per_client=False, timeout=None):
     """
     Marks a method as exposed via JSON RPC.
 
@@ -44,7 +51,12 @@ def exposed_method(name=None, private=False, is_coroutine=True, requires_handler
     :param private: Flag that specifies if the exposed method is private.
     :type private: bool
     :param is_coroutine: Flag that specifies if the method is a Tornado coroutine. If True, it will be wrapped
-                         with the :py:func:`tornado.gen.coroutine` decorator.
+                         with the :py:func:`tornado.gen.coroutine` decorator and executed on the IOLoop.
+                         If False, the method is executed in the microservice's executor. If not present
+                         or ``None``, generator functions and Tornado coroutines are treated as
+                         coroutines and every other function as a blocking method. Native coroutines
+                         (``async def``) are always awaited directly on the IOLoop, without being
+                         wrapped.
     :type is_coroutine: bool
     :param requires_handler_reference: If ``True``, the handler method will receive as the first
                                        parameter a ``handler`` argument with the Tornado
@@ -52,9 +64,63 @@ def exposed_method(name=None, private=False, is_coroutine=True, requires_handler
                                        can be further used to extract various information from the
                                        request, such as headers, cookies, etc.
     :type requires_handler_reference: bool
+    :param check_types: If ``True``, the values of the parameters are checked against the
+                        annotations of the method before the method is called. The calls with
+                        invalid values receive an "Invalid params" error response.
+    :type check_types: bool
+    :param cache: If not ``None``, the results of the method are cached (see
+                  :py:class:`gemstone.core.cache.ResponseCache`) and the calls with the same
+                  parameters are answered from the cache, without executing the method. Can be
+                  ``True`` (for the default cache options) or a ``dict`` with the keyword
+                  arguments for :py:class:`gemstone.core.cache.ResponseCache` (eg.
+                  ``{"max_entries": 100, "ttl": 60}``). Use it only for the methods whose
+                  results depend only on their parameters.
+    :type cache: bool or dict
+    :param single_flight: If ``True``, the concurrent calls with the same parameters (even from
+                          the same batch) share a single execution of the method and each
+                          caller receives its result. Use it only for the methods whose
+                          results depend only on their parameters.
+    :type single_flight: bool
+    :param executor: The name of the executor in which the (blocking) method is executed (see
+                     :py:attr:`gemstone.core.MicroService.executors`). Use ``"process"`` for
+                     executing a CPU bound method in a process pool. If ``None``, the default
+                     executor is used.
+    :type executor: str
+    :param max_in_flight: How many calls of the method can be handled concurrently. The calls
+                          over this limit are rejected with a "Server overloaded" error. If
+                          ``None``, the calls are not limited.
+    :type max_in_flight: int
+    :param priority: The priority of the calls in the queue of the executor: ``"high"``,
+                     ``"normal"`` or ``"low"`` (see
+                     :py:data:`gemstone.core.executors.PRIORITY_LEVELS`). The queued
+                     calls with a higher priority are started first.
+    :type priority: str
+    :param rate_limit: The maximum rate of the calls, as a string (eg. ``"100/s"``, ``"30/m"``
+                       or ``"1000/h"``). The calls over this rate are rejected with a
+                       "Rate limit exceeded" error. If ``None``, the default rate limit of the
+                       microservice applies (see
+                       :py:attr:`gemstone.core.MicroService.rate_limit`).
+    :type rate_limit: str
+    :param burst: How many calls can be made at once, over the rate (see
+                  :py:class:`gemstone.core.ratelimit.TokenBucketLimiter`).
+    :type burst: int
+    :param rate_limit_per_client: If ``True``, the rate limit applies separately to every
+                                  client (see
+                                  :py:meth:`gemstone.core.MicroService.get_client_identity`).
+    :type rate_limit_per_client: bool
+    :param timeout: The maximum number of seconds the caller waits for the result. The calls
+                    that take longer receive a "Deadline exceeded" error. The deadline sent by
+                    the caller (see :py:mod:`gemstone.deadlines`) applies too, if it is sooner.
+    :type timeout: float
 
     .. versionadded:: 0.9.0
 
+    .. versionchanged:: 0.13.0
+        ``is_coroutine`` defaults to ``None`` (automatic detection) instead of ``True``, so the
+        blocking methods are no longer executed on the IOLoop. Added the ``check_types``,
+        ``cache``, ``single_flight``, ``executor``, ``max_in_flight``, ``priority``,
+        ``rate_limit``, ``burst``, ``rate_limit_per_client`` and ``timeout`` parameters.
+
     """
 
     def wrapper(func):
@@ -69,6 +135,22 @@ def exposed_method(name=None, private=False, is_coroutine=True, requires_handler
         if not METHOD_NAME_REGEX.match(method_name):
             raise ValueError("Invalid method name: '{}'".format(method_name))
 
+        if max_in_flight is not None and max_in_flight <= 0:
+            raise ValueError("max_in_flight must be a positive number")
+
+        if rate_limit is not None:
+            parse_rate(rate_limit)
+
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be a positive number")
+
+        if priority not in PRIORITY_LEVELS:
+            raise ValueError("Invalid priority: '{}'".format(priority))
+
+        if (cache or single_flight) and requires_handler_reference:
+            raise ValueError("The methods that require the handler reference can not be cached "
+                             "or coalesced")
+
         @functools.wraps(func)
         def real_wrapper(*args, **kwargs):
             return func(*args, **kwargs)
@@ -79,14 +161,49 @@ def exposed_method(name=None, private=False, is_coroutine=True, requires_handler
         else:
             setattr(real_wrapper, "_exposed_public", True)
 
-        if is_coroutine:
-            real_wrapper.__gemstone_is_coroutine = True
-            real_wrapper = tornado.gen.coroutine(real_wrapper)
+        if inspect.iscoroutinefunction(func):
+            # native coroutines are awaited directly by the handler
             setattr(real_wrapper, "_is_coroutine", True)
+            setattr(real_wrapper, "_is_native_coroutine", True)
+        else:
+            already_coroutine = tornado.gen.is_coroutine_function(func)
+            if is_coroutine is None:
+                run_on_io_loop = already_coroutine or inspect.isgeneratorfunction(func)
+            else:
+                run_on_io_loop = is_coroutine
+
+            if run_on_io_loop:
+                if not already_coroutine:
+                    real_wrapper = tornado.gen.coroutine(real_wrapper)
+                setattr(real_wrapper, "_is_coroutine", True)
 
         if requires_handler_reference:
             setattr(real_wrapper, "_req_h_ref", True)
 
+        if check_types:
+            setattr(real_wrapper, "_check_types", True)
+
+        if cache:
+            setattr(real_wrapper, "_cache_options", {} if cache is True else dict(cache))
+
+        if single_flight:
+            setattr(real_wrapper, "_single_flight", True)
+
+        if executor:
+            setattr(real_wrapper, "_executor_name", executor)
+
+        if max_in_flight is not None:
+            setattr(real_wrapper, "_max_in_flight", max_in_flight)
+
+        setattr(real_wrapper, "_priority", priority)
+
+        if rate_limit is not None:
+            setattr(real_wrapper, "_rate_limit", {"rate": rate_limit, "burst": burst,
+                                                  "per_client": rate_limit_per_client})
+
+        if timeout is not None:
+            setattr(real_wrapper, "_timeout", timeout)
+
         setattr(real_wrapper, "_exposed_name", method_name)
 
         return real_wrapper
@@ -0,0 +1,255 @@
+"""
+Precompiled method dispatch table.
+
+When the microservice starts, every exposed method is inspected once and described by an
+immutable :py:class:`MethodDescriptor`. The JSON RPC handler only needs a dictionary lookup
+in :py:attr:`gemstone.core.MicroService.method_table` in order to find everything it needs
+to know for dispatching a call.
+"""
+
+import inspect
+import typing
+from collections import namedtuple
+
+from gemstone.core.cache import ResponseCache
+from gemstone.core.executors import PRIORITY_NORMAL
+from gemstone.core.ratelimit import TokenBucketLimiter
+from gemstone.core.singleflight import SingleFlightGroup
+from gemstone.core.structs import JsonRpcInvalidParamsError
+
+__all__ = [
+    'MethodDescriptor',
+    'EXECUTION_NATIVE',
+    'EXECUTION_COROUTINE',
+    'EXECUTION_EXECUTOR'
+]
+
+#: The method is a native coroutine (``async def``) and is awaited on the IOLoop
+EXECUTION_NATIVE = "native"
+#: The method is a Tornado coroutine and is executed on the IOLoop
+EXECUTION_COROUTINE = "coroutine"
+#: The method is blocking and is executed in the microservice's executor
+EXECUTION_EXECUTOR = "executor"
+
+
+class MethodDescriptor(namedtuple("MethodDescriptor", [
+    "name", "method", "private", "execution", "requires_handler", "signature", "type_checker",
+    "executor", "priority", "max_in_flight", "timeout", "rate_limiter",
+    "rate_limit_per_client", "cache", "single_flight", "plugin_hooks"
+])):
+    """
+    Immutable description of an exposed method.
+
+    - ``name`` - the name under which the method is exposed
+    - ``method`` - the callable that will be invoked (as prepared by the executor, for the
+      blocking methods)
+    - ``private`` - ``True`` if the method requires an authenticated request
+    - ``execution`` - how the method is executed (:py:data:`EXECUTION_NATIVE`,
+      :py:data:`EXECUTION_COROUTINE` or :py:data:`EXECUTION_EXECUTOR`)
+    - ``requires_handler`` - ``True`` if the method receives the request handler as its first
+      parameter
+    - ``signature`` - the :py:class:`inspect.Signature` of the method, or ``None`` if it can
+      not be determined
+    - ``type_checker`` - a callable compiled from the annotations of the method (see
+      :py:func:`compile_type_checker`) or ``None`` if the parameter types are not checked
+    - ``executor`` - the :py:class:`gemstone.core.executors.ManagedExecutor` in which the
+      method is executed, or ``None`` for the coroutines
+    - ``priority`` - the priority of the calls in the queue of the executor (see
+      :py:data:`gemstone.core.executors.PRIORITY_LEVELS`)
+    - ``max_in_flight`` - how many calls of the method can be handled concurrently, or ``None``
+      if the calls are not limited
+    - ``timeout`` - the maximum duration (in seconds) of the calls, or ``None``
+    - ``rate_limiter`` - the :py:class:`gemstone.core.ratelimit.TokenBucketLimiter` of the
+      method, or ``None`` if the rate of the calls is not limited
+    - ``rate_limit_per_client`` - ``True`` if the rate limit applies separately to every client
+    - ``cache`` - the :py:class:`gemstone.core.cache.ResponseCache` of the method, or ``None``
+      if the results are not cached
+    - ``single_flight`` - the :py:class:`gemstone.core.singleflight.SingleFlightGroup` that
+      coalesces the identical concurrent calls, or ``None``
+    - ``plugin_hooks`` - a tuple with the ``on_method_call`` bound methods of the plugins that
+      actually override it
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_method(cls, name, method, plugins, executor=None, default_rate_limit=None):
+        """
+        Inspects an exposed method and builds its descriptor.
+
+        :param name: the name under which the method is exposed.
+        :param method: the exposed method (as decorated by
+                       :py:func:`gemstone.core.exposed_method`).
+        :param plugins: the list of plugins of the microservice.
+        :param executor: the :py:class:`gemstone.core.executors.ManagedExecutor` used if the
+                         method is blocking
+        :param default_rate_limit: the rate limit options (a ``dict`` with the ``rate``,
+                                   ``burst`` and ``per_client`` keys) used if the method does
+                                   not have its own rate limit
+        :return: a :py:class:`MethodDescriptor` instance
+        """
+        if getattr(method, "_is_native_coroutine", False) or inspect.iscoroutinefunction(method):
+            execution = EXECUTION_NATIVE
+        elif getattr(method, "_is_coroutine", False):
+            execution = EXECUTION_COROUTINE
+        else:
+            execution = EXECUTION_EXECUTOR
+
+        try:
+            signature = inspect.signature(method)
+        except (TypeError, ValueError):
+            signature = None
+
+        if signature is not None and getattr(method, "_check_types", False):
+            type_checker = compile_type_checker(signature)
+        else:
+            type_checker = None
+
+        cache_options = getattr(method, "_cache_options", None)
+        cache = ResponseCache(**cache_options) if cache_options is not None else None
+        if getattr(method, "_single_flight", False):
+            single_flight = SingleFlightGroup()
+        else:
+            single_flight = None
+
+        rate_limit = getattr(method, "_rate_limit", None) or default_rate_limit
+        if rate_limit is not None:
+            rate_limiter = TokenBucketLimiter(rate_limit["rate"], rate_limit["burst"])
+            rate_limit_per_client = rate_limit["per_client"]
+        else:
+            rate_limiter = None
+            rate_limit_per_client = False
+
+        if execution == EXECUTION_EXECUTOR:
+            callable_ = executor.prepare_method(method) if executor is not None else method
+        else:
+            callable_ = method
+            executor = None
+
+        return cls(
+            name=name,
+            method=callable_,
+            private=getattr(method, "_exposed_private", False),
+            execution=execution,
+            requires_handler=getattr(method, "_req_h_ref", False),
+            signature=signature,
+            type_checker=type_checker,
+            executor=executor,
+            priority=getattr(method, "_priority", PRIORITY_NORMAL),
+            max_in_flight=getattr(method, "_max_in_flight", None),
+            timeout=getattr(method, "_timeout", None),
+            rate_limiter=rate_limiter,
+            rate_limit_per_client=rate_limit_per_client,
+            cache=cache,
+            single_flight=single_flight,
+            plugin_hooks=get_plugin_hooks(plugins, "on_method_call")
+        )
+
+    def bind_params(self, args, kwargs):
+        """
+        Validates the parameters of a call against the signature of the method (and against
+        its annotations, if the types are checked).
+
+        :param args: a list with the positional parameters
+        :param kwargs: a dict with the keyword parameters
+        :return: a ``(args, kwargs)`` tuple with the parameters the method should be
+                 called with
+        :raises gemstone.core.structs.JsonRpcInvalidParamsError: when the method can not be
+                                                                 called with the parameters
+        """
+        if self.signature is None:
+            return args, kwargs
+
+        try:
+            bound = self.signature.bind(*args, **kwargs)
+        except TypeError as e:
+            raise JsonRpcInvalidParamsError(str(e))
+
+        if self.type_checker is not None:
+            invalid = self.type_checker(bound.arguments)
+            if invalid is not None:
+                raise JsonRpcInvalidParamsError("Invalid type for parameter '{}'".format(invalid))
+
+        return bound.args, bound.kwargs
+
+
+def compile_type_checker(signature):
+    """
+    Builds a function that checks the values of the parameters against the
+    annotations from ``signature``. Only classes (eg. ``int``, ``str``, ``dict``) and
+    ``typing.Union`` / ``typing.Optional`` of classes are checked, the other annotations
+    are ignored. Because of the JSON number semantics, a ``float`` annotation also accepts
+    ``int`` values, while ``int`` and ``float`` annotations do not accept ``bool`` values.
+
+    :param signature: a :py:class:`inspect.Signature` instance
+    :return: a callable that receives the ``arguments`` mapping of a
+             :py:class:`inspect.BoundArguments` instance and returns the name of the
+             first parameter with an invalid value or ``None`` if all the values are valid.
+             If no parameter can be checked, ``None`` is returned instead of the callable.
+    """
+    checks = []
+    for name, param in signature.parameters.items():
+        types = _annotation_to_types(param.annotation)
+        if types is not None:
+            checks.append((name, param.kind, types, bool not in types))
+
+    if not checks:
+        return None
+
+    def type_checker(arguments):
+        for name, kind, types, reject_bool in checks:
+            if name not in arguments:
+                continue
+
+            if kind == inspect.Parameter.VAR_POSITIONAL:
+                values = arguments[name]
+            elif kind == inspect.Parameter.VAR_KEYWORD:
+                values = arguments[name].values()
+            else:
+                values = (arguments[name],)
+
+            for value in values:
+                if not isinstance(value, types) or (reject_bool and value.__class__ is bool):
+                    return name
+        return None
+
+    return type_checker
+
+
+def _annotation_to_types(annotation):
+    if annotation is inspect.Parameter.empty:
+        return None
+
+    if getattr(annotation, "__origin__", None) is typing.Union:
+        members = annotation.__args__
+    else:
+        members = (annotation,)
+
+    types = []
+    for member in members:
+        if member is None:
+            member = type(None)
+        if not isinstance(member, type):
+            # generics, forward references, etc. are not checked
+            return None
+        types.append(member)
+        if member is float:
+            types.append(int)
+    return tuple(types)
+
+
+def get_plugin_hooks(plugins, hook_name):
+    """
+    Returns the bound ``hook_name`` methods of the plugins that override the default
+    (no-op) implementation from :py:class:`gemstone.plugins.BasePlugin`.
+
+    :param plugins: a list of plugin instances.
+    :param hook_name: the name of the hook (eg. ``"on_method_call"``)
+    :return: a tuple of callables
+    """
+    # imported here because gemstone.plugins depends on gemstone.core
+    from gemstone.plugins.base import BasePlugin
+
+    default = getattr(BasePlugin, hook_name)
+    return tuple(getattr(plugin, hook_name) for plugin in plugins
+                 if getattr(type(plugin), hook_name, default) is not default)
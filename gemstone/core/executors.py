@@ -0,0 +1,456 @@
+"""
+Executors for the blocking exposed methods.
+
+Every blocking method is executed in an executor. By default, the microservice creates
+a :py:class:`ThreadExecutor` named ``"default"`` with
+:py:attr:`gemstone.core.MicroService.max_parallel_blocking_tasks` workers. More executors can be
+declared in :py:attr:`gemstone.core.MicroService.executors` and the methods can be assigned
+to them with ``exposed_method(executor="name")`` or, for all the blocking methods of a
+:py:class:`gemstone.core.Container`, with the :py:attr:`gemstone.core.Container.executor`
+attribute.
+
+Every executor is a bulkhead: it has its own workers and, optionally, a bounded queue
+(``max_queue``). When both the workers and the queue are full, the new tasks are rejected with
+:py:class:`gemstone.errors.ExecutorSaturatedError` and the clients receive a "Server overloaded"
+error, so a slow dependency can not take the workers of unrelated methods.
+
+Example usage
+
+::
+
+    class MyMicroService(gemstone.MicroService):
+        # ...
+        executors = [
+            ProcessExecutor("cpu", max_workers=4, max_tasks_per_worker=1000),
+            ThreadExecutor("payments", max_workers=8, max_queue=16, retry_after=2)
+        ]
+
+        @gemstone.exposed_method(executor="cpu")
+        def compute(self, n):
+            return sum(i * i for i in range(n))
+
+"""
+
+import abc
+import concurrent.futures
+import functools
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from gemstone.deadlines import bind_context
+from gemstone.errors import ExecutorSaturatedError, DeadlineExceededError
+
+__all__ = [
+    'ManagedExecutor',
+    'ThreadExecutor',
+    'ProcessExecutor',
+    'PRIORITY_HIGH',
+    'PRIORITY_NORMAL',
+    'PRIORITY_LOW',
+    'PRIORITY_LEVELS'
+]
+
+#: For the short calls that must not wait behind the bulk work (health checks, authentication)
+PRIORITY_HIGH = "high"
+#: The default priority
+PRIORITY_NORMAL = "normal"
+#: For the bulk work
+PRIORITY_LOW = "low"
+
+#: Maps the priorities to their levels (the tasks with lower levels are started first)
+PRIORITY_LEVELS = {
+    PRIORITY_HIGH: 0,
+    PRIORITY_NORMAL: 1,
+    PRIORITY_LOW: 2
+}
+
+
+class ManagedExecutor(concurrent.futures.Executor, abc.ABC):
+    """
+    Base class for the executors used by the microservice. Wraps a
+    :py:class:`concurrent.futures.Executor` (created lazily, on the first submitted task) and
+    keeps track of the submitted tasks.
+
+    The tasks are not queued by the wrapped executor: at most ``max_workers`` tasks are
+    submitted to it and the rest wait in a priority queue. The tasks with a higher priority
+    (see :py:data:`PRIORITY_LEVELS`) are started first. In order to prevent the starvation of
+    the low priority tasks, every ``aging_interval`` seconds spent in the queue raise the
+    priority of a task by one level.
+
+    :param name: the name of the executor. Must be unique per microservice.
+    :param max_workers: the maximum number of workers. Defaults to the number of CPUs.
+    :param max_queue: how many tasks can wait for a free worker. If ``None``, the queue is
+                      unbounded. When the queue is full, the new tasks are rejected.
+    :param retry_after: the number of seconds after which the clients of the rejected
+                        calls are advised to retry. Sent in the ``data`` of the
+                        "Server overloaded" errors.
+    :param limiter: a :py:class:`gemstone.core.limiter.AdaptiveConcurrencyLimiter` that
+                    adjusts at runtime how many calls are submitted concurrently to the
+                    executor, or ``None``
+    :param aging_interval: the number of seconds after which a queued task is promoted to
+                           the next priority level
+    """
+
+    def __init__(self, name, max_workers=None, max_queue=None, retry_after=None, limiter=None,
+                 aging_interval=1.0):
+        self.name = name
+        self.max_workers = max_workers or os.cpu_count()
+        if self.max_workers <= 0:
+            raise ValueError("max_workers must be a positive number")
+        if max_queue is not None and max_queue < 0:
+            raise ValueError("max_queue must be a positive number or 0")
+        if aging_interval <= 0:
+            raise ValueError("aging_interval must be a positive number")
+
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.limiter = limiter
+        self.aging_interval = aging_interval
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._queue = []
+        self._sequence = itertools.count()
+
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.cancelled = 0
+        self._queue_wait = {priority: _WaitStats() for priority in PRIORITY_LEVELS}
+
+    @abc.abstractmethod
+    def create_pool(self):
+        """
+        Creates the underlying executor.
+
+        :return: a :py:class:`concurrent.futures.Executor` instance
+        """
+        pass
+
+    def prepare_method(self, method):
+        """
+        Called once for every exposed method assigned to the executor, when the microservice
+        starts. Returns the callable that will be submitted to the executor instead
+        of ``method``.
+
+        :param method: the exposed method (a bound method)
+        :return: a callable
+        """
+        return method
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Submits a task for execution, with the :py:data:`PRIORITY_NORMAL` priority.
+
+        :return: a :py:class:`concurrent.futures.Future` instance
+        :raises gemstone.errors.ExecutorSaturatedError: when all the workers are busy and the
+                                                        queue is full
+        """
+        return self.schedule(functools.partial(fn, *args, **kwargs))
+
+    def schedule(self, fn, priority=PRIORITY_NORMAL, deadline=None):
+        """
+        Submits a task for execution.
+
+        :param fn: a callable with no parameters
+        :param priority: the priority of the task (one of the :py:data:`PRIORITY_LEVELS` keys)
+        :param deadline: if the task is still queued at this moment (a :py:func:`time.monotonic`
+                         value), it is dropped and its future fails with
+                         :py:class:`gemstone.errors.DeadlineExceededError`
+        :return: a :py:class:`concurrent.futures.Future` instance
+        :raises gemstone.errors.ExecutorSaturatedError: when all the workers are busy and the
+                                                        queue is full
+        """
+        level = PRIORITY_LEVELS[priority]
+        future = concurrent.futures.Future()
+        now = time.monotonic()
+        task = _Task(self.prepare_task(fn), future, priority, now, deadline)
+
+        with self._lock:
+            self._check_capacity()
+            if self.running >= self.max_workers:
+                # the key is static, but equivalent with the aging of the queued tasks
+                key = now + level * self.aging_interval
+                entry = (key, next(self._sequence), task)
+                heapq.heappush(self._queue, entry)
+                future.add_done_callback(functools.partial(self._remove_cancelled, entry))
+                return future
+            future.set_running_or_notify_cancel()
+            self._queue_wait[priority].add(0.0)
+            self.running += 1
+
+        self._start(task)
+        return future
+
+    def prepare_task(self, fn):
+        """
+        Called for every scheduled task, in the thread that schedules it.
+
+        :param fn: a callable with no parameters
+        :return: the callable that will be executed
+        """
+        return fn
+
+    def shutdown(self, wait=True, **kwargs):
+        with self._lock:
+            pool, self._pool = self._pool, None
+            queue, self._queue = self._queue, []
+        for _, _, task in queue:
+            task.future.cancel()
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def get_queue_depth(self):
+        """
+        :return: the number of submitted tasks that wait for a free worker
+        """
+        return len(self._queue)
+
+    def check_capacity(self):
+        """
+        Checks that a new task can be submitted. The failed checks are counted as rejected
+        tasks.
+
+        :raises gemstone.errors.ExecutorSaturatedError: when all the workers are busy and the
+                                                        queue is full
+        """
+        with self._lock:
+            self._check_capacity()
+
+    def is_saturated(self):
+        """
+        :return: ``True`` if a new task would be rejected, ``False`` otherwise
+        """
+        if self.max_queue is None:
+            return False
+        return self.running + len(self._queue) >= self.max_workers + self.max_queue
+
+    def get_metrics(self):
+        """
+        :return: a ``dict`` with the number of workers, of running, queued, completed,
+                 failed and rejected tasks, the saturation (the ratio between the
+                 submitted tasks and the capacity of the executor, ``None`` if the queue is
+                 unbounded) and the time spent by the tasks in the queue, for every priority
+        """
+        pending = self.running + len(self._queue)
+        if self.max_queue is not None:
+            saturation = pending / (self.max_workers + self.max_queue)
+        else:
+            saturation = None
+        metrics = {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": len(self._queue),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "cancelled": self.cancelled,
+            "saturation": saturation,
+            "queue_wait": {priority: stats.to_dict()
+                           for priority, stats in self._queue_wait.items()}
+        }
+        if self.limiter is not None:
+            metrics["limiter"] = self.limiter.get_metrics()
+        return metrics
+
+    def _check_capacity(self):
+        if self.is_saturated():
+            self.rejected += 1
+            raise ExecutorSaturatedError(self.name, self.retry_after)
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = self.create_pool()
+        return self._pool
+
+    def _remove_cancelled(self, entry, future):
+        # the cancelled tasks do not keep their place in the queue
+        if not future.cancelled():
+            return
+        with self._lock:
+            try:
+                self._queue.remove(entry)
+            except ValueError:
+                return
+            heapq.heapify(self._queue)
+            self.cancelled += 1
+
+    def _start(self, task):
+        # the worker was already reserved
+        try:
+            with self._lock:
+                pool = self._get_pool()
+            pool_future = pool.submit(task.fn)
+        except Exception as e:
+            self._finish_task(task.future, exception=e)
+            return
+        pool_future.add_done_callback(functools.partial(self._task_done, task.future))
+
+    def _task_done(self, future, pool_future):
+        if pool_future.cancelled():
+            self._finish_task(future, exception=concurrent.futures.CancelledError())
+        elif pool_future.exception() is not None:
+            self._finish_task(future, exception=pool_future.exception())
+        else:
+            self._finish_task(future, result=pool_future.result())
+
+    def _finish_task(self, future, result=None, exception=None):
+        to_start = []
+        expired = []
+        with self._lock:
+            self.running -= 1
+            if exception is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+            # reserve the free workers for the queued tasks
+            now = time.monotonic()
+            while self._queue and self.running < self.max_workers:
+                _, _, task = heapq.heappop(self._queue)
+                if not task.future.set_running_or_notify_cancel():
+                    self.cancelled += 1
+                    continue
+                if task.deadline is not None and task.deadline <= now:
+                    self.expired += 1
+                    expired.append(task.future)
+                    continue
+                self._queue_wait[task.priority].add(now - task.queued_at)
+                self.running += 1
+                to_start.append(task)
+
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+        for expired_future in expired:
+            expired_future.set_exception(DeadlineExceededError("Deadline exceeded in queue"))
+
+        for task in to_start:
+            self._start(task)
+
+    def __repr__(self):
+        return "<{} name={} max_workers={}>".format(self.__class__.__name__, self.name,
+                                                     self.max_workers)
+
+
+class _Task(object):
+    __slots__ = ("fn", "future", "priority", "queued_at", "deadline")
+
+    def __init__(self, fn, future, priority, queued_at, deadline):
+        self.fn = fn
+        self.future = future
+        self.priority = priority
+        self.queued_at = queued_at
+        self.deadline = deadline
+
+
+class _WaitStats(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "max": self.max if self.count else None
+        }
+
+
+class ThreadExecutor(ManagedExecutor):
+    """
+    Executes the tasks in a :py:class:`concurrent.futures.ThreadPoolExecutor`. Suited for
+    the methods that perform I/O.
+    """
+
+    def create_pool(self):
+        return concurrent.futures.ThreadPoolExecutor(self.max_workers)
+
+    def prepare_task(self, fn):
+        # the deadline of the call is propagated to the worker thread
+        return bind_context(fn)
+
+
+class ProcessExecutor(ManagedExecutor):
+    """
+    Executes the tasks in a :py:class:`concurrent.futures.ProcessPoolExecutor`. Suited for
+    the CPU bound methods, that would otherwise be serialized by the GIL.
+
+    The parameters and the results of the methods are pickled. In the worker processes, the
+    methods are called on a bare instance of their class (created without calling
+    ``__init__``), so they must depend only on their parameters and on the class attributes.
+    The class must be importable (defined at the top level of a module).
+
+    :param max_tasks_per_worker: if not ``None``, the worker processes are replaced after
+                                 having executed (on average) this number of tasks. Useful for
+                                 releasing the memory held by the workers.
+    """
+
+    def __init__(self, name, max_workers=None, max_tasks_per_worker=None, max_queue=None,
+                 retry_after=None, limiter=None):
+        super(ProcessExecutor, self).__init__(name, max_workers, max_queue, retry_after,
+                                              limiter)
+        if max_tasks_per_worker is not None and max_tasks_per_worker <= 0:
+            raise ValueError("max_tasks_per_worker must be a positive number")
+
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.recycled = 0
+        self._pool_tasks = 0
+
+    def create_pool(self):
+        return concurrent.futures.ProcessPoolExecutor(self.max_workers)
+
+    def prepare_method(self, method):
+        return functools.partial(call_in_process, type(method.__self__), method.__name__)
+
+    def get_metrics(self):
+        metrics = super(ProcessExecutor, self).get_metrics()
+        metrics["recycled"] = self.recycled
+        return metrics
+
+    def _get_pool(self):
+        if self.max_tasks_per_worker is not None and self._pool is not None and \
+                self._pool_tasks >= self.max_tasks_per_worker * self.max_workers:
+            # the running tasks are not affected, the old workers exit after they finish
+            self._pool.shutdown(wait=False)
+            self._pool = None
+            self.recycled += 1
+
+        if self._pool is None:
+            self._pool_tasks = 0
+        self._pool_tasks += 1
+        return super(ProcessExecutor, self)._get_pool()
+
+
+_process_instances = {}
+
+
+def call_in_process(container_cls, method_name, *args, **kwargs):
+    """
+    Calls an exposed method in a worker process of a :py:class:`ProcessExecutor`.
+
+    :param container_cls: the class that defines the method (a
+                          :py:class:`gemstone.core.Container` subclass)
+    :param method_name: the name of the method
+    :return: the result of the method
+    """
+    instance = _process_instances.get(container_cls)
+    if instance is None:
+        instance = container_cls.__new__(container_cls)
+        _process_instances[container_cls] = instance
+    return getattr(instance, method_name)(*args, **kwargs)
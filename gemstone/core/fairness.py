@@ -0,0 +1,219 @@
+import collections
+from functools import partial
+
+from tornado.concurrent import Future
+from tornado.gen import coroutine
+
+from gemstone.errors import ServerOverloadedError
+
+__all__ = [
+    'FairScheduler'
+]
+
+
+class _Client(object):
+    __slots__ = ("weight", "waiters", "in_flight", "deficit")
+
+    def __init__(self, weight):
+        self.weight = weight
+        self.waiters = collections.deque()
+        self.in_flight = 0
+        self.deficit = 0
+
+
+class FairScheduler(object):
+    """
+    Shares the capacity of the microservice fairly between its clients, using deficit round
+    robin scheduling.
+
+    At most ``max_concurrency`` calls are executed at the same time. When there is no free
+    slot, the calls wait in a queue of their client (identified by
+    :py:meth:`gemstone.core.MicroService.get_client_identity`) and the queues are served in
+    turns: in every turn, a client can start as many calls as its weight. A client that sends
+    a lot of requests fills only its own queue, so the other clients keep their latency.
+
+    Example usage
+
+    ::
+
+        class MyMicroService(gemstone.MicroService):
+            # ...
+            fair_scheduler = FairScheduler(max_concurrency=32, weights={"frontend": 4},
+                                           max_in_flight_per_client=8)
+
+            def get_client_identity(self, handler):
+                return handler.request.headers.get("X-Api-Token")
+
+    All the methods must be called from the IOLoop.
+
+    :param max_concurrency: how many calls can be executed at the same time
+    :param weights: a ``dict`` that maps client identities to their weights (the number of
+                    calls started in every turn)
+    :param default_weight: the weight of the clients that are not in ``weights``
+    :param max_in_flight_per_client: how many calls of the same client can be executed at the
+                                     same time. If ``None``, only ``max_concurrency`` applies.
+    :param max_queued_per_client: how many calls of the same client can wait in the queue.
+                                  The calls over this limit are rejected with a "Server
+                                  overloaded" error. If ``None``, the queues are unbounded.
+    :param retry_after: the retry hint (in seconds) of the rejected calls, or ``None``
+    """
+
+    def __init__(self, max_concurrency, weights=None, default_weight=1,
+                 max_in_flight_per_client=None, max_queued_per_client=None, retry_after=None):
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be a positive number")
+        weights = dict(weights or {})
+        for weight in list(weights.values()) + [default_weight]:
+            if not isinstance(weight, int) or weight <= 0:
+                raise ValueError("The weights must be positive integers")
+
+        self.max_concurrency = max_concurrency
+        self.weights = weights
+        self.default_weight = default_weight
+        self.max_in_flight_per_client = max_in_flight_per_client
+        self.max_queued_per_client = max_queued_per_client
+        self.retry_after = retry_after
+
+        self._clients = {}
+        self._active = collections.deque()
+
+        self.in_flight = 0
+        self.rejected = 0
+
+    def acquire(self, identity):
+        """
+        Waits until a call of the client can be started. Cancelling the returned future
+        removes the call from the queue of the client (for example when the client closed the
+        connection).
+
+        :param identity: the identity of the client
+        :return: a :py:class:`tornado.concurrent.Future` resolved when the call can be started
+        :raises gemstone.errors.ServerOverloadedError: (through the returned future) when the
+                                                       queue of the client is full
+        """
+        client = self._clients.get(identity)
+        if client is None:
+            client = _Client(self.weights.get(identity, self.default_weight))
+            self._clients[identity] = client
+
+        waiter = Future()
+        if not client.waiters and self._can_start(client):
+            self._start(client)
+            waiter.set_result(None)
+            return waiter
+
+        if self.max_queued_per_client is not None and \
+                len(client.waiters) >= self.max_queued_per_client:
+            self.rejected += 1
+            self._forget_if_idle(identity)
+            waiter.set_exception(ServerOverloadedError("Too many calls queued for the client",
+                                                       "client", self.retry_after))
+            return waiter
+
+        if not client.waiters:
+            self._active.append(identity)
+        client.waiters.append(waiter)
+        waiter.add_done_callback(partial(self._discard_cancelled, identity))
+        return waiter
+
+    def release(self, identity):
+        """
+        Must be called when a started call of the client completed.
+
+        :param identity: the identity of the client
+        """
+        client = self._clients[identity]
+        client.in_flight -= 1
+        self.in_flight -= 1
+        self._dispatch()
+        self._forget_if_idle(identity)
+
+    @coroutine
+    def run(self, identity, func):
+        """
+        Calls ``func`` when the scheduler allows it.
+
+        :param identity: the identity of the client
+        :param func: a callable with no parameters that returns a future
+        :return: the result of the future
+        :raises gemstone.errors.ServerOverloadedError: when the call is rejected
+        """
+        yield self.acquire(identity)
+        try:
+            result = yield func()
+        finally:
+            self.release(identity)
+        return result
+
+    def get_metrics(self):
+        """
+        :return: a ``dict`` with the number of calls in flight, queued and rejected, and the
+                 calls in flight and queued for every active client
+        """
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": sum(len(client.waiters) for client in self._clients.values()),
+            "rejected": self.rejected,
+            "clients": {
+                str(identity): {"in_flight": client.in_flight, "queued": len(client.waiters)}
+                for identity, client in self._clients.items()
+            }
+        }
+
+    def _can_start(self, client):
+        if self.in_flight >= self.max_concurrency:
+            return False
+        return self.max_in_flight_per_client is None or \
+            client.in_flight < self.max_in_flight_per_client
+
+    def _start(self, client):
+        self.in_flight += 1
+        client.in_flight += 1
+
+    def _dispatch(self):
+        # deficit round robin over the clients with queued calls
+        idle_turns = 0
+        while self._active and self.in_flight < self.max_concurrency and \
+                idle_turns < len(self._active):
+            identity = self._active[0]
+            client = self._clients[identity]
+            if client.deficit < 1:
+                client.deficit += client.weight
+
+            started = False
+            while client.waiters and client.deficit >= 1 and self._can_start(client):
+                waiter = client.waiters.popleft()
+                if waiter.done():
+                    # cancelled, but not discarded yet
+                    continue
+                client.deficit -= 1
+                self._start(client)
+                waiter.set_result(None)
+                started = True
+
+            if not client.waiters:
+                self._active.popleft()
+                client.deficit = 0
+                self._forget_if_idle(identity)
+            elif self.in_flight >= self.max_concurrency and client.deficit >= 1:
+                # the client keeps its turn
+                break
+            else:
+                self._active.rotate(-1)
+            idle_turns = 0 if started else idle_turns + 1
+
+    def _discard_cancelled(self, identity, waiter):
+        client = self._clients.get(identity)
+        if not waiter.cancelled() or client is None or waiter not in client.waiters:
+            return
+        client.waiters.remove(waiter)
+        if not client.waiters:
+            self._active.remove(identity)
+            client.deficit = 0
+            self._forget_if_idle(identity)
+
+    def _forget_if_idle(self, identity):
+        client = self._clients.get(identity)
+        if client is not None and not client.in_flight and not client.waiters:
+            del self._clients[identity]
@@ -1,19 +1,35 @@
+from datetime import timedelta
 from functools import partial
+import asyncio
+import concurrent.futures
 import copy
+import math
 import time
 
-import simplejson as json
 from tornado.web import RequestHandler
-from tornado.gen import coroutine
-
+from tornado.websocket import WebSocketHandler, WebSocketClosedError
+from tornado.gen import coroutine, convert_yielded, with_timeout, WaitIterator, TimeoutError
+from tornado.locks import Semaphore
+from tornado.concurrent import Future, chain_future
+
+from gemstone.compression import get_compressor
+from gemstone.core.cache import make_cache_key
+from gemstone.core.dispatch import EXECUTION_EXECUTOR
 from gemstone.core.structs import JsonRpcResponse, JsonRpcRequest, JsonRpcResponseBatch, \
-    GenericResponse, JsonRpcInvalidRequestError
+    GenericResponse, JsonRpcInvalidRequestError, JsonRpcInvalidParamsError
+from gemstone.deadlines import TIMEOUT_HEADER, set_deadline, reset_deadline
+from gemstone.errors import CodecDecodeError, ServerOverloadedError, DeadlineExceededError, \
+    ContentEncodingError, ContentTooLargeError
 
 __all__ = [
+    'JsonRpcDispatcher',
     'TornadoJsonRpcHandler',
+    'TornadoJsonRpcWebSocketHandler',
     'GemstoneCustomHandler'
 ]
 
+CANCELLED_ERRORS = (concurrent.futures.CancelledError, asyncio.CancelledError)
+
 
 # noinspection PyAbstractClass
 class GemstoneCustomHandler(RequestHandler):
@@ -35,85 +51,160 @@ class GemstoneCustomHandler(RequestHandler):
         self.microservice = microservice
 
 
-# noinspection PyAbstractClass
-class TornadoJsonRpcHandler(RequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.response_is_sent = False
-        self.methods = None
-        self.executor = None
-        self.validation_strategies = None
-        self.api_token_handlers = None
-        self.logger = None
-        self.microservice = None
-        super(TornadoJsonRpcHandler, self).__init__(*args, **kwargs)
+class JsonRpcDispatcher(object):
+    """
+    The dispatch pipeline of the JSON RPC calls (rate limiting, admission, scheduling,
+    parameter binding, caching, deadlines and execution), shared by the request handler
+    and by the in-process calls (see :py:class:`gemstone.core.local.LocalService`).
+
+    The classes that use it must provide the ``microservice``, ``method_table``,
+    ``request_deadline`` and ``connection_closed`` attributes and the
+    ``get_current_user()`` method, and must initialize ``_pending_calls`` with an empty
+    ``set`` and ``_client_identity`` with ``None``. The persistent connections must also
+    provide the ``codec`` attribute and the ``write_response()`` method.
+    """
 
-    # noinspection PyMethodOverriding
-    def initialize(self, microservice):
-        self.logger = microservice.logger
-        self.methods = microservice.methods
-        self.executor = microservice.get_executor()
-        self.response_is_sent = False
-        self.microservice = microservice
+    def get_client_identity(self):
+        """
+        Returns the identity of the client (see
+        :py:meth:`gemstone.core.MicroService.get_client_identity`), computed once per request
+        or, for the persistent connections, once per connection.
+        """
+        if self._client_identity is None:
+            self._client_identity = self.microservice.get_client_identity(self)
+        return self._client_identity
 
-    def get_current_user(self):
-        return self.microservice.authenticate_request(self)
+    def get_remote_ip(self):
+        """
+        Returns the address of the client, used by
+        :py:meth:`gemstone.core.MicroService.get_client_identity`. By default, the remote IP
+        of the HTTP request.
+        """
+        return self.request.remote_ip
 
     @coroutine
-    def post(self):
-        if self.request.headers.get("Content-type").split(";")[0] != "application/json":
-            self.write_single_response(GenericResponse.INVALID_REQUEST)
-            return
+    def handle_message(self, message):
+        """
+        Handles a message received on a persistent connection (WebSocket or TCP) and sends
+        its response with ``write_response()``. The messages are admitted like the HTTP
+        requests. Once the message is decoded, the errors that prevent it from being handled
+        are sent with the ids of its calls, so the clients can match them.
 
-        req_body_raw = self.request.body.decode()
+        :param message: the payload of the message (``str`` or ``bytes``)
+        """
         try:
-            req_object = json.loads(req_body_raw)
-        except json.JSONDecodeError:
-            self.write_single_response(GenericResponse.PARSE_ERROR)
+            req_object = self.codec.loads(message)
+        except CodecDecodeError:
+            self.write_response(GenericResponse.PARSE_ERROR)
             return
 
-        # handle the actual call
+        admission = self.microservice.admission
+        try:
+            try:
+                admission.enter_request()
+            except ServerOverloadedError as e:
+                response = _make_error_responses(req_object,
+                                                 partial(self.make_overloaded_response, e))
+            else:
+                try:
+                    response = yield self.handle_payload(req_object)
+                finally:
+                    admission.exit_request()
+
+            if response is not None:
+                self.write_response(response)
+        except Exception:
+            self.microservice.logger.exception("Failed to handle a message")
+            response = _make_error_responses(
+                req_object, partial(GenericResponse.error, GenericResponse.INTERNAL_ERROR))
+            if response is not None:
+                self.write_response(response)
+
+    @coroutine
+    def handle_payload(self, req_object):
+        """
+        Handles the single or batch JSON RPC request from a decoded message.
+
+        :param req_object: the decoded message
+        :return: a :py:class:`gemstone.core.structs.JsonRpcResponse` or
+                 :py:class:`gemstone.core.structs.JsonRpcResponseBatch` instance, or ``None``
+                 if no response must be sent
+        """
         if isinstance(req_object, dict):
-            # single call
             try:
                 req_object = JsonRpcRequest.from_dict(req_object)
             except JsonRpcInvalidRequestError:
-                self.write_single_response(GenericResponse.INVALID_REQUEST)
-                return
+                return GenericResponse.INVALID_REQUEST
 
             if req_object.is_notification():
-                self.write_single_response(GenericResponse.NOTIFICATION_RESPONSE)
+                # not awaited: the empty response is sent without waiting for a free slot
+                self.microservice.notification_runner.submit(self, req_object)
+                return None
+
+            response = yield self.handle_single_request(req_object)
+            return response
+        elif isinstance(req_object, list) and req_object:
+            max_batch_size = self.microservice.max_batch_size
+            if max_batch_size and len(req_object) > max_batch_size:
+                return _make_error_responses(
+                    req_object, partial(GenericResponse.error, GenericResponse.BATCH_TOO_LARGE))
 
-            result = yield self.handle_single_request(req_object)
-            self.write_single_response(result)
-        elif isinstance(req_object, list):
-            if len(req_object) == 0:
-                self.write_single_response(GenericResponse.INVALID_REQUEST)
-                return
-
-            # batch call
             invalid_requests = []
             requests_futures = []
-            notification_futures = []
-
+            semaphore = Semaphore(self.microservice.max_batch_concurrency)
             for item in req_object:
                 try:
                     if not isinstance(item, dict):
                         raise JsonRpcInvalidRequestError()
                     current_rpc_call = JsonRpcRequest.from_dict(item)
-
-                    # handle notifications
-                    if current_rpc_call.is_notification():
-                        # we trigger their execution, but we don't yield for their results
-                        notification_futures.append(self.handle_single_request(current_rpc_call))
-                    else:
-                        requests_futures.append(self.handle_single_request(current_rpc_call))
                 except JsonRpcInvalidRequestError:
                     invalid_requests.append(GenericResponse.INVALID_REQUEST)
+                    continue
 
-            finished_rpc_calls = yield requests_futures
-            self.write_batch_response(JsonRpcResponseBatch(invalid_requests + finished_rpc_calls))
+                if current_rpc_call.is_notification():
+                    yield self.microservice.notification_runner.submit(self, current_rpc_call)
+                else:
+                    requests_futures.append(
+                        self.handle_bounded_request(semaphore, current_rpc_call))
+
+            response = yield self.collect_batch_responses(invalid_requests, requests_futures)
+            return response
         else:
-            self.write_single_response(GenericResponse.INVALID_REQUEST)
+            return GenericResponse.INVALID_REQUEST
+
+    @coroutine
+    def collect_batch_responses(self, responses, response_futures):
+        """
+        Waits for the responses of the calls of a batch.
+
+        :param responses: a list of :py:class:`gemstone.core.structs.JsonRpcResponse` that
+                          are already available
+        :param response_futures: a list of futures that will resolve to
+                                 :py:class:`gemstone.core.structs.JsonRpcResponse` instances
+        :return: a :py:class:`gemstone.core.structs.JsonRpcResponseBatch` instance, or
+                 ``None`` if no response must be sent
+        """
+        finished_rpc_calls = yield response_futures
+        responses = responses + finished_rpc_calls
+        # a batch of notifications does not receive a response
+        return JsonRpcResponseBatch(responses) if responses else None
+
+    @coroutine
+    def handle_bounded_request(self, semaphore, request_object):
+        """
+        Handles a single request object from a batch, after acquiring ``semaphore``.
+
+        :param semaphore: a :py:class:`tornado.locks.Semaphore` shared by the items of the batch
+        :param request_object: A :py:class:`gemstone.core.structs.JsonRpcRequest` object
+        :return: A :py:class:`gemstone.core.structs.JsonRpcResponse` object
+        """
+        with (yield semaphore.acquire()):
+            if self.connection_closed:
+                # nobody waits for the response
+                return GenericResponse.error(GenericResponse.INTERNAL_ERROR,
+                                             id=request_object.id)
+            response = yield self.handle_single_request(request_object)
+        return response
 
     @coroutine
     def handle_single_request(self, request_object):
@@ -134,183 +225,299 @@ class TornadoJsonRpcHandler(RequestHandler):
         if isinstance(request_object, JsonRpcResponse):
             return request_object
 
-        error = None
-        result = None
         id_ = request_object.id
 
-        # validate method name
-        if request_object.method not in self.methods:
-            resp = GenericResponse.METHOD_NOT_FOUND
-            resp.id = id_
-            return resp
+        descriptor = self.method_table.get(request_object.method)
+        if descriptor is None:
+            return GenericResponse.error(GenericResponse.METHOD_NOT_FOUND, id=id_)
+
+        # the rate limits are enforced before the parameters are validated
+        if descriptor.rate_limiter is not None:
+            key = self.get_client_identity() if descriptor.rate_limit_per_client else None
+            retry_after = descriptor.rate_limiter.acquire(key)
+            if retry_after:
+                return GenericResponse.error(GenericResponse.RATE_LIMITED, id=id_, data={
+                    "limit": descriptor.rate_limiter.rate,
+                    "retry_after": retry_after
+                })
+
+        # the cache hits are answered without being admitted or scheduled
+        response, method, call_key = self.prepare_request(request_object, descriptor)
+        if response is not None:
+            return response
+
+        admission = self.microservice.admission
+        try:
+            admission.enter_call(descriptor)
+        except ServerOverloadedError as e:
+            return self.make_overloaded_response(e, id_)
 
-        # check for private access
-        method = self.methods[request_object.method]
+        dispatch = partial(self.dispatch_request, request_object, descriptor, method, call_key)
+        limiter = self.microservice.concurrency_limiter
+        if limiter is not None:
+            dispatch = partial(limiter.run, dispatch)
+        scheduler = self.microservice.fair_scheduler
 
-        if isinstance(request_object.params, (list, tuple)):
-            self.call_method_from_all_plugins("on_method_call", request_object)
-        else:
-            self.call_method_from_all_plugins("on_method_call", request_object)
+        try:
+            if scheduler is None:
+                response = yield dispatch()
+            else:
+                identity = self.get_client_identity()
+                # tracked, so that the queued calls of a closed connection leave the queue
+                yield self.track_call(scheduler.acquire(identity))
+                try:
+                    response = yield dispatch()
+                finally:
+                    scheduler.release(identity)
+        except ServerOverloadedError as e:
+            response = self.make_overloaded_response(e, id_)
+        except CANCELLED_ERRORS:
+            # the client closed the connection, the response will not be sent
+            response = GenericResponse.error(GenericResponse.INTERNAL_ERROR, id=id_)
+        finally:
+            admission.exit_call(descriptor)
+        return response
+
+    def prepare_request(self, request_object, descriptor):
+        """
+        Validates a call and looks up its result in the cache of the method.
 
-        if self._method_is_private(method):
+        :param request_object: A :py:class:`gemstone.core.structs.JsonRpcRequest` object
+        :param descriptor: the :py:class:`gemstone.core.dispatch.MethodDescriptor` of the
+                           called method
+        :return: a ``(response, method, call_key)`` tuple: the response is an error or the
+                 cached result, or ``None`` if the method must be called with ``method()``.
+                 ``call_key`` identifies the parameters of the call for the cache and the
+                 single-flight execution.
+        """
+        id_ = request_object.id
+
+        for hook in descriptor.plugin_hooks:
+            hook(request_object)
+
+        # check for private access
+        if descriptor.private:
             if not self.get_current_user():
-                resp = GenericResponse.ACCESS_DENIED
-                resp.id = id_
-                return resp
+                return GenericResponse.error(GenericResponse.ACCESS_DENIED, id=id_), None, None
+
+        # the parameters are validated before the method is dispatched
+        try:
+            method = self.prepare_method_call(descriptor, request_object.params)
+        except JsonRpcInvalidParamsError:
+            return GenericResponse.error(GenericResponse.INVALID_PARAMS, id=id_), None, None
+
+        call_key = None
+        if descriptor.cache is not None or descriptor.single_flight is not None:
+            call_key = make_cache_key(method.args, method.keywords)
+
+        if descriptor.cache is not None:
+            found, result = descriptor.cache.get(call_key)
+            if found:
+                return JsonRpcResponse(result=result, id=id_), None, None
 
-        method = self.prepare_method_call(method, request_object.params)
+        return None, method, call_key
+
+    @coroutine
+    def dispatch_request(self, request_object, descriptor, method, call_key=None):
+        """
+        Executes an admitted call.
+
+        :param request_object: A :py:class:`gemstone.core.structs.JsonRpcRequest` object
+        :param descriptor: the :py:class:`gemstone.core.dispatch.MethodDescriptor` of the
+                           called method
+        :param method: the method bound to the parameters of the call (see
+                       :py:meth:`prepare_request`)
+        :param call_key: the key of the call in the cache of the method
+        :return: A :py:class:`gemstone.core.structs.JsonRpcResponse` object
+        :raises gemstone.errors.ServerOverloadedError: when the call is rejected because of
+                                                       the load
+        """
+        error = None
+        result = None
+        id_ = request_object.id
+        deadline = self.get_call_deadline(request_object, descriptor)
+
+        # the calls that nobody waits for are dropped
+        if deadline is not None and deadline <= time.monotonic():
+            return GenericResponse.error(GenericResponse.DEADLINE_EXCEEDED, id=id_)
 
         # before request hook
         _method_duration = time.time()
 
         try:
-            result = yield self.call_method(method)
+            if descriptor.single_flight is not None:
+                # identical concurrent calls share the same execution. It is not bound to the
+                # deadline and to the connection of the caller that started it, every caller
+                # only waits for it with its own deadline and can cancel only its wait
+                shared = descriptor.single_flight.run(
+                    call_key, partial(self.call_method, method, descriptor, None, tracked=False))
+                future = self.track_call(_wait_for(shared))
+            else:
+                future = self.call_method(method, descriptor, deadline)
+            if deadline is not None:
+                future = with_timeout(timedelta(seconds=max(deadline - time.monotonic(), 0)),
+                                      future, quiet_exceptions=(Exception,))
+            result = yield future
+        except ServerOverloadedError:
+            # reported by handle_single_request, the rejections from the executors must
+            # reach the concurrency limiter
+            raise
+        except (TimeoutError, DeadlineExceededError):
+            return GenericResponse.error(GenericResponse.DEADLINE_EXCEEDED, id=id_)
+        except CANCELLED_ERRORS:
+            # the client closed the connection, the response will not be sent
+            return GenericResponse.error(GenericResponse.INTERNAL_ERROR, id=id_)
         except Exception as e:
             # catch all exceptions generated by method
-            # and handle in a special manner only the TypeError
-            if isinstance(e, TypeError):
-                # TODO: find a proper way to check that the function got the wrong
-                # parameters (with **kwargs)
-                if "got an unexpected keyword argument" in e.args[0]:
-                    resp = GenericResponse.INVALID_PARAMS
-                    resp.id = id_
-                    return resp
-                # TODO: find a proper way to check that the function got the wrong
-                # parameters (with *args)
-                elif "takes" in e.args[0] and "positional argument" in e.args[0] and "were given" in \
-                        e.args[0]:
-                    resp = GenericResponse.INVALID_PARAMS
-                    resp.id = id_
-                    return resp
-                elif "missing" in e.args[0] and "required positional argument" in e.args[0]:
-                    resp = GenericResponse.INVALID_PARAMS
-                    resp.id = id_
-                    return resp
-            # generic handling for any exception (even TypeError) that
-            # is not generated because of bad parameters
-
             self.call_method_from_all_plugins("on_internal_error", e)
 
-            err = GenericResponse.INTERNAL_ERROR
-            err.id = id_
-            err.error["data"] = {
+            return GenericResponse.error(GenericResponse.INTERNAL_ERROR, id=id_, data={
                 "class": type(e).__name__,
                 "info": str(e)
-            }
-            return err
+            })
+
+        if descriptor.cache is not None:
+            descriptor.cache.set(call_key, result)
 
         to_return_resp = JsonRpcResponse(result=result, error=error, id=id_)
 
         return to_return_resp
 
-    def write_single_response(self, response_obj):
+    def get_call_deadline(self, request_object, descriptor):
         """
-        Writes a json rpc response ``{"result": result, "error": error, "id": id}``.
-        If the ``id`` is ``None``, the response will not contain an ``id`` field.
-        The response is sent to the client as an ``application/json`` response. Only one call per
-        response is allowed
+        Computes the deadline of a call: the earliest of the deadline of the request, of the
+        ``timeout`` extra field of the call (in seconds) and of the timeout of the method.
 
-        :param response_obj: A Json rpc response object
-        :return:
+        :param request_object: A :py:class:`gemstone.core.structs.JsonRpcRequest` object
+        :param descriptor: the :py:class:`gemstone.core.dispatch.MethodDescriptor` of the
+                           called method
+        :return: a :py:func:`time.monotonic` value or ``None``
         """
-        if not isinstance(response_obj, JsonRpcResponse):
-            raise ValueError(
-                "Expected JsonRpcResponse, but got {} instead".format(type(response_obj).__name__))
-
-        if not self.response_is_sent:
-            self.set_status(200)
-            self.set_header("Content-Type", "application/json")
-            self.finish(response_obj.to_string())
-            self.response_is_sent = True
-
-    def write_batch_response(self, batch_response):
-        self.set_header("Content-Type", "application/json")
-        self.write(batch_response.to_string())
-
-    def write_error(self, status_code, **kwargs):
-        if status_code == 405:
-            self.set_status(405)
-            self.write_single_response(
-                JsonRpcResponse(error={"code": 405, "message": "Method not allowed"}))
-            return
+        deadlines = [
+            self.request_deadline,
+            _parse_timeout(request_object.extra.get("timeout")),
+            time.monotonic() + descriptor.timeout if descriptor.timeout is not None else None
+        ]
+        deadlines = [deadline for deadline in deadlines if deadline is not None]
+        return min(deadlines) if deadlines else None
+
+    def make_overloaded_response(self, error, id_=None):
+        """
+        Builds the "Server overloaded" response for a rejected request.
 
-        exc_info = kwargs["exc_info"]
-        err = GenericResponse.INTERNAL_ERROR
-        err.error["data"] = {
-            "class": str(exc_info[0].__name__),
-            "info": str(exc_info[1])
-        }
-        self.set_status(200)
-        self.write_single_response(err)
+        :param error: the :py:class:`gemstone.errors.ServerOverloadedError` that caused the
+                      rejection
+        :param id_: the id of the request
+        :return: a :py:class:`gemstone.core.structs.JsonRpcResponse` instance
+        """
+        data = error.to_data()
+        if data["retry_after"] is None:
+            data["retry_after"] = self.microservice.overload_retry_after
+        return GenericResponse.error(GenericResponse.SERVER_OVERLOADED, id=id_, data=data)
 
-    def prepare_method_call(self, method, args):
+    def prepare_method_call(self, descriptor, args):
         """
         Wraps a method so that method() will call ``method(*args)`` or ``method(**args)``,
-        depending of args type
+        depending of args type. The parameters are bound against the signature of the method,
+        so the calls with invalid parameters are rejected without being dispatched.
 
-        :param method: a callable object (method)
+        :param descriptor: the :py:class:`gemstone.core.dispatch.MethodDescriptor` of the
+                           called method
         :param args: dict or list with the parameters for the function
         :return: a 'patched' callable
+        :raises gemstone.core.structs.JsonRpcInvalidParamsError: when the method can not be
+                                                                 called with ``args``
         """
-        if self._method_requires_handler_ref(method):
+        if descriptor.requires_handler:
             if isinstance(args, list):
                 args = [self] + args
             elif isinstance(args, dict):
                 args["handler"] = self
 
         if isinstance(args, list):
-            to_call = partial(method, *args)
+            args, kwargs = descriptor.bind_params(args, {})
         elif isinstance(args, dict):
-            to_call = partial(method, **args)
+            args, kwargs = descriptor.bind_params((), args)
         else:
             raise TypeError(
                 "args must be list or dict but got {} instead".format(type(args).__name__))
-        return to_call
+        return partial(descriptor.method, *args, **kwargs)
 
     @coroutine
-    def call_method(self, method):
+    def call_method(self, method, descriptor, deadline=None, tracked=True):
         """
         Calls a blocking method in an executor, in order to preserve the non-blocking behaviour
 
-        If ``method`` is a coroutine, yields from it and returns, no need to execute in
-        in an executor.
+        If ``method`` is a coroutine (native or Tornado), yields from it and returns, no need
+        to execute in in an executor.
 
         :param method: The method or coroutine to be called (with no arguments).
+        :param descriptor: the :py:class:`gemstone.core.dispatch.MethodDescriptor` of the
+                           called method
+        :param deadline: the deadline of the call, available to the method through
+                         :py:func:`gemstone.deadlines.get_deadline`
+        :param tracked: if ``False``, the call is not cancelled when the client closes the
+                        connection (for the calls shared by several clients)
         :return: the result of the method call
         """
-        if self._method_is_async_generator(method):
-            result = yield method()
-        else:
-            result = yield self.executor.submit(method)
+        token = set_deadline(deadline)
+        try:
+            if descriptor.execution != EXECUTION_EXECUTOR:
+                future = convert_yielded(method())
+                result = yield self.track_call(future) if tracked else future
+            elif descriptor.executor.limiter is not None:
+                result = yield descriptor.executor.limiter.run(
+                    partial(self.schedule_method, method, descriptor, deadline, tracked))
+            else:
+                result = yield self.schedule_method(method, descriptor, deadline, tracked)
+        finally:
+            reset_deadline(token)
         return result
 
-    @coroutine
-    def handle_batch_request(self, batch_req_obj):
-        responses = yield [self.handle_single_request(single_req) for single_req in
-                           batch_req_obj.iter_items()]
-        return responses
-
-    def _method_requires_handler_ref(self, method):
-        return getattr(method, "_req_h_ref", False)
+    def schedule_method(self, method, descriptor, deadline=None, tracked=True):
+        """
+        Schedules a blocking method in its executor.
+
+        :param method: the method to be called (with no arguments)
+        :param descriptor: the :py:class:`gemstone.core.dispatch.MethodDescriptor` of the
+                           called method
+        :param deadline: the deadline of the call
+        :param tracked: if ``False``, the call is not cancelled when the client closes the
+                        connection
+        :return: a :py:class:`concurrent.futures.Future` instance
+        """
+        future = descriptor.executor.schedule(method, descriptor.priority, deadline)
+        return self.track_call(future) if tracked else future
 
-    def _method_is_async_generator(self, method):
+    def track_call(self, future):
         """
-        Given a simple callable or a callable wrapped in funtools.partial, determines
-        if it was wrapped with the :py:func:`gemstone.async_method` decorator.
-        
-        :param method:
-        :return:
+        Keeps track of a call in progress, so it can be cancelled if the client closes
+        the connection.
+
+        :param future: the future of the call
+        :return: ``future``
         """
-        if hasattr(method, "func"):
-            func = method.func
-        else:
-            func = method
+        self._pending_calls.add(future)
+        future.add_done_callback(self._pending_calls.discard)
+        return future
 
-        return getattr(func, "_is_coroutine", False)
+    def cancel_pending_calls(self):
+        """
+        Called when the client closed the connection. Cancels the calls that nobody waits for:
+        the calls queued by the fair scheduler, the blocking calls that did not start yet and
+        the native coroutines. The calls that were not dispatched yet are dropped.
 
-    @staticmethod
-    def _method_is_private(method):
-        return getattr(method, "_exposed_private", False)
+        The running blocking calls and the Tornado coroutines can not be interrupted, but
+        their results are discarded.
+        """
+        self.connection_closed = True
+        if not self._pending_calls:
+            return
+        cancelled = 0
+        for future in list(self._pending_calls):
+            if future.cancel():
+                cancelled += 1
+        self.microservice.admission.record_abandoned_request(cancelled)
 
     def call_method_from_all_plugins(self, method, *args, **kwargs):
         for plugin in self.microservice.plugins:
@@ -318,3 +525,480 @@ class TornadoJsonRpcHandler(RequestHandler):
             if not method:
                 continue
             method_callable(*args, **kwargs)
+
+
+# noinspection PyAbstractClass
+class TornadoJsonRpcHandler(JsonRpcDispatcher, RequestHandler):
+    def __init__(self, *args, **kwargs):
+        self.response_is_sent = False
+        self.method_table = None
+        self.executor = None
+        self.validation_strategies = None
+        self.api_token_handlers = None
+        self.logger = None
+        self.microservice = None
+        self.codec = None
+        self._client_identity = None
+        #: the deadline of the request (a :py:func:`time.monotonic` value) sent by the client
+        #: in the ``X-Request-Timeout`` header, or ``None``
+        self.request_deadline = None
+        #: ``True`` after the client closed the connection
+        self.connection_closed = False
+        #: the :py:class:`gemstone.compression.BaseCompressor` negotiated for the response, or
+        #: ``None`` if the response is not compressed
+        self.response_compressor = None
+        self._pending_calls = set()
+        self._response_future = None
+        super(TornadoJsonRpcHandler, self).__init__(*args, **kwargs)
+
+    # noinspection PyMethodOverriding
+    def initialize(self, microservice):
+        self.logger = microservice.logger
+        self.method_table = microservice.method_table
+        self.executor = microservice.get_executor()
+        self.response_is_sent = False
+        self.microservice = microservice
+        self.codec = microservice.codec
+
+    def on_connection_close(self):
+        """
+        Called when the client closes the connection before receiving the response (see
+        :py:meth:`JsonRpcDispatcher.cancel_pending_calls`).
+        """
+        self.cancel_pending_calls()
+        super(TornadoJsonRpcHandler, self).on_connection_close()
+
+    def get_current_user(self):
+        return self.microservice.authenticate_request(self)
+
+    @coroutine
+    def post(self):
+        self.request_deadline = _parse_timeout(self.request.headers.get(TIMEOUT_HEADER))
+        if self.microservice.compressors:
+            self.set_header("Vary", "Accept-Encoding")
+            self.response_compressor = self.get_response_compressor()
+
+        # the load is shed before the body is parsed
+        admission = self.microservice.admission
+        try:
+            admission.enter_request()
+        except ServerOverloadedError as e:
+            if e.retry_after is not None:
+                self.set_header("Retry-After", str(int(math.ceil(e.retry_after))))
+            self.write_single_response(self.make_overloaded_response(e))
+            yield self.wait_response_sent()
+            return
+
+        try:
+            yield self.handle_request()
+            yield self.wait_response_sent()
+        finally:
+            admission.exit_request()
+
+    @coroutine
+    def handle_request(self):
+        """
+        Parses the body of the request and handles the single or batch JSON RPC request.
+        """
+        content_type = self.request.headers.get("Content-type", "").split(";")[0].strip()
+        request_codec = self.microservice.get_codec(content_type.lower())
+        if request_codec is None:
+            self.write_single_response(GenericResponse.INVALID_REQUEST)
+            return
+        self.codec = self.get_response_codec(request_codec)
+
+        body = self.request.body
+        encoding = self.request.headers.get("Content-Encoding", "identity").strip().lower()
+        if encoding != "identity":
+            compressor = get_compressor(encoding, self.microservice.compressors)
+            if compressor is None:
+                self.write_single_response(GenericResponse.INVALID_REQUEST)
+                return
+            try:
+                body = yield self.decompress_request_body(compressor, body)
+            except ContentEncodingError:
+                self.write_single_response(GenericResponse.PARSE_ERROR)
+                return
+
+        try:
+            req_object = request_codec.loads(body)
+        except CodecDecodeError:
+            self.write_single_response(GenericResponse.PARSE_ERROR)
+            return
+
+        response = yield self.handle_payload(req_object)
+        if self.response_is_sent:
+            # the batch response was streamed
+            return
+        if response is None:
+            # the notifications receive an empty response
+            response = JsonRpcResponseBatch([]) if isinstance(req_object, list) else \
+                GenericResponse.NOTIFICATION_RESPONSE
+
+        if isinstance(response, JsonRpcResponseBatch):
+            self.write_batch_response(response)
+        else:
+            self.write_single_response(response)
+
+    @coroutine
+    def collect_batch_responses(self, responses, response_futures):
+        """
+        Streams the batch response if
+        :py:attr:`gemstone.core.MicroService.stream_batch_responses` is enabled (see
+        :py:meth:`write_streamed_batch_response`).
+        """
+        if self.microservice.stream_batch_responses:
+            yield self.write_streamed_batch_response(responses, response_futures)
+            return None
+        response = yield super(TornadoJsonRpcHandler, self).collect_batch_responses(
+            responses, response_futures)
+        return response
+
+    def get_response_codec(self, request_codec):
+        """
+        Chooses the codec of the response from the ``Accept`` header of the request, in the
+        order of preference of the client. The codec of the request is used if the header
+        is missing or if none of the accepted content types is supported.
+
+        :param request_codec: the codec used to decode the request
+        :return: a :py:class:`gemstone.codecs.BaseCodec` instance
+        """
+        for media_type in _parse_quality_list(self.request.headers.get("Accept")):
+            if media_type in ("*/*", request_codec.content_type):
+                return request_codec
+            codec = self.microservice.get_codec(media_type)
+            if codec is not None:
+                return codec
+        return request_codec
+
+    def get_response_compressor(self):
+        """
+        Chooses the encoding of the response from the ``Accept-Encoding`` header of the
+        request, in the order of preference of the client.
+
+        :return: one of the :py:attr:`gemstone.core.MicroService.compressors` or ``None`` if
+                 the response must not be compressed
+        """
+        compressors = self.microservice.compressors
+        for encoding in _parse_quality_list(self.request.headers.get("Accept-Encoding")):
+            if encoding == "identity":
+                return None
+            if encoding == "*":
+                return compressors[0] if compressors else None
+            compressor = get_compressor(encoding, compressors)
+            if compressor is not None:
+                return compressor
+        return None
+
+    @coroutine
+    def decompress_request_body(self, compressor, body):
+        """
+        Decompresses the body of the request. The size of the decompressed body is not known
+        in advance, so the body is decompressed on the IOLoop until it reaches
+        :py:attr:`gemstone.core.MicroService.compression_offload_size`, then it is
+        decompressed again outside the IOLoop. The decompressed body can not be larger than
+        :py:attr:`gemstone.core.MicroService.max_decompressed_request_size`.
+
+        :raises gemstone.errors.ContentEncodingError: if the body is not valid or too large
+        """
+        max_size = self.microservice.max_decompressed_request_size
+        offload_size = self.microservice.compression_offload_size
+        try:
+            data, duration = _timed(partial(compressor.decompress,
+                                            max_size=min(max_size, offload_size)), body)
+            offloaded = False
+        except ContentTooLargeError:
+            if max_size <= offload_size:
+                raise
+            data, duration, offloaded = yield self.run_compression(
+                partial(compressor.decompress, max_size=max_size), body, offload=True)
+        self.microservice.compression_metrics.record("requests", compressor.encoding,
+                                                     len(data), len(body), duration, offloaded)
+        return data
+
+    @coroutine
+    def run_compression(self, func, data, offload):
+        """
+        Compresses or decompresses ``data`` with ``func``, in
+        :py:attr:`gemstone.core.MicroService.compression_executor` if ``offload`` is ``True``
+        and the executor is not saturated, on the IOLoop otherwise.
+
+        :return: a ``(result, duration, offloaded)`` tuple
+        """
+        if offload:
+            executor = self.microservice.get_executor(self.microservice.compression_executor)
+            try:
+                future = executor.submit(_timed, func, data)
+            except ServerOverloadedError:
+                pass
+            else:
+                result, duration = yield future
+                return result, duration, True
+
+        result, duration = _timed(func, data)
+        return result, duration, False
+
+    @coroutine
+    def wait_response_sent(self):
+        """
+        Waits until the response, that may be compressed outside the IOLoop, is sent.
+        """
+        if self._response_future is not None:
+            yield self._response_future
+
+    def finish_response(self, data):
+        """
+        Finishes the request with a serialized response, compressed with
+        :py:attr:`response_compressor` if it is not smaller than
+        :py:attr:`gemstone.core.MicroService.compression_min_size`. The response is sent when
+        the future returned by :py:meth:`wait_response_sent` resolves.
+
+        :param data: the serialized response (``bytes``)
+        """
+        self.response_is_sent = True
+        self._response_future = self._finish_compressed(data)
+
+    @coroutine
+    def _finish_compressed(self, data):
+        compressor = self.response_compressor
+        metrics = self.microservice.compression_metrics
+        if compressor is not None and len(data) < self.microservice.compression_min_size:
+            metrics.record_skipped("responses")
+            compressor = None
+
+        if compressor is not None:
+            offload = len(data) >= self.microservice.compression_offload_size
+            compressed, duration, offloaded = yield self.run_compression(compressor.compress,
+                                                                         data, offload)
+            metrics.record("responses", compressor.encoding, len(data), len(compressed),
+                           duration, offloaded)
+            data = compressed
+            self.set_header("Content-Encoding", compressor.encoding)
+
+        if not self.connection_closed:
+            self.finish(data)
+
+    def write_single_response(self, response_obj):
+        """
+        Writes a json rpc response ``{"result": result, "error": error, "id": id}``.
+        If the ``id`` is ``None``, the response will not contain an ``id`` field.
+        The response is serialized with the codec negotiated for the request (see
+        :py:meth:`get_response_codec`), ``application/json`` by default. Only one call per
+        response is allowed
+
+        :param response_obj: A Json rpc response object
+        :return:
+        """
+        if not isinstance(response_obj, JsonRpcResponse):
+            raise ValueError(
+                "Expected JsonRpcResponse, but got {} instead".format(type(response_obj).__name__))
+
+        if self.connection_closed:
+            return
+
+        if not self.response_is_sent:
+            self.set_status(200)
+            self.set_header("Content-Type", self.codec.content_type)
+            self.finish_response(self.codec.dumps(response_obj.to_dict()))
+
+    def write_batch_response(self, batch_response):
+        if self.connection_closed:
+            return
+        self.set_header("Content-Type", self.codec.content_type)
+        self.finish_response(
+            self.codec.dumps([item.to_dict() for item in batch_response.iter_items()]))
+
+    @coroutine
+    def write_streamed_batch_response(self, responses, response_futures):
+        """
+        Streams the response for a batch request, using the chunked transfer encoding.
+        Each response is written and flushed as soon as it is available, in the order of
+        completion.
+
+        :param responses: a list of :py:class:`gemstone.core.structs.JsonRpcResponse` that
+                          are already available
+        :param response_futures: a list of futures that will resolve to
+                                 :py:class:`gemstone.core.structs.JsonRpcResponse` instances
+        """
+        self.response_is_sent = True
+        prefix, separator, suffix = self.codec.array_framing(
+            len(responses) + len(response_futures))
+
+        self.set_header("Content-Type", self.codec.content_type)
+        self.write(prefix)
+        for index, response in enumerate(responses):
+            if index:
+                self.write(separator)
+            self.write(self.codec.dumps(response.to_dict()))
+
+        needs_separator = bool(responses)
+        waiter = WaitIterator(*response_futures)
+        while not waiter.done():
+            response = yield waiter.next()
+            if self.connection_closed:
+                continue
+            if needs_separator:
+                self.write(separator)
+            self.write(self.codec.dumps(response.to_dict()))
+            needs_separator = True
+            yield self.flush()
+
+        if not self.connection_closed:
+            self.finish(suffix)
+
+    def write_error(self, status_code, **kwargs):
+        # the errors must be written before this method returns
+        self.response_compressor = None
+        if status_code == 405:
+            self.set_status(405)
+            self.write_single_response(
+                JsonRpcResponse(error={"code": 405, "message": "Method not allowed"}))
+            return
+
+        exc_info = kwargs["exc_info"]
+        err = GenericResponse.error(GenericResponse.INTERNAL_ERROR, data={
+            "class": str(exc_info[0].__name__),
+            "info": str(exc_info[1])
+        })
+        self.set_status(200)
+        self.write_single_response(err)
+
+    @coroutine
+    def handle_batch_request(self, batch_req_obj):
+        responses = yield [self.handle_single_request(single_req) for single_req in
+                           batch_req_obj.iter_items()]
+        return responses
+
+
+# noinspection PyAbstractClass
+class TornadoJsonRpcWebSocketHandler(JsonRpcDispatcher, WebSocketHandler):
+    """
+    Handles the JSON RPC calls received over a persistent WebSocket connection (see
+    :py:attr:`gemstone.core.MicroService.websocket_endpoint`).
+
+    Every message contains a single call or a batch. The messages of a connection are handled
+    concurrently and their responses are sent as soon as they are available, so the clients
+    must match them by ``id``. The notifications do not receive a response. At most
+    :py:attr:`gemstone.core.MicroService.websocket_max_in_flight` messages of a connection are
+    handled at the same time; the next messages are not read until one of them completes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.method_table = None
+        self.logger = None
+        self.microservice = None
+        self.codec = None
+        self._client_identity = None
+        self._semaphore = None
+        #: the WebSocket messages have no deadline, the calls can have a ``timeout`` field
+        self.request_deadline = None
+        #: ``True`` after the connection was closed
+        self.connection_closed = False
+        self._pending_calls = set()
+        super(TornadoJsonRpcWebSocketHandler, self).__init__(*args, **kwargs)
+
+    # noinspection PyMethodOverriding
+    def initialize(self, microservice):
+        self.logger = microservice.logger
+        self.method_table = microservice.method_table
+        self.microservice = microservice
+        self.codec = microservice.codec
+        self._semaphore = Semaphore(microservice.websocket_max_in_flight)
+
+    def get_current_user(self):
+        return self.microservice.authenticate_request(self)
+
+    @coroutine
+    def on_message(self, message):
+        # Tornado does not read the next message until the returned future resolves
+        yield self._semaphore.acquire()
+        # not awaited: the responses are sent in the order of completion
+        self.handle_message(message).add_done_callback(lambda _: self._semaphore.release())
+
+    def on_close(self):
+        self.cancel_pending_calls()
+
+    def write_response(self, response):
+        """
+        Sends the response for a message.
+
+        :param response: a :py:class:`gemstone.core.structs.JsonRpcResponse` or
+                         :py:class:`gemstone.core.structs.JsonRpcResponseBatch` instance
+        """
+        if self.connection_closed:
+            return
+        if isinstance(response, JsonRpcResponseBatch):
+            payload = [item.to_dict() for item in response.iter_items()]
+        else:
+            payload = response.to_dict()
+        try:
+            self.write_message(self.codec.dumps(payload), binary=self.codec.binary)
+        except WebSocketClosedError:
+            pass
+
+
+def _make_error_responses(req_object, make_error):
+    # the error response of a decoded message that can not be handled, with the ids of its
+    # calls (a batch of errors for a batch), or None if nobody waits for it
+    if isinstance(req_object, list) and req_object:
+        ids = [_get_request_id(item) for item in req_object]
+        responses = [make_error(id_) for id_ in ids if id_ is not None]
+        return JsonRpcResponseBatch(responses) if responses else None
+    if isinstance(req_object, dict) and _get_request_id(req_object) is None:
+        return None
+    return make_error(_get_request_id(req_object))
+
+
+def _get_request_id(item):
+    id_ = item.get("id") if isinstance(item, dict) else None
+    return id_ if isinstance(id_, (int, str)) else None
+
+
+def _wait_for(future):
+    # a future that resolves like ``future``, but can be cancelled without cancelling it
+    waiter = Future()
+    chain_future(future, waiter)
+    return waiter
+
+
+def _parse_quality_list(value):
+    # returns the items of an Accept or Accept-Encoding header in the order of preference,
+    # without the ones that are not acceptable (q=0)
+    if not value:
+        return []
+
+    items = []
+    for index, item in enumerate(value.split(",")):
+        name, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, param_value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(param_value)
+                except ValueError:
+                    pass
+        name = name.strip().lower()
+        if name and quality > 0:
+            items.append((-quality, index, name))
+    return [name for _, _, name in sorted(items)]
+
+
+def _timed(func, data):
+    start = time.perf_counter()
+    result = func(data)
+    return result, time.perf_counter() - start
+
+
+def _parse_timeout(value):
+    # returns the deadline for a timeout (in seconds) sent by the client
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        return None
+    if timeout != timeout:
+        # NaN
+        return None
+    return time.monotonic() + max(timeout, 0)
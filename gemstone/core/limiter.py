@@ -0,0 +1,159 @@
+import time
+
+from tornado.gen import coroutine
+from tornado.ioloop import IOLoop
+from tornado.locks import Condition
+
+from gemstone.errors import ServerOverloadedError
+
+__all__ = [
+    'AdaptiveConcurrencyLimiter'
+]
+
+
+class AdaptiveConcurrencyLimiter(object):
+    """
+    Limits the number of concurrent calls to a limit that is adjusted at runtime, based on the
+    observed latency of the calls (AIMD - additive increase, multiplicative decrease).
+
+    - when a call completes in less than ``latency_threshold`` seconds while the limit is
+      used at least by half, the limit is increased by 1
+    - when a call takes more than ``latency_threshold`` seconds or is rejected downstream
+      (for example by a saturated executor), the limit is multiplied by ``backoff_ratio``
+
+    The calls over the limit wait at most ``max_wait`` seconds for a free slot and are
+    rejected with a "Server overloaded" error afterwards.
+
+    Example usage
+
+    ::
+
+        class MyMicroService(gemstone.MicroService):
+            # ...
+            concurrency_limiter = AdaptiveConcurrencyLimiter(initial_limit=16,
+                                                             latency_threshold=0.5)
+
+            executors = [
+                ThreadExecutor("db", max_workers=32,
+                               limiter=AdaptiveConcurrencyLimiter(max_limit=32))
+            ]
+
+    All the methods must be called from the IOLoop.
+
+    :param initial_limit: the initial concurrency limit
+    :param min_limit: the lower bound of the limit
+    :param max_limit: the upper bound of the limit
+    :param latency_threshold: the latency (in seconds) above which the limit is decreased
+    :param backoff_ratio: the ratio by which the limit is decreased (between 0 and 1)
+    :param max_wait: how many seconds a call can wait for a free slot before being rejected.
+                     If ``0``, the calls over the limit are rejected right away.
+    :param retry_after: the retry hint (in seconds) of the rejected calls, or ``None``
+    """
+
+    def __init__(self, initial_limit=20, min_limit=1, max_limit=200, latency_threshold=1.0,
+                 backoff_ratio=0.9, max_wait=0.05, retry_after=None):
+        if not 0 < min_limit <= initial_limit <= max_limit:
+            raise ValueError("The limits must satisfy 0 < min_limit <= initial_limit <= "
+                             "max_limit")
+        if not 0 < backoff_ratio < 1:
+            raise ValueError("backoff_ratio must be between 0 and 1")
+        if latency_threshold <= 0 or max_wait < 0:
+            raise ValueError("latency_threshold and max_wait must be positive numbers")
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+        self.backoff_ratio = backoff_ratio
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+
+        self._limit = float(initial_limit)
+        self._condition = Condition()
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def limit(self):
+        """
+        The current concurrency limit.
+        """
+        return int(self._limit)
+
+    @coroutine
+    def acquire(self):
+        """
+        Waits for a free slot.
+
+        :raises gemstone.errors.ServerOverloadedError: when no slot became free in
+                                                       ``max_wait`` seconds
+        """
+        if self.in_flight >= self.limit:
+            deadline = IOLoop.current().time() + self.max_wait
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.limit:
+                    if not self.max_wait or not (yield self._condition.wait(timeout=deadline)):
+                        self.rejected += 1
+                        raise ServerOverloadedError("Concurrency limit reached", "limiter",
+                                                    self.retry_after, limit=self.limit)
+            finally:
+                self.waiting -= 1
+        self.in_flight += 1
+
+    def release(self, latency, dropped=False):
+        """
+        Releases a slot and adjusts the limit.
+
+        :param latency: the duration of the call (in seconds)
+        :param dropped: ``True`` if the call was rejected downstream because of the load
+        """
+        if dropped or latency > self.latency_threshold:
+            self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+            self.decreases += 1
+        elif self.in_flight * 2 >= self._limit and self._limit < self.max_limit:
+            self._limit = min(self.max_limit, self._limit + 1)
+            self.increases += 1
+
+        self.in_flight -= 1
+        free_slots = self.limit - self.in_flight
+        if free_slots > 0:
+            self._condition.notify(free_slots)
+
+    @coroutine
+    def run(self, func):
+        """
+        Calls ``func`` in a slot and measures its latency.
+
+        :param func: a callable with no parameters that returns a future
+        :return: the result of the future
+        :raises gemstone.errors.ServerOverloadedError: when the call is rejected
+        """
+        yield self.acquire()
+        start = time.monotonic()
+        dropped = False
+        try:
+            result = yield func()
+        except ServerOverloadedError:
+            dropped = True
+            raise
+        finally:
+            self.release(time.monotonic() - start, dropped)
+        return result
+
+    def get_metrics(self):
+        """
+        :return: a ``dict`` with the current limit, the number of calls in flight, waiting and
+                 rejected and how many times the limit was increased and decreased
+        """
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "increases": self.increases,
+            "decreases": self.decreases
+        }
@@ -0,0 +1,327 @@
+"""
+In-process dispatch between the microservices that run in the same process (for example
+several services sharing the same IOLoop).
+
+When the service located by :py:meth:`gemstone.core.MicroService.get_service` runs in the
+same process, a :py:class:`LocalService` proxy is returned instead of a
+:py:class:`gemstone.client.RemoteService`. The proxy has the same interface, but the calls are
+dispatched directly to the method table and to the executors of the target service: no HTTP
+request is made and the parameters and the results are not serialized. The calls go through
+the same rate limits, admission control, schedulers, caches and deadlines as the remote calls.
+
+.. versionadded:: 0.13.0
+"""
+
+import concurrent.futures
+import copy
+import fnmatch
+import threading
+import time
+import weakref
+
+from tornado.concurrent import chain_future
+from tornado.gen import coroutine, convert_yielded
+from tornado.ioloop import IOLoop
+
+from gemstone.client.structs import MethodCall, Notification, Result, BatchResult, \
+    AsyncMethodCall
+from gemstone.core.handlers import JsonRpcDispatcher
+from gemstone.core.structs import JsonRpcRequest
+from gemstone.deadlines import get_deadline
+from gemstone.errors import DeadlineExceededError
+
+__all__ = [
+    'LocalServiceRegistry',
+    'LocalService',
+    'LocalCall',
+    'local_registry'
+]
+
+
+class LocalServiceRegistry(object):
+    """
+    Keeps track of the microservices that run in the current process. The services are
+    registered when they start and are held by weak references.
+    """
+
+    def __init__(self):
+        self._services = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def register(self, microservice):
+        """
+        :param microservice: a started :py:class:`gemstone.core.MicroService` instance
+        """
+        with self._lock:
+            self._services.add(microservice)
+
+    def unregister(self, microservice):
+        with self._lock:
+            self._services.discard(microservice)
+
+    def locate(self, name):
+        """
+        Looks up the services by name.
+
+        :param name: a name or a glob-like pattern (``"project.worker.*"``)
+        :return: a list of :py:class:`gemstone.core.MicroService` instances
+        """
+        with self._lock:
+            return [service for service in self._services
+                    if fnmatch.fnmatchcase(service.name, name)]
+
+
+#: The registry of the microservices that run in the current process
+local_registry = LocalServiceRegistry()
+
+
+class LocalCall(JsonRpcDispatcher):
+    """
+    The dispatch context of an in-process call (the counterpart of the request handler).
+    The in-process calls are trusted: :py:meth:`gemstone.core.MicroService.authenticate_request`
+    is not called and the calling service is used as the user and as the client identity.
+
+    The methods exposed with ``requires_handler_reference=True`` receive the :py:class:`LocalCall`
+    as the handler. Only the ``microservice``, ``method_table``, ``logger``, ``caller``,
+    ``request_deadline`` and ``connection_closed`` attributes and the
+    :py:meth:`get_current_user` and :py:meth:`get_client_identity` methods are available:
+    there is no ``request`` attribute (no HTTP request is made).
+
+    :param microservice: the called :py:class:`gemstone.core.MicroService`
+    :param caller: the name of the calling service, or ``None``
+    :param deadline: the deadline of the call (a :py:func:`time.monotonic` value) or ``None``
+    """
+
+    def __init__(self, microservice, caller=None, deadline=None):
+        self.microservice = microservice
+        self.method_table = microservice.method_table
+        self.logger = microservice.logger
+        self.caller = caller
+        self.request_deadline = deadline
+        self.connection_closed = False
+        self._pending_calls = set()
+
+    def get_current_user(self):
+        return self.caller or "local"
+
+    def get_client_identity(self):
+        return self.get_current_user()
+
+
+class _FutureResult(object):
+    # adapts a concurrent.futures.Future to the interface expected by AsyncMethodCall
+
+    def __init__(self, future):
+        self._future = future
+
+    def ready(self):
+        return self._future.done()
+
+    def wait(self, timeout=None):
+        concurrent.futures.wait([self._future], timeout=timeout)
+
+    def get(self, timeout=None):
+        return self._future.result(timeout)
+
+    def successful(self):
+        if not self.ready():
+            raise ValueError("The call is not finished")
+        return self._future.exception() is None
+
+
+class LocalService(object):
+    """
+    In-process proxy for a microservice, with the interface of
+    :py:class:`gemstone.client.RemoteService`.
+
+    The blocking methods (:py:meth:`call_method`, :py:meth:`call_batch`, etc.) can be used from
+    the blocking methods of the calling service (they are executed in the executors). The
+    coroutines must use :py:meth:`call` instead, because blocking the IOLoop of the target
+    service would deadlock.
+
+    :param microservice: the target :py:class:`gemstone.core.MicroService` instance
+    :param copy_on_call: if ``True``, the parameters and the results are deep copied, so that
+                         the caller and the target never share mutable objects (like they
+                         would not through a remote call)
+    :param timeout: how many seconds to wait for the responses. When the proxy is used while
+                    handling a call that has a deadline, the deadline is propagated.
+    :param caller: the name of the calling service
+    """
+
+    def __init__(self, microservice, *, copy_on_call=False, timeout=None, caller=None):
+        self.microservice = microservice
+        self.copy_on_call = copy_on_call
+        self.timeout = timeout
+        self.caller = caller
+
+    @property
+    def url(self):
+        return self.microservice.accessible_at
+
+    @coroutine
+    def call(self, method_name_or_object, params=None):
+        """
+        Calls a method of the target service. Must be used from the IOLoop of the target
+        service.
+
+        :param method_name_or_object: the name of the called method, a ``MethodCall`` or a
+                                      ``Notification`` instance
+        :param params: a list or a dict with the parameters of the call
+        :return: a :py:class:`gemstone.client.structs.Result` instance (``None`` for the
+                 notifications)
+        """
+        results = yield self._dispatch([_make_request(method_name_or_object, params)],
+                                       self._get_deadline())
+        return results[0]
+
+    def call_method(self, method_name_or_object, params=None):
+        """
+        Calls a method of the target service and waits for the result.
+
+        :param method_name_or_object: the name of the called method or a ``MethodCall``
+                                      instance
+        :param params: a list or a dict with the parameters of the call
+        :return: a :py:class:`gemstone.client.structs.Result` instance
+        :raises RuntimeError: when called from the IOLoop of the target service
+        :raises gemstone.errors.DeadlineExceededError: when the result was not received in
+                                                       time
+        """
+        req_obj = _make_request(method_name_or_object, params, MethodCall)
+        return self._wait(self._submit([req_obj]))[0]
+
+    def call_method_async(self, method_name_or_object, params=None):
+        """
+        Calls a method of the target service without waiting for the result.
+
+        :return: a :py:class:`gemstone.client.structs.AsyncMethodCall` instance.
+        """
+        req_obj = _make_request(method_name_or_object, params, MethodCall)
+        future = _map_future(self._submit([req_obj]),
+                             lambda results: _to_raw_response(results[0]))
+        return AsyncMethodCall(req_obj=req_obj, async_resp_object=_FutureResult(future))
+
+    def notify(self, method_name_or_object, params=None):
+        """
+        Sends a notification to the target service. Does not wait for its execution.
+        """
+        req_obj = _make_request(method_name_or_object, params, Notification)
+        self._submit([req_obj], wait=False)
+
+    def call_batch(self, *requests):
+        """
+        Calls multiple methods concurrently.
+
+        :param requests: :py:class:`gemstone.client.structs.MethodCall` and
+                         :py:class:`gemstone.client.structs.Notification` instances
+        :return: a :py:class:`gemstone.client.structs.BatchResult` instance
+        :raises gemstone.errors.DeadlineExceededError: when the results were not received in
+                                                       time
+        """
+        for item in requests:
+            if not isinstance(item, (MethodCall, Notification)):
+                raise TypeError("Invalid type for batch item: {}".format(item))
+
+        results = self._wait(self._submit(list(requests)))
+        return BatchResult(*[result for result in results if result is not None])
+
+    def iter_batch(self, *requests):
+        """
+        Just like :py:meth:`call_batch`, but returns an iterator of
+        :py:class:`gemstone.client.structs.Result` instances.
+        """
+        return iter(self.call_batch(*requests))
+
+    def get_timeout(self):
+        deadline = self._get_deadline()
+        return deadline - time.monotonic() if deadline is not None else None
+
+    def _get_deadline(self):
+        deadlines = [get_deadline(),
+                     time.monotonic() + self.timeout if self.timeout is not None else None]
+        deadlines = [deadline for deadline in deadlines if deadline is not None]
+        return min(deadlines) if deadlines else None
+
+    def _submit(self, requests, wait=True):
+        # hands the calls over to the IOLoop of the target service
+        io_loop = self.microservice.io_loop
+        if wait and IOLoop.current(instance=False) is io_loop:
+            raise RuntimeError("The blocking methods of LocalService can not be used from "
+                               "the IOLoop of the called service, use call() instead")
+
+        deadline = self._get_deadline()
+        future = concurrent.futures.Future()
+        io_loop.add_callback(
+            lambda: chain_future(convert_yielded(self._dispatch(requests, deadline)), future))
+        return future
+
+    def _wait(self, future):
+        # the calls are dropped when their deadline passes, but the IOLoop of the target
+        # service may be blocked or stopped
+        timeout = self.get_timeout()
+        try:
+            return future.result(max(timeout, 0) if timeout is not None else None)
+        except concurrent.futures.TimeoutError:
+            raise DeadlineExceededError("The local service did not respond in time")
+
+    @coroutine
+    def _dispatch(self, requests, deadline):
+        context = LocalCall(self.microservice, caller=self.caller, deadline=deadline)
+        request_objects = []
+        for request in requests:
+            params = request.params
+            if self.copy_on_call:
+                params = copy.deepcopy(params)
+            request_objects.append(JsonRpcRequest(method=request.method_name, params=params,
+                                                  id=request.id))
+
+        responses = yield [self._dispatch_one(context, request_object)
+                           for request_object in request_objects]
+
+        results = []
+        for request, response in zip(requests, responses):
+            if isinstance(request, Notification):
+                results.append(None)
+                continue
+            result = response.response
+            if self.copy_on_call:
+                result = copy.deepcopy(result)
+            results.append(Result(result=result, error=response.error, id=request.id,
+                                  method_call=request))
+        return results
+
+    @coroutine
+    def _dispatch_one(self, context, request_object):
+        if request_object.is_notification():
+            # executed in background, like the notifications from the batch requests
+            yield self.microservice.notification_runner.submit(context, request_object)
+            return None
+        response = yield context.handle_single_request(request_object)
+        return response
+
+    def __repr__(self):
+        return "<LocalService {}>".format(self.microservice.name)
+
+
+def _make_request(method_name_or_object, params, kind=None):
+    if isinstance(method_name_or_object, (MethodCall, Notification)):
+        if kind is not None and not isinstance(method_name_or_object, kind):
+            raise TypeError("Expected a {} instance".format(kind.__name__))
+        return method_name_or_object
+    return (kind or MethodCall)(method_name_or_object, params)
+
+
+def _to_raw_response(result):
+    return {"result": result.result, "error": result.error, "id": result.id}
+
+
+def _map_future(future, func):
+    mapped = concurrent.futures.Future()
+
+    def copy_result(source):
+        if source.exception() is not None:
+            mapped.set_exception(source.exception())
+        else:
+            mapped.set_result(func(source.result()))
+
+    future.add_done_callback(copy_result)
+    return mapped
@@ -1,26 +1,44 @@
+import asyncio
 import logging
 import os
 import functools
 import random
+import socket
 import threading
 import sys
-from concurrent.futures import ThreadPoolExecutor
 
 from tornado.web import StaticFileHandler
 from tornado.ioloop import IOLoop, PeriodicCallback
 from tornado.web import Application
 from tornado.log import enable_pretty_logging
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets, bind_unix_socket
 
+from gemstone.codecs import get_default_codec, get_accepted_codecs
+from gemstone.compression import CompressionMetrics, get_available_compressors
 from gemstone.config import Configurable, CommandLineConfigurator
 from gemstone.discovery.cache import ServiceDiscoveryCache
 from gemstone.errors import ServiceConfigurationError, PluginDoesNotExistError
-from gemstone.core.handlers import TornadoJsonRpcHandler
+from gemstone.core.handlers import TornadoJsonRpcHandler, TornadoJsonRpcWebSocketHandler
 from gemstone.core.decorators import exposed_method
+from gemstone.core.cache import make_cache_key
+from gemstone.core.dispatch import MethodDescriptor, EXECUTION_EXECUTOR
+from gemstone.core.executors import ThreadExecutor, ProcessExecutor
+from gemstone.core.admission import AdmissionController
+from gemstone.core.structs import JsonRpcInvalidParamsError
+from gemstone.core.notifications import NotificationRunner
+from gemstone.core.watchdog import IOLoopWatchdog
+from gemstone.core.workers import WorkerSupervisor, reuse_port_supported
+from gemstone.core.local import LocalService, local_registry
+from gemstone.core.tcp import JsonRpcTcpServer, TCP_SCHEME
+from gemstone.client.unix import make_unix_url
 from gemstone.core.container import Container
 from gemstone.util import get_remote_service_instance_for_url
 
 IS_WINDOWS = sys.platform.startswith("win32")
 
+WORKER_COMPONENTS = ("on_service_start", "plugins", "periodic_tasks", "event_transports")
+
 
 class MicroService(Container):
     #: The name of the service. Is required.
@@ -32,13 +50,88 @@ class MicroService(Container):
     #: The port where the service will bind
     port = 8000
 
+    #: If ``False``, the service does not listen on :py:attr:`host` and :py:attr:`port` (it
+    #: can be accessed only on its :py:attr:`unix_socket`).
+    listen_tcp = True
+
+    #: The path of a Unix domain socket where the service will listen, besides (or instead of,
+    #: see :py:attr:`listen_tcp`) the TCP port. The services on the same host can call it
+    #: with a ``unix://`` URL (see :py:mod:`gemstone.client.unix`), bypassing the TCP stack.
+    unix_socket = None
+
+    #: The permissions of :py:attr:`unix_socket`
+    unix_socket_mode = 0o600
+
+    #: The port of an optional raw TCP listener for the internal JSON RPC traffic, that
+    #: receives length prefixed frames instead of HTTP requests (see
+    #: :py:mod:`gemstone.core.tcp`). It listens on :py:attr:`host`. If ``None``, the
+    #: listener is disabled.
+    tcp_transport_port = None
+
+    #: The maximum size (in bytes) of the frames received by the raw TCP listener. The
+    #: connections that send larger frames are closed.
+    tcp_transport_max_frame_size = 16 * 1024 * 1024
+
+    #: How many frames of a raw TCP connection can be handled at the same time.
+    tcp_transport_max_in_flight = 64
+
+    #: If ``True``, :py:attr:`accessible_at` defaults to the ``tcp://`` URL of the raw TCP
+    #: listener, so the clients that locate the service through the service registries use
+    #: the raw TCP transport.
+    advertise_tcp_transport = False
+
     #: The url where the service can be accessed by other microservices.
-    #: Useful when using a service registry.
+    #: Useful when using a service registry. Defaults to the ``unix://`` URL of
+    #: :py:attr:`unix_socket` when the service does not listen on TCP and to the ``tcp://``
+    #: URL of the raw TCP listener if :py:attr:`advertise_tcp_transport` is ``True``.
     accessible_at = None
 
     #: The path in the URL where the microservice JSON RPC endpoint will be accessible.
     endpoint = "/api"
 
+    #: The path in the URL of an optional WebSocket JSON RPC endpoint (for example ``"/ws"``).
+    #: The clients can send many calls and batches over the same connection and receive the
+    #: responses in the order of completion (see :py:class:`gemstone.client.RemoteService`
+    #: with a ``ws://`` URL). If ``None``, the endpoint is disabled.
+    websocket_endpoint = None
+
+    #: How many messages of a WebSocket connection can be handled at the same time.
+    websocket_max_in_flight = 64
+
+    #: The :py:class:`gemstone.codecs.BaseCodec` instance used to decode the JSON RPC requests
+    #: and to encode the responses. Defaults to the fastest available JSON codec.
+    codec = get_default_codec()
+
+    #: The codecs of the other content types accepted by the HTTP endpoint. The requests are
+    #: decoded according to their ``Content-Type`` header and the responses are encoded
+    #: with the codec requested in the ``Accept`` header (the codec of the request by
+    #: default). Defaults to :py:class:`gemstone.codecs.MsgPackCodec` (``application/msgpack``)
+    #: if ``msgpack`` is installed. The WebSocket and raw TCP connections always use
+    #: :py:attr:`codec`.
+    accepted_codecs = get_accepted_codecs()
+
+    #: The content encodings (:py:class:`gemstone.compression.BaseCompressor` instances) of
+    #: the HTTP endpoint. The requests are decompressed according to their
+    #: ``Content-Encoding`` header and the responses are compressed with the encoding
+    #: preferred by the client in the ``Accept-Encoding`` header. Defaults to ``zstd`` and
+    #: ``br`` (if ``zstandard``, respectively ``brotli`` are installed) and ``gzip``. An empty
+    #: list disables the compression. The streamed batch responses are not compressed.
+    compressors = get_available_compressors()
+
+    #: The responses smaller than this many bytes are sent uncompressed.
+    compression_min_size = 1024
+
+    #: The bodies of at least this many bytes (before compression) are compressed and
+    #: decompressed in :py:attr:`compression_executor`, so that they do not block the IOLoop.
+    compression_offload_size = 128 * 1024
+
+    #: The name of the executor used for the large bodies (see :py:attr:`executors`). If
+    #: ``None``, the default executor is used.
+    compression_executor = None
+
+    #: The maximum size of the decompressed body of a request.
+    max_decompressed_request_size = 64 * 1024 * 1024
+
     #: Template directory used by the created Tornado Application.
     #: Useful when you plan to add web application functionality
     #: to the microservice.
@@ -63,6 +156,17 @@ class MicroService(Container):
     ]
     remote_service_cache = ServiceDiscoveryCache(3600)
 
+    #: If ``True``, :py:meth:`get_service` returns in-process proxies
+    #: (:py:class:`gemstone.core.local.LocalService`) for the services that run in the same
+    #: process, so the calls skip HTTP and serialization. Disabled by default: the blocking
+    #: methods of :py:class:`gemstone.core.local.LocalService` can not be used from the IOLoop
+    #: of the called service (the periodic tasks, the event handlers, the coroutines).
+    local_dispatch = False
+
+    #: If ``True``, the parameters and the results of the in-process calls are deep copied
+    #: (see :py:attr:`local_dispatch`).
+    local_copy_on_call = False
+
     #: A list of (callable, time_in_seconds) that will enable periodic task execution.
     periodic_tasks = []
 
@@ -75,6 +179,7 @@ class MicroService(Container):
         Configurable("port",
                      template=lambda x: random.randint(8000, 65000) if x == "random" else int(x)),
         Configurable("host"),
+        Configurable("unix_socket"),
         Configurable("accessible_at"),
         Configurable("endpoint")
     ]
@@ -98,6 +203,84 @@ class MicroService(Container):
     max_parallel_blocking_tasks = os.cpu_count()
     _executor = None
 
+    #: A list of :py:class:`gemstone.core.executors.ManagedExecutor` instances that can be
+    #: used by the blocking methods besides the default executor (see the ``executor``
+    #: parameter of :py:func:`gemstone.core.exposed_method`). If a method uses the
+    #: ``"process"`` executor and it is not declared here, a
+    #: :py:class:`gemstone.core.executors.ProcessExecutor` with one worker per CPU is created.
+    executors = []
+
+    #: How many requests from the same JSON RPC batch can be executed at the same time.
+    max_batch_concurrency = 32
+
+    #: The maximum number of items of a JSON RPC batch. Larger batches are rejected
+    #: before their items are handled. If ``None``, the size of the batches is not limited.
+    max_batch_size = None
+
+    #: If ``True``, the responses for the JSON RPC batch requests are streamed (using
+    #: the chunked transfer encoding): every response is sent as soon as it is available,
+    #: without waiting for the whole batch to complete. The order of the responses is the
+    #: order of completion.
+    stream_batch_responses = False
+
+    #: How many notifications from JSON RPC batches can be executed in background at the
+    #: same time.
+    max_concurrent_notifications = 32
+
+    #: How many HTTP requests can be handled concurrently by the JSON RPC handler. The requests
+    #: over this limit are rejected with a "Server overloaded" error before their body is
+    #: parsed. If ``None``, the number of requests is not limited.
+    max_in_flight_requests = None
+
+    #: The number of seconds after which the clients of the requests rejected because
+    #: the service is overloaded are advised to retry (sent in the ``data`` of the error
+    #: and in the ``Retry-After`` header). The executors can override it.
+    overload_retry_after = 1
+
+    #: A :py:class:`gemstone.core.limiter.AdaptiveConcurrencyLimiter` instance that adjusts
+    #: at runtime how many calls are handled concurrently, based on their latency. If
+    #: ``None``, the concurrency is not limited adaptively.
+    concurrency_limiter = None
+
+    #: A :py:class:`gemstone.core.fairness.FairScheduler` instance that shares the capacity
+    #: of the service fairly between its clients (see :py:meth:`get_client_identity`). If
+    #: ``None``, the calls are handled in the order of their arrival.
+    fair_scheduler = None
+
+    #: The default rate limit of the exposed methods that do not have their own (see the
+    #: ``rate_limit`` parameter of :py:func:`gemstone.core.exposed_method`), for example
+    #: ``"100/s"``. Every method has its own limit. If ``None``, the rate is not limited.
+    rate_limit = None
+
+    #: The default burst for :py:attr:`rate_limit`
+    rate_limit_burst = None
+
+    #: If ``True``, the default :py:attr:`rate_limit` applies separately to every client.
+    rate_limit_per_client = False
+
+    #: The number of worker processes started by :py:meth:`start`. The workers share the
+    #: listening address (using ``SO_REUSEPORT`` when available) and are supervised by a
+    #: parent process that restarts them when they crash. Requires ``os.fork``.
+    workers = 1
+
+    #: The components that are started in every worker process when the service runs with
+    #: multiple :py:attr:`workers`: ``"on_service_start"``, ``"plugins"``,
+    #: ``"periodic_tasks"`` and ``"event_transports"``. The components not listed here are
+    #: started only in the first worker.
+    per_worker_components = ("on_service_start", "plugins")
+
+    #: The number of seconds to wait before restarting a worker process that crashed right
+    #: after it was started.
+    worker_restart_delay = 1.0
+
+    #: Interval (in seconds) at which the IOLoop lag is measured. If ``None``, the
+    #: IOLoop watchdog is disabled.
+    io_loop_watchdog_interval = 0.5
+
+    #: If the IOLoop is blocked for more than this number of seconds (by a coroutine,
+    #: a plugin, a periodic task, etc.), the stack of the blocking code is captured and logged.
+    io_loop_blocking_threshold = 0.2
+
     # noinspection PyMissingConstructor
     def __init__(self, io_loop=None):
         """
@@ -117,14 +300,35 @@ class MicroService(Container):
             raise ServiceConfigurationError("No name defined for the microservice")
         self.logger.debug("Service name: {}".format(self.name))
 
+        # listening addresses
+        if not self.listen_tcp and not self.unix_socket:
+            raise ServiceConfigurationError("The service must listen on TCP or on a Unix socket")
+        if self.unix_socket and not hasattr(socket, "AF_UNIX"):
+            raise ServiceConfigurationError("Unix domain sockets are not supported")
+
+        if self.advertise_tcp_transport and not self.tcp_transport_port:
+            raise ServiceConfigurationError("advertise_tcp_transport requires tcp_transport_port")
+        if self.tcp_transport_max_frame_size <= 0 or self.tcp_transport_max_in_flight <= 0:
+            raise ServiceConfigurationError("Invalid raw TCP transport limits")
+
         # endpoint
         if self.accessible_at is None:
-            self.accessible_at = "http://{host}:{port}{endpoint}".format(
-                host=self.host, port=self.port, endpoint=self.endpoint
-            )
+            if self.advertise_tcp_transport:
+                self.accessible_at = "{scheme}://{host}:{port}".format(
+                    scheme=TCP_SCHEME, host=self.host, port=self.tcp_transport_port
+                )
+            elif self.listen_tcp:
+                self.accessible_at = "http://{host}:{port}{endpoint}".format(
+                    host=self.host, port=self.port, endpoint=self.endpoint
+                )
+            else:
+                self.accessible_at = make_unix_url(self.unix_socket, self.endpoint)
 
         # methods
         self.methods = {}
+        #: maps the exposed method names to their
+        #: :py:class:`gemstone.core.dispatch.MethodDescriptor`
+        self.method_table = {}
 
         # event handlers
         self.event_handlers = {}
@@ -133,34 +337,141 @@ class MicroService(Container):
         if self.max_parallel_blocking_tasks <= 0:
             raise ServiceConfigurationError("Invalid max_parallel_blocking_tasks value")
 
-        self._executor = ThreadPoolExecutor(self.max_parallel_blocking_tasks)
+        self._executor = ThreadExecutor("default", self.max_parallel_blocking_tasks)
+        self._executors = {self._executor.name: self._executor}
+        for executor in self.executors:
+            if executor.name in self._executors:
+                raise ServiceConfigurationError(
+                    "Duplicate executor name: '{}'".format(executor.name))
+            self._executors[executor.name] = executor
+        if self.compression_executor is not None:
+            self.get_executor(self.compression_executor)
+
+        unknown_components = set(self.per_worker_components) - set(WORKER_COMPONENTS)
+        if unknown_components:
+            raise ServiceConfigurationError(
+                "Invalid per_worker_components: {}".format(", ".join(sorted(unknown_components))))
+
+        if self.max_batch_concurrency <= 0:
+            raise ServiceConfigurationError("Invalid max_batch_concurrency value")
+        if self.websocket_max_in_flight <= 0:
+            raise ServiceConfigurationError("Invalid websocket_max_in_flight value")
+
+        #: the :py:class:`gemstone.core.admission.AdmissionController` that sheds the load
+        #: when the service is overloaded
+        self.admission = AdmissionController(self.max_in_flight_requests,
+                                             self.overload_retry_after)
+
+        #: counts the compressed responses and the decompressed requests (see
+        #: :py:class:`gemstone.compression.CompressionMetrics`)
+        self.compression_metrics = CompressionMetrics()
+
+        #: runs the notifications received in batch requests
+        self.notification_runner = NotificationRunner(self.max_concurrent_notifications,
+                                                      self.logger)
 
         # ioloop
         self.io_loop = io_loop or IOLoop.current()
 
-    def start(self):
+        #: The :py:class:`gemstone.core.watchdog.IOLoopWatchdog` instance that monitors the
+        #: IOLoop (``None`` until the service is started or if the watchdog is disabled)
+        self.io_loop_watchdog = None
+
+        #: The index of the worker process that runs this instance (``None`` if the service
+        #: does not run with multiple :py:attr:`workers`)
+        self.worker_id = None
+
+    def start(self, workers=None):
         """
         The main method that starts the service. This is blocking.
 
+        :param workers: the number of worker processes that serve the requests. If ``None``,
+                        :py:attr:`workers` is used. With more than one worker, a
+                        :py:class:`gemstone.core.workers.WorkerSupervisor` pre-forks the
+                        workers, restarts the ones that crash and forwards them the signals
+                        it receives.
+
+        .. versionchanged:: 0.13.0
+            Added the ``workers`` parameter.
         """
+        workers = self.workers if workers is None else workers
+        if workers <= 0:
+            raise ServiceConfigurationError("Invalid workers value")
+
+        if workers == 1:
+            self._serve()
+        else:
+            WorkerSupervisor(self, workers, restart_delay=self.worker_restart_delay,
+                             logger=self.logger).run()
+
+    def _serve(self, sockets=None):
         self._initial_setup()
-        self.on_service_start()
+        if self._runs_in_this_worker("on_service_start"):
+            self.on_service_start()
 
         self.app = self.make_tornado_app()
         enable_pretty_logging()
-        self.app.listen(self.port, address=self.host)
-
-        self._start_periodic_tasks()
+        if sockets is None:
+            sockets = self._bind_sockets()
+        HTTPServer(self.app).add_sockets(sockets["http"])
+        if sockets["tcp_transport"]:
+            JsonRpcTcpServer(self).add_sockets(sockets["tcp_transport"])
+
+        if self._runs_in_this_worker("periodic_tasks"):
+            self._start_periodic_tasks()
+        self._start_io_loop_watchdog()
         # starts the event handlers
         self._initialize_event_handlers()
-        self._start_event_handlers()
+        if self._runs_in_this_worker("event_transports"):
+            self._start_event_handlers()
 
+        local_registry.register(self)
+        already_running = False
         try:
             self.io_loop.start()
         except RuntimeError:
             # TODO : find a way to check if the io_loop is running before trying to start it
             # this method to check if the loop is running is ugly
-            pass
+            already_running = True
+        finally:
+            if not already_running:
+                # the stopped service can not be called in-process anymore
+                local_registry.unregister(self)
+                # the stopped IOLoop would be reported as blocked
+                if self.io_loop_watchdog is not None:
+                    self.io_loop_watchdog.stop()
+
+    def _run_worker(self, worker_id, sockets=None):
+        # called in the forked worker process
+        self.worker_id = worker_id
+        random.seed()
+
+        # the IOLoop of the supervisor must not be shared with the workers
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        self.io_loop = IOLoop.current()
+
+        # the supervisor binds the TCP sockets only if SO_REUSEPORT is not available
+        sockets = {name: list(bound) for name, bound in (sockets or {}).items()}
+        if reuse_port_supported():
+            for name, bound in self._bind_sockets(unix=False, reuse_port=True).items():
+                sockets.setdefault(name, []).extend(bound)
+        self._serve(sockets)
+
+    def _bind_sockets(self, tcp=True, unix=True, reuse_port=False):
+        # the listening sockets of the HTTP server and of the raw TCP transport
+        sockets = {"http": [], "tcp_transport": []}
+        if tcp and self.listen_tcp:
+            sockets["http"].extend(
+                bind_sockets(self.port, address=self.host, reuse_port=reuse_port))
+        if tcp and self.tcp_transport_port:
+            sockets["tcp_transport"].extend(
+                bind_sockets(self.tcp_transport_port, address=self.host, reuse_port=reuse_port))
+        if unix and self.unix_socket:
+            sockets["http"].append(bind_unix_socket(self.unix_socket, mode=self.unix_socket_mode))
+        return sockets
+
+    def _runs_in_this_worker(self, component):
+        return self.worker_id in (None, 0) or component in self.per_worker_components
 
     def get_plugin(self, name):
         """
@@ -199,6 +510,27 @@ class MicroService(Container):
         """
         return True
 
+    def get_client_identity(self, handler):
+        """
+        Identifies the client that sent the current request, for the per client policies
+        (see :py:attr:`fair_scheduler`). By default, the user returned by
+        :py:meth:`authenticate_request` is used if it is not a simple boolean, otherwise the
+        IP address of the client.
+
+        :param handler: a JsonRpcRequestHandler instance for the current request
+        :return: a hashable object
+
+        .. versionadded:: 0.13.0
+        """
+        user = handler.current_user
+        if user is None or isinstance(user, bool):
+            return handler.get_remote_ip()
+        try:
+            hash(user)
+        except TypeError:
+            return str(user)
+        return user
+
     def get_logger(self):
         """
         Override this method to designate the logger for the application
@@ -225,11 +557,21 @@ class MicroService(Container):
             Make this use self.io_loop to resolve the request. The current
             implementation is blocking and slow
 
+        If :py:attr:`local_dispatch` is enabled and a matching service runs in the same
+        process, an in-process :py:class:`gemstone.core.local.LocalService` proxy is returned
+        instead, without querying the service registries.
+
         :param name: a pattern for the searched service.
         :return: a :py:class:`gemstone.RemoteService` instance
         :raises ValueError: when the service can not be located
         :raises ServiceConfigurationError: when there is no configured discovery strategy
         """
+        if self.local_dispatch:
+            local_services = local_registry.locate(name)
+            if local_services:
+                return LocalService(random.choice(local_services),
+                                    copy_on_call=self.local_copy_on_call, caller=self.name)
+
         if not self.discovery_strategies:
             raise ServiceConfigurationError("No service registry available")
 
@@ -258,11 +600,128 @@ class MicroService(Container):
         """
         return self.io_loop or IOLoop.current()
 
-    def get_executor(self):
+    def get_codec(self, content_type):
         """
-        Returns the ThreadPoolExecutor used by the microservice.
+        Returns the codec for a content type, :py:attr:`codec` or one of the
+        :py:attr:`accepted_codecs`.
+
+        :param content_type: a MIME type, like ``"application/msgpack"``
+        :return: a :py:class:`gemstone.codecs.BaseCodec` instance or ``None`` if the content
+                 type is not accepted
+        """
+        for codec in [self.codec] + list(self.accepted_codecs):
+            if codec.content_type == content_type:
+                return codec
+        return None
+
+    def get_executor(self, name=None):
+        """
+        Returns an executor used by the microservice.
+
+        :param name: the name of the executor. If ``None``, the default executor is returned.
+        :return: a :py:class:`gemstone.core.executors.ManagedExecutor` instance (which is
+                 also a :py:class:`concurrent.futures.Executor`)
+        :raises ServiceConfigurationError: if there is no executor with the given name
+
+        .. versionchanged:: 0.13.0
+            Added the ``name`` parameter
         """
-        return self._executor
+        if name is None:
+            return self._executor
+
+        executor = self._executors.get(name)
+        if executor is None:
+            if name != "process":
+                raise ServiceConfigurationError("No executor named '{}'".format(name))
+            executor = ProcessExecutor("process")
+            self._executors[name] = executor
+        return executor
+
+    def invalidate_cache(self, method_name, params=None):
+        """
+        Removes the cached results of an exposed method declared with
+        ``exposed_method(cache=...)``.
+
+        :param method_name: the name under which the method is exposed
+        :param params: a ``list`` or ``dict`` with the parameters of the call whose result
+                       should be removed. If ``None``, all the cached results of the method
+                       are removed.
+        :raises ValueError: if the method does not exist, its results are not cached or the
+                            parameters are not valid
+
+        .. versionadded:: 0.13.0
+        """
+        descriptor = self.method_table.get(method_name)
+        if descriptor is None or descriptor.cache is None:
+            raise ValueError("No cached method named '{}'".format(method_name))
+
+        if params is None:
+            descriptor.cache.invalidate()
+            return
+
+        try:
+            if isinstance(params, dict):
+                args, kwargs = descriptor.bind_params((), params)
+            else:
+                args, kwargs = descriptor.bind_params(list(params), {})
+        except JsonRpcInvalidParamsError as e:
+            raise ValueError("Invalid params for '{}': {}".format(method_name, e))
+        descriptor.cache.invalidate(make_cache_key(args, kwargs))
+
+    def get_metrics(self):
+        """
+        Returns the runtime metrics of the microservice.
+
+        Example result ::
+
+            {
+                "notifications": {"max_concurrency": 32, "running": 0, "waiting": 0,
+                                  "completed": 10, "failed": 0},
+                "io_loop": {
+                    "lag": {"samples": 1024, "p50": 0.0004, "p90": 0.001, "p99": 0.05, "max": 0.3},
+                    "blocking": {"count": 1, "incidents": [
+                        {"timestamp": 1492857600.0, "duration": 0.3, "stack": ["..."]}
+                    ]}
+                }
+            }
+
+        :return: a ``dict`` with the metrics, grouped by component.
+
+        .. versionadded:: 0.13.0
+        """
+        metrics = {
+            "executors": {name: executor.get_metrics()
+                          for name, executor in self._executors.items()},
+            "admission": self.admission.get_metrics(),
+            "notifications": self.notification_runner.get_metrics()
+        }
+        cache_metrics = {name: descriptor.cache.get_metrics()
+                         for name, descriptor in self.method_table.items()
+                         if descriptor.cache is not None}
+        if cache_metrics:
+            metrics["cache"] = cache_metrics
+        rate_limit_metrics = {name: descriptor.rate_limiter.get_metrics()
+                              for name, descriptor in self.method_table.items()
+                              if descriptor.rate_limiter is not None}
+        if rate_limit_metrics:
+            metrics["rate_limits"] = rate_limit_metrics
+        single_flight_metrics = {name: descriptor.single_flight.get_metrics()
+                                 for name, descriptor in self.method_table.items()
+                                 if descriptor.single_flight is not None}
+        if single_flight_metrics:
+            metrics["single_flight"] = single_flight_metrics
+        if self.fair_scheduler is not None:
+            metrics["fair_scheduler"] = self.fair_scheduler.get_metrics()
+        if self.concurrency_limiter is not None:
+            metrics["concurrency_limiter"] = self.concurrency_limiter.get_metrics()
+        if self.compressors:
+            metrics["compression"] = self.compression_metrics.get_metrics()
+        if self.io_loop_watchdog:
+            metrics["io_loop"] = self.io_loop_watchdog.get_metrics()
+        if self.worker_id is not None:
+            # every worker process reports only its own metrics
+            metrics["worker"] = {"id": self.worker_id, "pid": os.getpid()}
+        return metrics
 
     def start_thread(self, target, args, kwargs):
         """
@@ -328,12 +787,24 @@ class MicroService(Container):
         Registers a plugin instance.
         """
         self.plugins.append(plugin)
+        if self.method_table:
+            # the plugin hooks are part of the method descriptors
+            self._build_method_table()
 
     def _start_periodic_tasks(self):
         for periodic_task in self._periodic_task_iter():
             self.logger.debug("Starting periodic task {}".format(periodic_task))
             periodic_task.start()
 
+    def _start_io_loop_watchdog(self):
+        if not self.io_loop_watchdog_interval:
+            return
+        self.io_loop_watchdog = IOLoopWatchdog(self.io_loop,
+                                               interval=self.io_loop_watchdog_interval,
+                                               threshold=self.io_loop_blocking_threshold,
+                                               logger=self.logger)
+        self.io_loop_watchdog.start()
+
     def __del__(self):
         for plugin in self.plugins:
             self.io_loop.add_callback(plugin.on_service_stop)
@@ -376,6 +847,9 @@ class MicroService(Container):
         handlers = [
             (self.endpoint, TornadoJsonRpcHandler, {"microservice": self})
         ]
+        if self.websocket_endpoint:
+            handlers.append((self.websocket_endpoint, TornadoJsonRpcWebSocketHandler,
+                             {"microservice": self}))
 
         self._add_extra_handlers(handlers)
         self._add_static_handlers(handlers)
@@ -413,6 +887,34 @@ class MicroService(Container):
         for module in self.modules:
             self._extract_methods_from_container(module)
 
+        self._build_method_table()
+
+    def _build_method_table(self):
+        if self.rate_limit is not None:
+            default_rate_limit = {"rate": self.rate_limit, "burst": self.rate_limit_burst,
+                                  "per_client": self.rate_limit_per_client}
+        else:
+            default_rate_limit = None
+
+        method_table = {}
+        for name, method in self.methods.items():
+            executor_name = getattr(method, "_executor_name", None)
+            if executor_name is None:
+                # the executor of the container, used only by the blocking methods
+                container_executor = getattr(method.__self__, "executor", None)
+            else:
+                container_executor = None
+
+            descriptor = MethodDescriptor.from_method(
+                name, method, self.plugins,
+                executor=self.get_executor(executor_name or container_executor),
+                default_rate_limit=default_rate_limit)
+            if executor_name and descriptor.execution != EXECUTION_EXECUTOR:
+                raise ServiceConfigurationError(
+                    "Coroutine '{}' can not be assigned to an executor".format(name))
+            method_table[name] = descriptor
+        self.method_table = method_table
+
     def _extract_methods_from_container(self, container):
         for item in container.get_exposed_methods():
             exposed_name = getattr(item, '_exposed_name', item.__name__)
@@ -476,6 +978,8 @@ class MicroService(Container):
                 setattr(self, name, value)
 
     def _call_on_init_plugins(self):
+        start_plugins = self._runs_in_this_worker("plugins")
         for plugin in self.plugins:
             plugin.set_microservice(self)
-            plugin.on_service_start()
+            if start_plugins:
+                plugin.on_service_start()
@@ -0,0 +1,86 @@
+from tornado.gen import coroutine
+from tornado.locks import Semaphore
+
+__all__ = [
+    'NotificationRunner'
+]
+
+
+class NotificationRunner(object):
+    """
+    Runs the JSON RPC notifications in background. A notification starts as soon as it is
+    submitted, so the notifications from a batch run while the other calls of the batch are
+    executed and its response is built. Nobody waits for them.
+
+    At most ``max_concurrency`` notifications are executed at the same time. The failures
+    (unhandled exceptions and error responses) are logged and counted, so they do not
+    vanish silently.
+
+    :param max_concurrency: how many notifications can be executed concurrently
+    :param logger: a :py:class:`logging.Logger` instance used to report the failures.
+    """
+
+    def __init__(self, max_concurrency, logger):
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be a positive number")
+
+        self.max_concurrency = max_concurrency
+        self.logger = logger
+        self._semaphore = Semaphore(max_concurrency)
+
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+
+    @coroutine
+    def submit(self, handler, request_object):
+        """
+        Schedules a notification for execution. Resolves as soon as the notification
+        started (waits only if ``max_concurrency`` notifications are already running).
+
+        :param handler: the :py:class:`gemstone.core.handlers.TornadoJsonRpcHandler` that
+                        received the notification
+        :param request_object: the :py:class:`gemstone.core.structs.JsonRpcRequest` of the
+                               notification
+        """
+        self.waiting += 1
+        try:
+            yield self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        # not awaited: the notification is supervised by _run
+        self._run(handler, request_object)
+
+    @coroutine
+    def _run(self, handler, request_object):
+        try:
+            response = yield handler.handle_single_request(request_object)
+        except Exception:
+            self.failed += 1
+            self.logger.exception("Notification {} failed".format(request_object))
+        else:
+            if response is not None and response.error:
+                self.failed += 1
+                self.logger.warning("Notification {} failed: {}".format(request_object,
+                                                                        response.error))
+            else:
+                self.completed += 1
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+    def get_metrics(self):
+        """
+        :return: a ``dict`` with the number of running, waiting, completed and
+                 failed notifications
+        """
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed
+        }
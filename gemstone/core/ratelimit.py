@@ -0,0 +1,111 @@
+import collections
+import re
+import time
+
+__all__ = [
+    'TokenBucketLimiter',
+    'parse_rate'
+]
+
+RATE_REGEX = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*/\s*([a-z]+)\s*$')
+
+RATE_UNITS = {
+    "s": 1, "sec": 1, "second": 1,
+    "m": 60, "min": 60, "minute": 60,
+    "h": 3600, "hour": 3600
+}
+
+
+def parse_rate(rate):
+    """
+    Parses a rate like ``"100/s"``, ``"30/m"`` or ``"1000/h"``.
+
+    :param rate: the rate as a string
+    :return: a ``(count, seconds)`` tuple (eg. ``(100.0, 1)`` for ``"100/s"``)
+    :raises ValueError: when the rate is not valid
+    """
+    match = RATE_REGEX.match(rate)
+    if not match or match.group(2) not in RATE_UNITS or float(match.group(1)) <= 0:
+        raise ValueError("Invalid rate: '{}'".format(rate))
+    return float(match.group(1)), RATE_UNITS[match.group(2)]
+
+
+class TokenBucketLimiter(object):
+    """
+    Token bucket rate limiter with a bucket for every key (for example for every client).
+
+    Every bucket holds at most ``burst`` tokens and is refilled continuously at the given
+    rate. A call consumes a token and is rejected if the bucket is empty. A bucket that was
+    not used for long enough to be full again is equivalent to a new bucket, so it is
+    discarded: only the recently active keys take memory.
+
+    :param rate: the sustained rate, as a string (eg. ``"100/s"``, see :py:func:`parse_rate`)
+    :param burst: the capacity of the buckets. Defaults to the count from ``rate`` (eg. 100 for
+                  ``"100/s"``).
+    """
+
+    def __init__(self, rate, burst=None):
+        count, seconds = parse_rate(rate)
+        if burst is None:
+            burst = max(count, 1)
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+
+        self.rate = rate
+        self.burst = burst
+        self.tokens_per_second = count / seconds
+        self._refill_time = burst / self.tokens_per_second
+
+        # key -> [tokens, last update], ordered by the last update
+        self._buckets = collections.OrderedDict()
+
+        self.allowed = 0
+        self.rejected = 0
+
+    def acquire(self, key=None):
+        """
+        Consumes a token from the bucket of ``key``.
+
+        :param key: the key of the bucket (``None`` for a single, shared bucket)
+        :return: ``0`` if the call is allowed, otherwise the number of seconds after which
+                 a token will be available
+        """
+        now = time.monotonic()
+        self._evict_idle(now)
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self._buckets[key] = bucket
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.tokens_per_second)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return 0
+
+        self.rejected += 1
+        return (1 - bucket[0]) / self.tokens_per_second
+
+    def get_metrics(self):
+        """
+        :return: a ``dict`` with the number of allowed and rejected calls and the number of
+                 active keys
+        """
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "keys": len(self._buckets)
+        }
+
+    def _evict_idle(self, now):
+        while self._buckets:
+            key, (tokens, last_update) = next(iter(self._buckets.items()))
+            if now - last_update < self._refill_time:
+                break
+            del self._buckets[key]
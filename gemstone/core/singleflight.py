@@ -0,0 +1,52 @@
+__all__ = [
+    'SingleFlightGroup'
+]
+
+
+class SingleFlightGroup(object):
+    """
+    Coalesces the identical concurrent calls of an exposed method: while a call is in
+    progress, the calls with the same key wait for its result instead of executing the
+    method again.
+
+    Used by the exposed methods declared with ``exposed_method(single_flight=True)``. Must be
+    used only from the IOLoop.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+
+        self.executions = 0
+        self.shared = 0
+
+    def run(self, key, func):
+        """
+        Calls ``func`` if there is no call in progress for ``key``, or joins the call in
+        progress otherwise.
+
+        :param key: a hashable key that identifies the call (see
+                    :py:func:`gemstone.core.cache.make_cache_key`)
+        :param func: a callable with no arguments that returns a future
+        :return: the future of the call
+        """
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.shared += 1
+            return future
+
+        future = func()
+        self.executions += 1
+        self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return future
+
+    def get_metrics(self):
+        """
+        :return: a ``dict`` with the number of calls in progress, of executions and of
+                 calls that shared the result of another call
+        """
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "shared": self.shared
+        }
@@ -13,6 +13,10 @@ class JsonRpcInvalidRequestError(JsonRpcError):
     pass
 
 
+class JsonRpcInvalidParamsError(JsonRpcError):
+    pass
+
+
 class JsonRpcRequest(object):
     def __init__(self, method=None, params=None, id=None, extra=None):
         self.method = method
@@ -188,9 +192,33 @@ class GenericResponse:
     INVALID_PARAMS = JsonRpcResponse(error={"code": -32602, "message": "Invalid params"})
     INTERNAL_ERROR = JsonRpcResponse(error={"code": -32603, "message": "Internal error"})
     ACCESS_DENIED = JsonRpcResponse(error={"code": -32001, "message": "Access denied"})
+    BATCH_TOO_LARGE = JsonRpcResponse(error={"code": -32002, "message": "Batch too large"},
+                                      send_id_field=True)
+    SERVER_OVERLOADED = JsonRpcResponse(error={"code": -32003, "message": "Server overloaded"},
+                                        send_id_field=True)
+    RATE_LIMITED = JsonRpcResponse(error={"code": -32004, "message": "Rate limit exceeded"})
+    DEADLINE_EXCEEDED = JsonRpcResponse(error={"code": -32005, "message": "Deadline exceeded"})
 
     NOTIFICATION_RESPONSE = JsonRpcResponse()
 
+    @staticmethod
+    def error(template, id=None, data=None):
+        """
+        Builds a new error response from one of the generic responses, so that the shared
+        instances are never modified. Only the ``code`` and the ``message`` of the template
+        are copied.
+
+        :param template: a generic error response (for example
+                         ``GenericResponse.SERVER_OVERLOADED``)
+        :param id: the id of the request
+        :param data: the value of the ``data`` field of the error
+        :return: a :py:class:`JsonRpcResponse` instance
+        """
+        error = {"code": template.error["code"], "message": template.error["message"]}
+        if data is not None:
+            error["data"] = data
+        return JsonRpcResponse(error=error, id=id, send_id_field=template.send_id_field)
+
 
 def parse_json_structure(string_item):
     """
@@ -0,0 +1,144 @@
+"""
+Raw TCP transport for the internal JSON RPC traffic, without the HTTP framing.
+
+Every message is a frame made of a 4 bytes big endian length followed by the payload
+serialized with the codec of the microservice. A frame contains a single call or a batch.
+The requests of a connection are pipelined: they are handled concurrently and their
+responses are sent as soon as they are available, so the clients must match them by ``id``
+(see :py:class:`gemstone.client.tcp.TcpTransport`). The notifications do not receive a
+response.
+
+Enabled with :py:attr:`gemstone.core.MicroService.tcp_transport_port`.
+
+.. versionadded:: 0.13.0
+"""
+
+from tornado.gen import coroutine
+from tornado.iostream import StreamClosedError
+from tornado.locks import Semaphore
+from tornado.tcpserver import TCPServer
+
+from gemstone.client.tcp import TCP_SCHEME, FRAME_HEADER
+from gemstone.core.handlers import JsonRpcDispatcher
+from gemstone.core.structs import JsonRpcResponseBatch
+
+__all__ = [
+    'TCP_SCHEME',
+    'FRAME_HEADER',
+    'JsonRpcTcpServer',
+    'JsonRpcTcpConnection'
+]
+
+
+class JsonRpcTcpServer(TCPServer):
+    """
+    Accepts the length prefixed JSON RPC connections of a microservice.
+
+    :param microservice: the :py:class:`gemstone.core.MicroService` instance
+    """
+
+    def __init__(self, microservice, **kwargs):
+        super(JsonRpcTcpServer, self).__init__(**kwargs)
+        self.microservice = microservice
+
+    @coroutine
+    def handle_stream(self, stream, address):
+        connection = JsonRpcTcpConnection(self.microservice, stream, address)
+        yield connection.run()
+
+
+class JsonRpcTcpConnection(JsonRpcDispatcher):
+    """
+    A connection of the :py:class:`JsonRpcTcpServer`. The calls are dispatched exactly like
+    the ones received by HTTP. Since there is no HTTP request,
+    :py:meth:`gemstone.core.MicroService.authenticate_request` receives the connection and
+    the clients are identified by their IP address, unless the returned user is not a
+    simple boolean.
+
+    At most :py:attr:`gemstone.core.MicroService.tcp_transport_max_in_flight` frames of a
+    connection are handled at the same time; the next frames are not read until one of them
+    completes. The connections that send frames larger than
+    :py:attr:`gemstone.core.MicroService.tcp_transport_max_frame_size` are closed.
+
+    :param microservice: the :py:class:`gemstone.core.MicroService` instance
+    :param stream: the :py:class:`tornado.iostream.IOStream` of the connection
+    :param address: the address of the client
+    """
+
+    def __init__(self, microservice, stream, address):
+        self.microservice = microservice
+        self.method_table = microservice.method_table
+        self.logger = microservice.logger
+        self.codec = microservice.codec
+        self.stream = stream
+        self.address = address
+        self.request_deadline = None
+        self.connection_closed = False
+        self._pending_calls = set()
+        self._client_identity = None
+        self._semaphore = Semaphore(microservice.tcp_transport_max_in_flight)
+
+    @property
+    def current_user(self):
+        return self.get_current_user()
+
+    def get_current_user(self):
+        return self.microservice.authenticate_request(self)
+
+    def get_remote_ip(self):
+        return self.address[0] if isinstance(self.address, tuple) else self.address
+
+    @coroutine
+    def run(self):
+        """
+        Reads and handles the frames until the connection is closed.
+        """
+        max_frame_size = self.microservice.tcp_transport_max_frame_size
+        try:
+            while True:
+                header = yield self.stream.read_bytes(FRAME_HEADER.size)
+                length, = FRAME_HEADER.unpack(header)
+                if length > max_frame_size:
+                    self.logger.warning("Closing the connection of {}: frame of {} bytes is too "
+                                        "large".format(self.address, length))
+                    break
+                payload = yield self.stream.read_bytes(length)
+
+                yield self._semaphore.acquire()
+                # not awaited: the responses are sent in the order of completion
+                self.handle_message(payload).add_done_callback(
+                    lambda _: self._semaphore.release())
+        except StreamClosedError:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Closes the connection and cancels the calls that nobody waits for.
+        """
+        if self.connection_closed:
+            return
+        self.stream.close()
+        self.cancel_pending_calls()
+
+    def write_response(self, response):
+        """
+        Sends the response for a frame.
+
+        :param response: a :py:class:`gemstone.core.structs.JsonRpcResponse` or
+                         :py:class:`gemstone.core.structs.JsonRpcResponseBatch` instance
+        """
+        if self.connection_closed or self.stream.closed():
+            return
+        if isinstance(response, JsonRpcResponseBatch):
+            payload = [item.to_dict() for item in response.iter_items()]
+        else:
+            payload = response.to_dict()
+        data = self.codec.dumps(payload)
+        try:
+            future = self.stream.write(FRAME_HEADER.pack(len(data)) + data)
+        except StreamClosedError:
+            return
+        # the write fails if the client goes away, there is nobody to report it to
+        future.add_done_callback(lambda f: f.exception())
@@ -0,0 +1,165 @@
+import collections
+import sys
+import threading
+import time
+import traceback
+
+__all__ = [
+    'IOLoopWatchdog'
+]
+
+
+class IOLoopWatchdog(object):
+    """
+    Measures the lag of an IOLoop and detects the callbacks that block it.
+
+    A heartbeat callback is scheduled on the IOLoop every ``interval`` seconds and the
+    difference between the moment it was expected to run and the moment it actually ran
+    is recorded as the IOLoop lag. A background thread checks the heartbeat and, when the
+    IOLoop did not run it for more than ``threshold`` seconds, captures the stack of the
+    IOLoop thread (the code that blocks the IOLoop) and records a blocking incident.
+
+    Example usage
+
+    ::
+
+        watchdog = IOLoopWatchdog(io_loop, interval=0.5, threshold=0.2)
+        watchdog.start()
+        # ...
+        print(watchdog.get_metrics())
+
+    :param io_loop: the monitored :py:class:`tornado.ioloop.IOLoop` instance
+    :param interval: the interval (in seconds) at which the lag is measured
+    :param threshold: the duration (in seconds) after which a callback is considered to block
+                      the IOLoop
+    :param logger: a :py:class:`logging.Logger` instance used to report the blocking
+                   incidents. If ``None``, the incidents are only recorded.
+    :param max_samples: how many lag samples are kept for computing the percentiles
+    :param max_incidents: how many blocking incidents are kept
+    """
+
+    def __init__(self, io_loop, interval=0.5, threshold=0.2, logger=None, max_samples=1024,
+                 max_incidents=64):
+        if interval <= 0 or threshold <= 0:
+            raise ValueError("interval and threshold must be positive numbers")
+
+        self.io_loop = io_loop
+        self.interval = interval
+        self.threshold = threshold
+        self.logger = logger
+
+        self._lag_samples = collections.deque(maxlen=max_samples)
+        self._incidents = collections.deque(maxlen=max_incidents)
+        self._incidents_count = 0
+        self._lock = threading.Lock()
+
+        self._running = False
+        self._loop_thread_id = None
+        self._expected_beat = None
+        self._current_incident = None
+        self._timeout_handle = None
+        self._watch_thread = None
+
+    def start(self):
+        """
+        Starts monitoring the IOLoop. Can be called from any thread.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._expected_beat = None
+        self.io_loop.add_callback(self._beat)
+
+        self._watch_thread = threading.Thread(target=self._watch,
+                                              name="gemstone-ioloop-watchdog", daemon=True)
+        self._watch_thread.start()
+
+    def stop(self):
+        """
+        Stops monitoring the IOLoop.
+        """
+        self._running = False
+        if self._timeout_handle is not None:
+            self.io_loop.add_callback(self.io_loop.remove_timeout, self._timeout_handle)
+
+    def get_metrics(self):
+        """
+        Returns the IOLoop lag percentiles (in seconds) and the last blocking incidents.
+
+        :return: a dict with the ``lag`` and ``blocking`` keys
+        """
+        with self._lock:
+            samples = sorted(self._lag_samples)
+            incidents = [dict(incident) for incident in self._incidents]
+            incidents_count = self._incidents_count
+
+        return {
+            "lag": {
+                "samples": len(samples),
+                "p50": _percentile(samples, 50),
+                "p90": _percentile(samples, 90),
+                "p99": _percentile(samples, 99),
+                "max": samples[-1] if samples else None
+            },
+            "blocking": {
+                "count": incidents_count,
+                "incidents": incidents
+            }
+        }
+
+    def _beat(self):
+        now = time.monotonic()
+        self._loop_thread_id = threading.get_ident()
+
+        with self._lock:
+            if self._expected_beat is not None:
+                self._lag_samples.append(max(now - self._expected_beat, 0))
+            if self._current_incident is not None:
+                # the IOLoop was blocked until now
+                self._current_incident["duration"] = now - self._expected_beat
+                self._current_incident = None
+
+        if self._running:
+            self._expected_beat = now + self.interval
+            self._timeout_handle = self.io_loop.call_later(self.interval, self._beat)
+
+    def _watch(self):
+        current_thread = threading.current_thread()
+        while self._running and self._watch_thread is current_thread:
+            time.sleep(min(self.interval, self.threshold) / 2)
+
+            expected_beat = self._expected_beat
+            if expected_beat is None:
+                # the IOLoop did not run the first heartbeat yet
+                continue
+            blocked_for = time.monotonic() - expected_beat
+            if blocked_for < self.threshold:
+                continue
+
+            with self._lock:
+                if self._current_incident is not None:
+                    # the incident was already recorded
+                    self._current_incident["duration"] = blocked_for
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                incident = {
+                    "timestamp": time.time(),
+                    "duration": blocked_for,
+                    "stack": traceback.format_stack(frame)
+                }
+                self._current_incident = incident
+                self._incidents.append(incident)
+                self._incidents_count += 1
+
+            if self.logger:
+                self.logger.warning("IOLoop blocked for more than {:.3f} seconds by:\n{}".format(
+                    blocked_for, "".join(incident["stack"])))
+
+
+def _percentile(sorted_samples, percent):
+    if not sorted_samples:
+        return None
+    index = int(round((len(sorted_samples) - 1) * percent / 100))
+    return sorted_samples[index]
@@ -0,0 +1,169 @@
+import errno
+import itertools
+import logging
+import os
+import signal
+import socket
+import time
+
+__all__ = [
+    'WorkerSupervisor',
+    'reuse_port_supported'
+]
+
+
+def reuse_port_supported():
+    """
+    :return: ``True`` if every worker process can bind its own listening socket on the same
+             address (the ``SO_REUSEPORT`` socket option is available), ``False`` otherwise
+    """
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+class WorkerSupervisor(object):
+    """
+    Pre-forks the worker processes of a microservice, restarts the workers that exit
+    unexpectedly and forwards the signals it receives to them.
+
+    When ``SO_REUSEPORT`` is available, every worker binds its own TCP listening socket and
+    the kernel distributes the incoming connections between them. Otherwise, the supervisor
+    binds the TCP listening sockets (of the HTTP server and of the raw TCP transport) before
+    forking and the workers share them. The Unix domain socket (if any) is always bound by
+    the supervisor and shared.
+
+    After receiving ``SIGTERM`` or ``SIGINT``, the supervisor stops restarting the workers,
+    waits for all of them to exit and returns.
+
+    :param microservice: the :py:class:`gemstone.core.MicroService` instance
+    :param workers: the number of worker processes
+    :param restart_delay: the number of seconds to wait before restarting a worker that
+                          exited less than ``restart_delay`` seconds after it was started
+                          (so that a service that fails at startup is not restarted in
+                          a tight loop)
+    :param logger: a :py:class:`logging.Logger` instance
+    """
+
+    FORWARDED_SIGNALS = tuple(getattr(signal, name) for name in
+                              ("SIGTERM", "SIGINT", "SIGHUP", "SIGUSR1", "SIGUSR2")
+                              if hasattr(signal, name))
+    STOP_SIGNALS = tuple(getattr(signal, name) for name in ("SIGTERM", "SIGINT")
+                         if hasattr(signal, name))
+
+    def __init__(self, microservice, workers, restart_delay=1.0, logger=None):
+        if workers <= 0:
+            raise ValueError("workers must be a positive number")
+        if restart_delay < 0:
+            raise ValueError("restart_delay must not be negative")
+
+        self.microservice = microservice
+        self.workers = workers
+        self.restart_delay = restart_delay
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.sockets = {}
+        self.stopping = False
+        self.restarts = 0
+
+        # pid -> (worker id, start time)
+        self._children = {}
+        self._previous_handlers = {}
+
+    @property
+    def pids(self):
+        """
+        The pids of the running worker processes, ordered by worker id.
+        """
+        return [pid for pid, _ in sorted(self._children.items(), key=lambda x: x[1][0])]
+
+    def run(self):
+        """
+        Starts the workers and supervises them. This is blocking.
+        """
+        if not hasattr(os, "fork"):
+            raise RuntimeError("Multiple worker processes require os.fork()")
+
+        self.sockets = self.microservice._bind_sockets(tcp=not reuse_port_supported())
+
+        self._install_signal_handlers()
+        try:
+            for worker_id in range(self.workers):
+                self._spawn(worker_id)
+            self._supervise()
+        finally:
+            self._restore_signal_handlers()
+            for sock in itertools.chain(*self.sockets.values()):
+                sock.close()
+
+    def stop(self, signum=signal.SIGTERM):
+        """
+        Stops restarting the workers and sends them ``signum``.
+        """
+        self.stopping = True
+        self._forward(signum)
+
+    def _supervise(self):
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+
+            worker = self._children.pop(pid, None)
+            if worker is None:
+                continue
+            worker_id, started_at = worker
+            if self.stopping:
+                self.logger.debug("Worker {} (pid {}) exited".format(worker_id, pid))
+                continue
+
+            self.logger.warning("Worker {} (pid {}) exited unexpectedly with status {}, "
+                                "restarting it".format(worker_id, pid, status))
+            self.restarts += 1
+            if time.monotonic() - started_at < self.restart_delay:
+                time.sleep(self.restart_delay)
+            if not self.stopping:
+                self._spawn(worker_id)
+
+    def _spawn(self, worker_id):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                self._restore_signal_handlers()
+                self.microservice._run_worker(worker_id, self.sockets)
+            except KeyboardInterrupt:
+                pass
+            except BaseException:
+                self.logger.exception("Worker {} failed".format(worker_id))
+                exit_code = 1
+            finally:
+                # never return into the supervisor loop of the parent
+                os._exit(exit_code)
+
+        self.logger.info("Started worker {} (pid {})".format(worker_id, pid))
+        self._children[pid] = (worker_id, time.monotonic())
+
+    def _handle_signal(self, signum, frame):
+        if signum in self.STOP_SIGNALS:
+            self.stopping = True
+        self._forward(signum)
+
+    def _forward(self, signum):
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _install_signal_handlers(self):
+        for signum in self.FORWARDED_SIGNALS:
+            self._previous_handlers[signum] = signal.signal(signum, self._handle_signal)
+
+    def _restore_signal_handlers(self):
+        for signum, handler in self._previous_handlers.items():
+            signal.signal(signum, handler if handler is not None else signal.SIG_DFL)
+        self._previous_handlers = {}
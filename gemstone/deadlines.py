@@ -0,0 +1,116 @@
+"""
+Deadline propagation between the microservices.
+
+When a :py:class:`gemstone.client.RemoteService` sends a request, the time the caller is
+willing to wait for the response is sent in the ``X-Request-Timeout`` header (in seconds). The
+microservice that receives the request drops the calls whose deadline passed before they are
+executed and, while a method is executed, the remaining time is available through
+:py:func:`get_remaining_time`. The requests sent by the method to other microservices (for
+example through :py:meth:`gemstone.core.MicroService.get_service`) automatically carry the
+remaining time, so the whole chain of calls gives up at the same time.
+
+Example usage
+
+::
+
+    class MyMicroService(gemstone.MicroService):
+        # ...
+
+        @gemstone.exposed_method(timeout=2)
+        def get_user(self, user_id):
+            # the request will carry at most the remaining part of the 2 seconds
+            return self.get_service("users").call_method("get", [user_id]).result
+
+The propagation relies on the ``contextvars`` module (Python 3.7+). On older versions,
+the deadlines are still enforced, but they are not propagated.
+"""
+
+import functools
+import time
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+__all__ = [
+    'TIMEOUT_HEADER',
+    'get_deadline',
+    'get_remaining_time',
+    'set_deadline',
+    'reset_deadline',
+    'bind_context'
+]
+
+#: The HTTP header with the number of seconds the caller is willing to wait for the response
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+if contextvars:
+    _current_deadline = contextvars.ContextVar("gemstone_deadline", default=None)
+else:
+    _current_deadline = None
+
+
+def get_deadline():
+    """
+    Returns the deadline of the current call.
+
+    :return: the deadline as a :py:func:`time.monotonic` value, or ``None`` if the current
+             call has no deadline
+    """
+    if _current_deadline is None:
+        return None
+    return _current_deadline.get()
+
+
+def get_remaining_time():
+    """
+    Returns the number of seconds until the deadline of the current call.
+
+    :return: a ``float`` (``0`` if the deadline passed) or ``None`` if the current call has
+             no deadline
+    """
+    deadline = get_deadline()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0)
+
+
+def set_deadline(deadline):
+    """
+    Sets the deadline of the current context.
+
+    :param deadline: a :py:func:`time.monotonic` value or ``None``
+    :return: a token for :py:func:`reset_deadline`
+    """
+    if _current_deadline is None:
+        return None
+    return _current_deadline.set(deadline)
+
+
+def reset_deadline(token):
+    """
+    Restores the deadline that was active before the corresponding :py:func:`set_deadline`.
+
+    :param token: the value returned by :py:func:`set_deadline`
+    """
+    if token is not None:
+        try:
+            _current_deadline.reset(token)
+        except ValueError:
+            # the token belongs to another context (for example when a pending coroutine is
+            # closed by the garbage collector), which is discarded anyway
+            pass
+
+
+def bind_context(func):
+    """
+    Binds ``func`` to a copy of the current context, so that the deadline is available
+    when it is called in another thread.
+
+    :param func: a callable
+    :return: a callable
+    """
+    if contextvars is None:
+        return func
+    return functools.partial(contextvars.copy_context().run, func)
@@ -24,3 +24,81 @@ class PluginDoesNotExistError(GemstoneError):
     specified name exists.
     """
     pass
+
+
+# Codec specific
+
+class CodecDecodeError(GemstoneError):
+    """
+    Raised by a codec when the payload can not be deserialized.
+    """
+    pass
+
+
+class ContentEncodingError(GemstoneError):
+    """
+    Raised when a compressed payload can not be decompressed.
+    """
+    pass
+
+
+class ContentTooLargeError(ContentEncodingError):
+    """
+    Raised when a compressed payload is larger than allowed once decompressed.
+    """
+    pass
+
+
+# Deadlines
+
+class DeadlineExceededError(GemstoneError):
+    """
+    Raised when the deadline of a call passed before the call could be completed.
+    """
+    pass
+
+
+# Load shedding
+
+class ServerOverloadedError(GemstoneError):
+    """
+    Raised when a request or a call is rejected because the microservice is overloaded.
+    Reported to the clients as a "Server overloaded" JSON RPC error.
+
+    :param message: the description of the error
+    :param reason: the component that rejected the request (``"service"``, ``"method"``,
+                   ``"executor"``, etc.)
+    :param retry_after: the number of seconds after which the request can be retried,
+                        or ``None``
+    :param details: other values that are sent to the client in the ``data`` of the error
+    """
+
+    def __init__(self, message, reason, retry_after=None, **details):
+        super(ServerOverloadedError, self).__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.details = details
+
+    def to_data(self):
+        """
+        :return: the ``data`` of the JSON RPC error
+        """
+        data = {"reason": self.reason, "retry_after": self.retry_after}
+        data.update(self.details)
+        return data
+
+
+class ExecutorSaturatedError(ServerOverloadedError):
+    """
+    Raised by an executor when a task is submitted while all its workers are busy and
+    its queue is full.
+
+    :param executor_name: the name of the executor
+    :param retry_after: the number of seconds after which the call can be retried, or ``None``
+    """
+
+    def __init__(self, executor_name, retry_after=None):
+        super(ExecutorSaturatedError, self).__init__(
+            "Executor '{}' is saturated".format(executor_name), "executor", retry_after,
+            executor=executor_name)
+        self.executor_name = executor_name
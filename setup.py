@@ -84,6 +84,10 @@ setup(
 
     extras_require={
         "rabbitmq": ["pika"],
-        "redis": ["redis"]
+        "redis": ["redis"],
+        "orjson": ["orjson"],
+        "msgpack": ["msgpack"],
+        "brotli": ["brotli>=1.2"],
+        "zstd": ["zstandard"]
     }
 )
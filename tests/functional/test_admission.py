@@ -0,0 +1,72 @@
+import simplejson as json
+import pytest
+from tornado import gen
+
+from gemstone.core import MicroService, exposed_method
+
+
+class AdmissionService(MicroService):
+    name = "test.admission"
+
+    max_in_flight_requests = 1
+    overload_retry_after = 1.5
+
+    @exposed_method(max_in_flight=1)
+    async def limited(self, delay):
+        await gen.sleep(delay)
+        return "done"
+
+
+@pytest.fixture
+def service():
+    service = AdmissionService()
+    service._initial_setup()
+    return service
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+def post(http_client, base_url, body):
+    return http_client.fetch(base_url + "/api", method="POST", body=body,
+                             headers={"content-type": "application/json"})
+
+
+@pytest.mark.gen_test
+def test_requests_over_the_limit_are_rejected_before_parsing(http_client, base_url, service):
+    call = {"jsonrpc": "2.0", "method": "limited", "params": [0.1], "id": 1}
+    first = post(http_client, base_url, json.dumps(call))
+    yield gen.sleep(0.02)
+
+    # the body is not parsed, so it does not matter that it is invalid
+    rejected = yield post(http_client, base_url, "not json")
+    assert rejected.headers["Retry-After"] == "2"
+    assert json.loads(rejected.body)["error"] == {
+        "code": -32003,
+        "message": "Server overloaded",
+        "data": {"reason": "service", "retry_after": 1.5}
+    }
+    assert json.loads(rejected.body)["id"] is None
+
+    response = yield first
+    assert json.loads(response.body)["result"] == "done"
+
+    metrics = service.get_metrics()["admission"]
+    assert metrics["in_flight"] == 0
+    assert metrics["rejected"] == {"service": 1}
+
+
+@pytest.mark.gen_test
+def test_method_calls_over_the_limit_are_rejected(http_client, base_url, service):
+    batch = [{"jsonrpc": "2.0", "method": "limited", "params": [0.05], "id": 1},
+             {"jsonrpc": "2.0", "method": "limited", "params": [0.05], "id": 2}]
+    response = yield post(http_client, base_url, json.dumps(batch))
+    responses = {item["id"]: item for item in json.loads(response.body)}
+
+    assert responses[1]["result"] == "done"
+    assert responses[2]["error"]["code"] == -32003
+    assert responses[2]["error"]["data"] == {"reason": "method", "method": "limited",
+                                             "retry_after": 1.5}
+    assert service.get_metrics()["admission"]["methods_in_flight"] == {}
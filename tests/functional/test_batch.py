@@ -0,0 +1,156 @@
+import threading
+import time
+
+import simplejson as json
+import pytest
+from tornado import gen
+from tornado.locks import Event
+
+from gemstone.core import MicroService, exposed_method
+
+
+class BatchService(MicroService):
+    name = "test.batch"
+
+    max_batch_size = 10
+    max_batch_concurrency = 2
+    max_concurrent_notifications = 1
+    max_parallel_blocking_tasks = 8
+
+    def __init__(self, *args, **kwargs):
+        super(BatchService, self).__init__(*args, **kwargs)
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+        self.notified = []
+        self.released = Event()
+
+    @exposed_method()
+    def slow(self, x):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        return x
+
+    @exposed_method()
+    def notify(self, x):
+        self.notified.append(x)
+
+    @exposed_method()
+    def notify_fails(self):
+        raise ValueError("failed")
+
+    @exposed_method()
+    async def notify_later(self, x):
+        await self.released.wait()
+        self.notified.append(x)
+
+
+@pytest.fixture
+def service():
+    service = BatchService()
+    service._initial_setup()
+    return service
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+def make_call(method, params, id=None):
+    call = {"jsonrpc": "2.0", "method": method, "params": params}
+    if id is not None:
+        call["id"] = id
+    return call
+
+
+@pytest.mark.gen_test
+def test_batch_concurrency_is_bounded(http_client, base_url, service):
+    body = [make_call("slow", [i], id=i) for i in range(1, 9)]
+    result = yield http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                                     headers={"content-type": "application/json"})
+    response_body = json.loads(result.body)
+
+    assert sorted(item["result"] for item in response_body) == list(range(1, 9))
+    assert service.max_running == 2
+
+
+@pytest.mark.gen_test
+def test_batch_too_large(http_client, base_url, service):
+    body = [make_call("slow", [i], id=i) for i in range(1, 12)]
+    result = yield http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                                     headers={"content-type": "application/json"})
+    response_body = json.loads(result.body)
+
+    # every call is rejected with its id
+    assert [(item["id"], item["error"]["code"]) for item in response_body] == \
+        [(i, -32002) for i in range(1, 12)]
+    assert service.max_running == 0
+
+
+@pytest.mark.gen_test
+def test_batch_notifications_are_supervised(http_client, base_url, service):
+    body = [make_call("notify", [1]), make_call("notify", [2]), make_call("notify_fails", []),
+            make_call("slow", [3], id=3)]
+    result = yield http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                                     headers={"content-type": "application/json"})
+    response_body = json.loads(result.body)
+    assert response_body == [{"jsonrpc": "2.0", "result": 3, "error": None, "id": 3}]
+
+    for _ in range(50):
+        if service.notification_runner.running == 0:
+            break
+        yield gen.sleep(0.01)
+
+    assert sorted(service.notified) == [1, 2]
+    metrics = service.get_metrics()["notifications"]
+    assert metrics["completed"] == 2
+    assert metrics["failed"] == 1
+    assert metrics["running"] == 0
+
+
+@pytest.mark.gen_test
+def test_single_notifications_do_not_wait_for_a_slot(http_client, base_url, service):
+    for x in (1, 2):
+        result = yield http_client.fetch(base_url + "/api", method="POST",
+                                         body=json.dumps(make_call("notify_later", [x])),
+                                         headers={"content-type": "application/json"},
+                                         request_timeout=1)
+        assert result.code == 200
+
+    # the second notification waits for the slot of the first one
+    metrics = service.get_metrics()["notifications"]
+    assert (metrics["running"], metrics["waiting"]) == (1, 1)
+
+    service.released.set()
+    for _ in range(50):
+        if len(service.notified) == 2:
+            break
+        yield gen.sleep(0.01)
+    assert service.notified == [1, 2]
+
+
+@pytest.mark.gen_test
+def test_batch_errors_do_not_share_state(http_client, base_url, service):
+    body = [make_call("missing", [], id=1), make_call("missing", [], id=2),
+            make_call("notify_fails", [], id=3), make_call("slow", [1, 2], id=4),
+            make_call("slow", [1, 2], id=5)]
+    result = yield http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                                     headers={"content-type": "application/json"})
+    errors = {item["id"]: item["error"] for item in json.loads(result.body)}
+
+    assert errors[1] == errors[2] == {"code": -32601, "message": "Method not found"}
+    assert errors[3]["data"] == {"class": "ValueError", "info": "failed"}
+    assert errors[4] == errors[5] == {"code": -32602, "message": "Invalid params"}
+
+    # the data of an error is not sent with the next ones
+    body = [make_call("missing", [], id=6)]
+    body.append({"jsonrpc": "2.0", "method": "slow", "params": {"x": 1, "y": 2}, "id": 7})
+    result = yield http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                                     headers={"content-type": "application/json"})
+    for item in json.loads(result.body):
+        assert "data" not in item["error"]
@@ -0,0 +1,63 @@
+import simplejson as json
+import pytest
+from tornado import gen
+
+from gemstone.core import MicroService, exposed_method
+
+
+class StreamingBatchService(MicroService):
+    name = "test.batch.streaming"
+
+    stream_batch_responses = True
+
+    @exposed_method()
+    async def sleep(self, seconds):
+        await gen.sleep(seconds)
+        return seconds
+
+    @exposed_method()
+    def notify(self, x):
+        return x
+
+
+@pytest.fixture
+def app():
+    service = StreamingBatchService()
+    service._initial_setup()
+    return service.make_tornado_app()
+
+
+@pytest.mark.gen_test
+def test_streamed_batch_response(http_client, base_url):
+    body = [
+        {"jsonrpc": "2.0", "method": "sleep", "params": [0.05], "id": 1},
+        {"invalid": True},
+        {"jsonrpc": "2.0", "method": "sleep", "params": [0.01], "id": 2},
+        {"jsonrpc": "2.0", "method": "notify", "params": [1]},
+    ]
+
+    chunks = []
+    result = yield http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                                     headers={"content-type": "application/json"},
+                                     streaming_callback=chunks.append)
+
+    assert result.code == 200
+    assert result.headers.get("Transfer-Encoding") == "chunked"
+    assert len(chunks) > 1
+
+    response_body = json.loads(b"".join(chunks))
+    # the responses are sent in the order of completion
+    assert [item["id"] for item in response_body] == [None, 2, 1]
+    assert response_body[0]["error"]["code"] == -32600
+    assert response_body[1]["result"] == 0.01
+    assert response_body[2]["result"] == 0.05
+
+
+@pytest.mark.gen_test
+def test_streamed_batch_response_only_notifications(http_client, base_url):
+    body = [{"jsonrpc": "2.0", "method": "notify", "params": [1]}]
+
+    result = yield http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                                     headers={"content-type": "application/json"})
+    assert result.code == 200
+    assert json.loads(result.body) == []
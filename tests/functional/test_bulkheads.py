@@ -0,0 +1,69 @@
+import time
+
+import simplejson as json
+import pytest
+
+from gemstone.core import MicroService, Container, exposed_method
+from gemstone.core.executors import ThreadExecutor
+
+
+class SlowDependencyModule(Container):
+    executor = "slow"
+
+    @exposed_method()
+    def slow(self):
+        time.sleep(0.2)
+        return "slow"
+
+
+class BulkheadService(MicroService):
+    name = "test.executors.bulkheads"
+
+    executors = [
+        ThreadExecutor("slow", max_workers=1, max_queue=0, retry_after=2)
+    ]
+    modules = [SlowDependencyModule()]
+
+    @exposed_method()
+    def fast(self):
+        return "fast"
+
+
+@pytest.fixture(scope="module")
+def service():
+    service = BulkheadService()
+    service._initial_setup()
+    yield service
+    for executor in service._executors.values():
+        executor.shutdown()
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+@pytest.mark.gen_test
+def test_saturated_bulkhead_rejects_calls(http_client, base_url, service):
+    assert service.method_table["slow"].executor.name == "slow"
+    assert service.method_table["fast"].executor.name == "default"
+
+    batch = [{"jsonrpc": "2.0", "method": "slow", "id": 1},
+             {"jsonrpc": "2.0", "method": "slow", "id": 2},
+             {"jsonrpc": "2.0", "method": "fast", "id": 3}]
+    response = yield http_client.fetch(base_url + "/api", method="POST", body=json.dumps(batch),
+                                       headers={"content-type": "application/json"})
+    responses = {item["id"]: item for item in json.loads(response.body)}
+
+    assert responses[1]["result"] == "slow"
+    assert responses[2]["error"] == {
+        "code": -32003,
+        "message": "Server overloaded",
+        "data": {"reason": "executor", "executor": "slow", "retry_after": 2}
+    }
+    assert responses[3]["result"] == "fast"
+
+    metrics = service.get_metrics()["executors"]["slow"]
+    assert metrics["rejected"] == 1
+    assert metrics["completed"] == 1
+    assert metrics["saturation"] == 0
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+
+import simplejson as json
+import pytest
+from tornado import gen
+from tornado.httpclient import HTTPError
+
+from gemstone.core import MicroService, exposed_method
+
+
+class CancellationService(MicroService):
+    name = "test.cancellation"
+    max_parallel_blocking_tasks = 1
+
+    def __init__(self, *args, **kwargs):
+        super(CancellationService, self).__init__(*args, **kwargs)
+        self.release = threading.Event()
+        self.blocking_calls = 0
+        self.coroutine_cancelled = False
+
+    @exposed_method()
+    def blocking(self):
+        self.blocking_calls += 1
+        self.release.wait(5)
+        return "done"
+
+    @exposed_method()
+    async def sleeping(self):
+        try:
+            await gen.sleep(5)
+        except asyncio.CancelledError:
+            self.coroutine_cancelled = True
+            raise
+        return "done"
+
+
+@pytest.fixture
+def service():
+    service = CancellationService()
+    service._initial_setup()
+    yield service
+    service.release.set()
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+@pytest.mark.gen_test
+def test_calls_are_cancelled_when_the_client_disconnects(http_client, base_url, service):
+    batch = [{"jsonrpc": "2.0", "method": "blocking", "id": 1},
+             {"jsonrpc": "2.0", "method": "blocking", "id": 2},
+             {"jsonrpc": "2.0", "method": "sleeping", "id": 3}]
+
+    with pytest.raises(HTTPError):
+        yield http_client.fetch(base_url + "/api", method="POST", body=json.dumps(batch),
+                                headers={"content-type": "application/json"},
+                                request_timeout=0.2)
+
+    for _ in range(50):
+        if service.coroutine_cancelled:
+            break
+        yield gen.sleep(0.01)
+
+    assert service.coroutine_cancelled
+    admission = service.get_metrics()["admission"]
+    assert admission["abandoned_requests"] == 1
+    assert admission["cancelled_calls"] == 2
+
+    executor = service.get_metrics()["executors"]["default"]
+    assert executor["cancelled"] == 1
+    assert executor["queued"] == 0
+
+    service.release.set()
+    yield gen.sleep(0.05)
+    # the queued call was never executed
+    assert service.blocking_calls == 1
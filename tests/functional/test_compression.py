@@ -0,0 +1,146 @@
+import gzip
+import os
+
+import simplejson as json
+import pytest
+
+from gemstone.client.remote_service import RemoteService
+from gemstone.client.structs import MethodCall
+from gemstone.core import MicroService, exposed_method
+
+
+class CompressionService(MicroService):
+    name = "test.compression"
+    compression_min_size = 100
+    compression_offload_size = 10000
+
+    @exposed_method()
+    def repeat(self, text, count):
+        return text * count
+
+    @exposed_method()
+    def length(self, text):
+        return len(text)
+
+
+@pytest.fixture
+def service():
+    service = CompressionService()
+    service._initial_setup()
+    return service
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+def make_body(method, params):
+    return json.dumps({"jsonrpc": "2.0", "method": method, "params": params, "id": 1})
+
+
+@pytest.mark.gen_test
+@pytest.mark.parametrize("count, accept_encoding, compressed", [
+    (1000, "gzip", True),
+    (1000, "deflate, gzip;q=0.5", True),
+    (1000, "gzip;q=0, identity", False),
+    (1000, None, False),
+    (10, "gzip", False),
+])
+def test_response_compression(http_client, base_url, service, count, accept_encoding,
+                              compressed):
+    headers = {"content-type": "application/json"}
+    if accept_encoding:
+        headers["accept-encoding"] = accept_encoding
+    result = yield http_client.fetch(base_url + "/api", method="POST",
+                                     body=make_body("repeat", ["abc", count]),
+                                     headers=headers, decompress_response=False)
+
+    assert result.headers["Vary"] == "Accept-Encoding"
+    body = result.body
+    if compressed:
+        assert result.headers["Content-Encoding"] == "gzip"
+        assert len(body) < count
+        body = gzip.decompress(body)
+    else:
+        assert "Content-Encoding" not in result.headers
+    assert json.loads(body)["result"] == "abc" * count
+
+
+@pytest.mark.gen_test
+def test_offloaded_compression(http_client, base_url, service):
+    headers = {"content-type": "application/json", "accept-encoding": "gzip",
+               "content-encoding": "gzip"}
+    # large enough once compressed
+    text = os.urandom(12000).hex()
+    body = gzip.compress(make_body("repeat", [text, 2]).encode())
+    result = yield http_client.fetch(base_url + "/api", method="POST", body=body,
+                                     headers=headers, decompress_response=False)
+
+    assert json.loads(gzip.decompress(result.body))["result"] == text * 2
+
+    metrics = service.get_metrics()["compression"]
+    assert metrics["requests"]["gzip"]["count"] == 1
+    assert metrics["requests"]["gzip"]["offloaded"] == 1
+    assert metrics["responses"]["gzip"]["count"] == 1
+    assert metrics["responses"]["gzip"]["offloaded"] == 1
+    assert metrics["responses"]["gzip"]["ratio"] > 1.5
+
+
+@pytest.mark.gen_test
+@pytest.mark.parametrize("encoding, body, code", [
+    ("gzip", b"not gzip", -32700),
+    ("compress", b"...", -32600),
+])
+def test_invalid_request_encoding(http_client, base_url, encoding, body, code):
+    result = yield http_client.fetch(base_url + "/api", method="POST", body=body,
+                                     headers={"content-type": "application/json",
+                                              "content-encoding": encoding})
+
+    assert json.loads(result.body)["error"]["code"] == code
+
+
+@pytest.mark.gen_test
+def test_decompressed_request_too_large(http_client, base_url, service):
+    service.max_decompressed_request_size = 1000
+    body = gzip.compress(make_body("length", ["x" * 1000]).encode())
+    result = yield http_client.fetch(base_url + "/api", method="POST", body=body,
+                                     headers={"content-type": "application/json",
+                                              "content-encoding": "gzip"})
+
+    assert json.loads(result.body)["error"]["code"] == -32700
+
+
+@pytest.mark.gen_test
+def test_remote_service_compression(io_loop, http_server, base_url, service):
+    client = RemoteService(base_url + "/api", timeout=5, compress_requests=True)
+
+    result = yield io_loop.run_in_executor(None, client.call_method, "length", ["x" * 5000])
+    assert result.result == 5000
+
+    result = yield io_loop.run_in_executor(None, client.call_method, "repeat", ["ab", 5000])
+    assert result.result == "ab" * 5000
+
+    results = yield io_loop.run_in_executor(
+        None, lambda: list(client.iter_batch(MethodCall("repeat", ["ab", 1000]),
+                                             MethodCall("repeat", ["c", 1]))))
+    assert sorted(item.result for item in results) == ["ab" * 1000, "c"]
+
+    metrics = service.get_metrics()["compression"]
+    assert metrics["requests"][client.request_compressor.encoding]["count"] == 1
+    assert sum(stats["count"] for stats in metrics["responses"].values()) == 2
+
+    uncompressed = RemoteService(base_url + "/api", timeout=5, compression=False)
+    result = yield io_loop.run_in_executor(None, uncompressed.call_method, "repeat",
+                                           ["ab", 5000])
+    assert result.result == "ab" * 5000
+    assert sum(stats["count"] for stats in
+               service.get_metrics()["compression"]["responses"].values()) == 2
+
+    # the requests are compressed only on demand
+    default = RemoteService(base_url + "/api", timeout=5)
+    assert default.request_compressor is None
+    result = yield io_loop.run_in_executor(None, default.call_method, "length", ["x" * 5000])
+    assert result.result == 5000
+    metrics = service.get_metrics()["compression"]
+    assert metrics["requests"][client.request_compressor.encoding]["count"] == 1
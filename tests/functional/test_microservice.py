@@ -1,3 +1,5 @@
+import threading
+
 import simplejson as json
 
 import pytest
@@ -413,3 +415,64 @@ def test_private_call_ok_token_wrong_parameters(http_client, base_url):
     assert resp_body["error"]["code"] == -32602
     assert resp_body["error"]["message"] == "Invalid params"
     assert resp_body["jsonrpc"] == "2.0"
+
+
+@pytest.mark.gen_test
+def test_type_error_raised_by_method_is_internal_error(http_client, base_url):
+    base_url += "/api"
+    body = {
+        "id": 1,
+        "method": "test_raises_type_error",
+        "params": [1],
+        "jsonrpc": "2.0"
+    }
+
+    result = yield http_client.fetch(base_url, method="POST", body=json.dumps(body),
+                                     headers={"content-type": "application/json"})
+    assert result.code == 200
+    resp_body = json.loads(result.body)
+    assert resp_body["id"] == 1
+    assert resp_body["result"] is None
+    assert resp_body["error"]["code"] == -32603
+    assert resp_body["error"]["data"]["class"] == "TypeError"
+
+
+@pytest.mark.gen_test
+def test_check_types(http_client, base_url):
+    base_url += "/api"
+
+    for params, expected in [([2, 1.5], 3.0), ({"a": 3}, 3.0), ([2, 2], 4)]:
+        body = {"id": 1, "method": "typed_multiply", "params": params, "jsonrpc": "2.0"}
+        result = yield http_client.fetch(base_url, method="POST", body=json.dumps(body),
+                                         headers={"content-type": "application/json"})
+        resp_body = json.loads(result.body)
+        assert resp_body["error"] is None
+        assert resp_body["result"] == expected
+
+    for params in (["2", 1.5], [True], {"a": 1, "b": "x"}):
+        body = {"id": 1, "method": "typed_multiply", "params": params, "jsonrpc": "2.0"}
+        result = yield http_client.fetch(base_url, method="POST", body=json.dumps(body),
+                                         headers={"content-type": "application/json"})
+        resp_body = json.loads(result.body)
+        assert resp_body["result"] is None
+        assert resp_body["error"]["code"] == -32602
+
+
+@pytest.mark.gen_test
+def test_blocking_and_native_methods_routing(http_client, base_url):
+    base_url += "/api"
+    main_thread = threading.current_thread().name
+
+    body = {"id": 1, "method": "current_thread", "jsonrpc": "2.0"}
+    result = yield http_client.fetch(base_url, method="POST", body=json.dumps(body),
+                                     headers={"content-type": "application/json"})
+    resp_body = json.loads(result.body)
+    assert resp_body["error"] is None
+    assert resp_body["result"] != main_thread
+
+    body = {"id": 2, "method": "native_current_thread", "params": [0.01], "jsonrpc": "2.0"}
+    result = yield http_client.fetch(base_url, method="POST", body=json.dumps(body),
+                                     headers={"content-type": "application/json"})
+    resp_body = json.loads(result.body)
+    assert resp_body["error"] is None
+    assert resp_body["result"] == main_thread
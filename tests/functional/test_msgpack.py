@@ -0,0 +1,97 @@
+import simplejson as json
+import pytest
+
+from gemstone.client.remote_service import RemoteService
+from gemstone.client.structs import MethodCall
+from gemstone.codecs import msgpack
+from gemstone.core import MicroService, exposed_method
+
+pytestmark = pytest.mark.skipif(not msgpack, reason="msgpack is not installed")
+
+
+class MsgPackService(MicroService):
+    name = "test.msgpack"
+
+    @exposed_method()
+    def reverse(self, data):
+        return data[::-1]
+
+    @exposed_method()
+    def describe(self, value):
+        return type(value).__name__
+
+
+@pytest.fixture
+def app():
+    service = MsgPackService()
+    service._initial_setup()
+    return service.make_tornado_app()
+
+
+@pytest.mark.gen_test
+def test_msgpack_request_and_response(http_client, base_url):
+    body = {"jsonrpc": "2.0", "method": "reverse", "params": [b"\x00\x01\xff"], "id": 1}
+    result = yield http_client.fetch(base_url + "/api", method="POST",
+                                     body=msgpack.packb(body, use_bin_type=True),
+                                     headers={"content-type": "application/msgpack"})
+
+    assert result.headers["Content-Type"] == "application/msgpack"
+    response = msgpack.unpackb(result.body, raw=False)
+    assert response == {"jsonrpc": "2.0", "result": b"\xff\x01\x00", "error": None, "id": 1}
+
+
+@pytest.mark.gen_test
+@pytest.mark.parametrize("accept, content_type", [
+    ("application/json", "application/json"),
+    ("application/xml, application/json;q=0.5", "application/json"),
+    ("application/json;q=0.5, application/msgpack", "application/msgpack"),
+    ("application/msgpack;q=0, */*", "application/json"),
+    ("text/plain", "application/json"),
+])
+def test_response_content_negotiation(http_client, base_url, accept, content_type):
+    body = {"jsonrpc": "2.0", "method": "reverse", "params": ["abc"], "id": 1}
+    result = yield http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                                     headers={"content-type": "application/json",
+                                              "accept": accept})
+
+    assert result.headers["Content-Type"] == content_type
+    if content_type == "application/json":
+        response = json.loads(result.body)
+    else:
+        response = msgpack.unpackb(result.body, raw=False)
+    assert response["result"] == "cba"
+
+
+@pytest.mark.gen_test
+def test_unsupported_content_type(http_client, base_url):
+    result = yield http_client.fetch(base_url + "/api", method="POST", body=b"...",
+                                     headers={"content-type": "application/xml"})
+
+    assert json.loads(result.body)["error"]["code"] == -32600
+
+
+@pytest.mark.gen_test
+def test_remote_service_prefers_msgpack(io_loop, http_server, base_url):
+    client = RemoteService(base_url + "/api", prefer_msgpack=True, timeout=5)
+    assert client.codec.content_type == "application/msgpack"
+
+    result = yield io_loop.run_in_executor(None, client.call_method, "reverse",
+                                           [b"\x00\x01\xff"])
+    assert result.result == b"\xff\x01\x00"
+    assert result.error is None
+
+    batch = yield io_loop.run_in_executor(None, client.call_batch,
+                                          MethodCall("describe", [b"x"]),
+                                          MethodCall("describe", ["x"]))
+    assert sorted(item.result for item in batch) == ["bytes", "str"]
+
+    # the JSON responses are decoded too
+    MsgPackService.accepted_codecs = []
+    try:
+        result = yield io_loop.run_in_executor(None, client.call_method, "reverse", ["abc"])
+    finally:
+        del MsgPackService.accepted_codecs
+    assert result.error["code"] == -32600
+
+    assert RemoteService("ws://127.0.0.1:1/ws", prefer_msgpack=True).codec.content_type == \
+        "application/json"
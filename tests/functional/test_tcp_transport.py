@@ -0,0 +1,156 @@
+import socket
+
+import simplejson as json
+import pytest
+from tornado import gen
+from tornado.iostream import StreamClosedError
+from tornado.tcpclient import TCPClient
+
+from gemstone.client.remote_service import RemoteService
+from gemstone.client.structs import MethodCall, Notification
+from gemstone.client.tcp import FRAME_HEADER, TcpTransport
+from gemstone.core import MicroService, exposed_method
+from gemstone.core.tcp import JsonRpcTcpServer
+from gemstone.errors import ServiceConfigurationError
+
+
+def get_free_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TcpService(MicroService):
+    name = "test.tcp_transport"
+    tcp_transport_port = get_free_port()
+    tcp_transport_max_frame_size = 1024
+    advertise_tcp_transport = True
+    max_parallel_blocking_tasks = 8
+
+    def __init__(self, *args, **kwargs):
+        super(TcpService, self).__init__(*args, **kwargs)
+        self.notified = []
+        self.users = {}
+
+    @exposed_method()
+    async def sleep_and_return(self, seconds, value):
+        await gen.sleep(seconds)
+        return value
+
+    @exposed_method()
+    def add(self, a, b):
+        return a + b
+
+    @exposed_method()
+    def notify(self, value):
+        self.notified.append(value)
+
+    @exposed_method(requires_handler_reference=True)
+    def whoami(self, handler):
+        return handler.get_client_identity()
+
+    def authenticate_request(self, handler):
+        return self.users.get(handler.get_remote_ip(), True)
+
+
+@pytest.fixture
+def service(io_loop):
+    service = TcpService()
+    service._initial_setup()
+    server = JsonRpcTcpServer(service)
+    server.add_sockets(service._bind_sockets(unix=False)["tcp_transport"])
+    yield service
+    server.stop()
+
+
+def write_frame(stream, message):
+    data = json.dumps(message).encode()
+    return stream.write(FRAME_HEADER.pack(len(data)) + data)
+
+
+@gen.coroutine
+def read_frame(stream):
+    header = yield stream.read_bytes(FRAME_HEADER.size)
+    payload = yield stream.read_bytes(FRAME_HEADER.unpack(header)[0])
+    return json.loads(payload)
+
+
+def test_tcp_transport_configuration():
+    assert TcpService().accessible_at == "tcp://127.0.0.1:{}".format(
+        TcpService.tcp_transport_port)
+
+    class NoTcpTransportService(MicroService):
+        name = "test.no_tcp_transport"
+        advertise_tcp_transport = True
+
+    with pytest.raises(ServiceConfigurationError):
+        NoTcpTransportService()
+
+    with pytest.raises(ValueError):
+        TcpTransport("tcp://127.0.0.1/api", codec=None)
+
+
+@pytest.mark.gen_test
+def test_frames_are_answered_in_the_order_of_completion(service):
+    stream = yield TCPClient().connect("127.0.0.1", service.tcp_transport_port)
+    yield write_frame(stream, {"jsonrpc": "2.0", "method": "sleep_and_return",
+                               "params": [0.2, "slow"], "id": 1})
+    yield write_frame(stream, {"jsonrpc": "2.0", "method": "notify", "params": ["x"]})
+    yield write_frame(stream, [{"jsonrpc": "2.0", "method": "add", "params": [1, 2], "id": 2},
+                               {"jsonrpc": "2.0", "method": "add", "params": [3, 4], "id": 3}])
+
+    batch = yield read_frame(stream)
+    assert sorted((item["id"], item["result"]) for item in batch) == [(2, 3), (3, 7)]
+    response = yield read_frame(stream)
+    assert response["id"] == 1
+    assert response["result"] == "slow"
+    assert service.notified == ["x"]
+
+    # the connections that send too large frames are closed
+    stream.write(FRAME_HEADER.pack(4096))
+    with pytest.raises(StreamClosedError):
+        yield stream.read_bytes(1)
+
+
+@pytest.mark.gen_test
+def test_remote_service_over_tcp(io_loop, service):
+    client = RemoteService(service.accessible_at, timeout=5)
+    assert isinstance(client.transport, TcpTransport)
+    try:
+        result = yield io_loop.run_in_executor(None, client.call_method, "add", [1, 2])
+        assert result.result == 3
+
+        calls = [client.call_method_async("sleep_and_return", [0.05, i]) for i in range(20)]
+        for call in calls:
+            yield io_loop.run_in_executor(None, call.result, True)
+        assert [call.result().result for call in calls] == list(range(20))
+
+        first, second = MethodCall("add", [2, 2]), MethodCall("add", [3, 3])
+        batch = yield io_loop.run_in_executor(
+            None, client.call_batch, first, Notification("notify", ["batched"]), second)
+        assert batch.get_response_for_call(first).result == 4
+        assert batch.get_response_for_call(second).result == 6
+        while not service.notified:
+            yield gen.sleep(0.01)
+        assert service.notified == ["batched"]
+    finally:
+        client.close()
+
+
+@pytest.mark.gen_test
+def test_tcp_client_identity(service):
+    stream = yield TCPClient().connect("127.0.0.1", service.tcp_transport_port)
+    yield write_frame(stream, {"jsonrpc": "2.0", "method": "whoami", "id": 1})
+    response = yield read_frame(stream)
+    assert response["result"] == "127.0.0.1"
+    stream.close()
+
+    # the identity is resolved by MicroService.get_client_identity, like for HTTP
+    service.users["127.0.0.1"] = "alice"
+    stream = yield TCPClient().connect("127.0.0.1", service.tcp_transport_port)
+    yield write_frame(stream, {"jsonrpc": "2.0", "method": "whoami", "id": 1})
+    response = yield read_frame(stream)
+    assert response["result"] == "alice"
+    stream.close()
@@ -0,0 +1,70 @@
+import socket
+
+import pytest
+from tornado.httpserver import HTTPServer
+
+from gemstone.client.remote_service import RemoteService
+from gemstone.client.unix import make_unix_url, parse_unix_url
+from gemstone.core import MicroService, exposed_method
+from gemstone.errors import CalledServiceError, ServiceConfigurationError
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"),
+                                reason="requires Unix domain sockets")
+
+
+def test_unix_urls():
+    url = make_unix_url("/var/run/my service.sock", "/api")
+    assert url == "unix://%2Fvar%2Frun%2Fmy%20service.sock/api"
+    assert parse_unix_url(url) == ("/var/run/my service.sock", "/api")
+
+    with pytest.raises(ValueError):
+        parse_unix_url("unix:///var/run/service.sock")
+    with pytest.raises(ValueError):
+        parse_unix_url("http://127.0.0.1:8000/api")
+
+
+def make_service_class(socket_path, tcp):
+    class UnixSocketService(MicroService):
+        name = "test.unix_socket"
+        unix_socket = socket_path
+        listen_tcp = tcp
+
+        @exposed_method()
+        def say_hello(self, name):
+            return "hello {}".format(name)
+
+    return UnixSocketService
+
+
+def test_unix_socket_configuration(tmpdir):
+    path = str(tmpdir.join("service.sock"))
+
+    assert make_service_class(path, True)().accessible_at == "http://127.0.0.1:8000/api"
+    assert make_service_class(path, False)().accessible_at == make_unix_url(path, "/api")
+
+    with pytest.raises(ServiceConfigurationError):
+        make_service_class(None, False)()
+
+
+@pytest.mark.gen_test
+def test_call_over_unix_socket(io_loop, tmpdir):
+    path = str(tmpdir.join("service.sock"))
+    service = make_service_class(path, False)()
+    service._initial_setup()
+
+    sockets = service._bind_sockets()
+    assert [sock.family for sock in sockets["http"]] == [socket.AF_UNIX]
+    server = HTTPServer(service.make_tornado_app())
+    server.add_sockets(sockets["http"])
+    try:
+        client = RemoteService(service.accessible_at, timeout=5)
+        result = yield io_loop.run_in_executor(None, client.call_method, "say_hello",
+                                               {"name": "world"})
+        assert result.result == "hello world"
+        assert result.error is None
+
+        missing = RemoteService(make_unix_url(path, "/missing"), timeout=5)
+        with pytest.raises(CalledServiceError):
+            yield io_loop.run_in_executor(None, missing.call_method, "say_hello", ["world"])
+    finally:
+        server.stop()
@@ -0,0 +1,181 @@
+import simplejson as json
+import pytest
+from tornado import gen
+from tornado.websocket import websocket_connect
+
+from gemstone.client.remote_service import RemoteService
+from gemstone.client.structs import MethodCall, Notification
+from gemstone.client.websocket import WebSocketTransport
+from gemstone.codecs import SimpleJsonCodec
+from gemstone.core import MicroService, exposed_method
+from gemstone.errors import CalledServiceError, ServerOverloadedError
+
+
+class WebSocketService(MicroService):
+    name = "test.websocket"
+    websocket_endpoint = "/ws"
+    max_parallel_blocking_tasks = 8
+
+    def __init__(self, *args, **kwargs):
+        super(WebSocketService, self).__init__(*args, **kwargs)
+        self.notified = []
+
+    @exposed_method()
+    async def sleep_and_return(self, seconds, value):
+        await gen.sleep(seconds)
+        return value
+
+    @exposed_method()
+    def add(self, a, b):
+        return a + b
+
+    @exposed_method()
+    def notify(self, value):
+        self.notified.append(value)
+
+    @exposed_method()
+    def unserializable(self):
+        return object()
+
+
+@pytest.fixture
+def service():
+    service = WebSocketService()
+    service._initial_setup()
+    return service
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+@pytest.fixture
+def ws_url(http_server, http_port):
+    return "ws://127.0.0.1:{}/ws".format(http_port)
+
+
+@pytest.mark.gen_test
+def test_responses_are_sent_in_the_order_of_completion(ws_url, service):
+    connection = yield websocket_connect(ws_url)
+    messages = [
+        {"jsonrpc": "2.0", "method": "sleep_and_return", "params": [0.2, "slow"], "id": 1},
+        {"jsonrpc": "2.0", "method": "sleep_and_return", "params": [0, "fast"], "id": 2},
+        {"jsonrpc": "2.0", "method": "notify", "params": ["notification"]},
+        [{"jsonrpc": "2.0", "method": "add", "params": [1, 2], "id": 3},
+         {"jsonrpc": "2.0", "method": "add", "params": [3, 4], "id": 4}],
+        {"jsonrpc": "2.0", "method": "sleep_and_return", "params": [1, "late"], "id": 5,
+         "timeout": 0.05},
+    ]
+    for message in messages:
+        yield connection.write_message(json.dumps(message))
+
+    responses = []
+    for _ in range(4):
+        responses.append(json.loads((yield connection.read_message())))
+    connection.close()
+
+    ids = [response["id"] if isinstance(response, dict) else "batch" for response in responses]
+    assert ids.index(2) < ids.index(1)
+    assert ids.index(5) < ids.index(1)
+
+    by_id = {response["id"]: response for response in responses if isinstance(response, dict)}
+    assert by_id[1]["result"] == "slow"
+    assert by_id[2]["result"] == "fast"
+    assert by_id[5]["error"]["code"] == -32005
+
+    batch = next(response for response in responses if isinstance(response, list))
+    assert sorted((item["id"], item["result"]) for item in batch) == [(3, 3), (4, 7)]
+    assert service.notified == ["notification"]
+
+
+@pytest.mark.gen_test
+def test_invalid_messages(ws_url):
+    connection = yield websocket_connect(ws_url)
+    yield connection.write_message("not json")
+    response = json.loads((yield connection.read_message()))
+    assert response["error"]["code"] == -32700
+
+    yield connection.write_message(json.dumps({"method": "add"}))
+    response = json.loads((yield connection.read_message()))
+    assert response["error"]["code"] == -32600
+    connection.close()
+
+
+@pytest.mark.gen_test
+def test_errors_have_the_ids_of_the_calls(ws_url, service, monkeypatch):
+    connection = yield websocket_connect(ws_url)
+    service.max_batch_size = 2
+    batch = [{"jsonrpc": "2.0", "method": "add", "params": [1, i], "id": i} for i in (1, 2, 3)]
+    batch.append({"jsonrpc": "2.0", "method": "notify", "params": ["ignored"]})
+    yield connection.write_message(json.dumps(batch))
+    response = json.loads((yield connection.read_message()))
+    assert [(item["id"], item["error"]["code"]) for item in response] == \
+        [(1, -32002), (2, -32002), (3, -32002)]
+
+    yield connection.write_message(
+        json.dumps({"jsonrpc": "2.0", "method": "unserializable", "id": 4}))
+    response = json.loads((yield connection.read_message()))
+    assert response["id"] == 4
+    assert response["error"]["code"] == -32603
+
+    def reject():
+        raise ServerOverloadedError("Overloaded", "service")
+
+    monkeypatch.setattr(service.admission, "enter_request", reject)
+    yield connection.write_message(json.dumps({"jsonrpc": "2.0", "method": "add",
+                                               "params": [1, 2], "id": 5}))
+    response = json.loads((yield connection.read_message()))
+    assert response["id"] == 5
+    assert response["error"]["code"] == -32003
+    connection.close()
+    assert service.notified == []
+
+
+@pytest.mark.gen_test
+def test_unmatched_errors_fail_the_connection(io_loop, ws_url):
+    transport = WebSocketTransport(ws_url, SimpleJsonCodec())
+    try:
+        call = {"jsonrpc": "2.0", "method": "sleep_and_return", "params": [0, 1], "id": 1}
+        assert (yield io_loop.run_in_executor(None, transport.send(call).result, 5))["result"] == 1
+
+        slow = transport.send({"jsonrpc": "2.0", "method": "sleep_and_return",
+                               "params": [5, "slow"], "id": 2})
+        yield gen.sleep(0.05)
+        connection = transport._connections[0].result()
+        # the service can not decode the message, its error has no id
+        transport._io_loop.add_callback(connection.write_message, "not json")
+        with pytest.raises(CalledServiceError):
+            yield io_loop.run_in_executor(None, slow.result, 5)
+
+        # the connection is reopened
+        assert (yield io_loop.run_in_executor(None, transport.send(call).result, 5))["result"] == 1
+    finally:
+        transport.close()
+
+
+@pytest.mark.gen_test
+def test_remote_service_pipelines_calls(io_loop, ws_url, service):
+    client = RemoteService(ws_url, timeout=5)
+    try:
+        result = yield io_loop.run_in_executor(None, client.call_method, "add", [1, 2])
+        assert result.result == 3
+
+        # the calls from different threads share the connection
+        calls = [client.call_method_async("sleep_and_return", [0.05, i]) for i in range(20)]
+        for call in calls:
+            yield io_loop.run_in_executor(None, call.result, True)
+        assert [call.result().result for call in calls] == list(range(20))
+
+        first, second = MethodCall("add", [2, 2]), MethodCall("add", [3, 3])
+        batch = yield io_loop.run_in_executor(
+            None, client.call_batch, first, Notification("notify", ["batched"]), second)
+        assert batch.get_response_for_call(first).result == 4
+        assert batch.get_response_for_call(second).result == 6
+
+        yield io_loop.run_in_executor(None, client.notify, "notify", ["single"])
+        while len(service.notified) < 2:
+            yield gen.sleep(0.01)
+        assert sorted(service.notified) == ["batched", "single"]
+    finally:
+        client.close()
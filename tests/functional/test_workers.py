@@ -0,0 +1,124 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+import simplejson as json
+
+from gemstone.core import MicroService
+from gemstone.core.workers import WorkerSupervisor
+from gemstone.errors import ServiceConfigurationError
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+
+
+def get_free_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def whoami(port):
+    body = json.dumps({"jsonrpc": "2.0", "method": "whoami", "id": 1}).encode()
+    request = urllib.request.Request("http://127.0.0.1:{}/api".format(port), data=body,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.loads(response.read())["result"]
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            result = condition()
+            if result:
+                return result
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise AssertionError("timed out")
+
+
+def read_starts(path):
+    with open(path) as f:
+        return [line.split() for line in f.read().splitlines()]
+
+
+def test_workers_share_the_port_and_are_restarted(tmpdir):
+    port = get_free_port()
+    starts = str(tmpdir.join("starts"))
+    env = dict(os.environ, GEMSTONE_TEST_PORT=str(port), GEMSTONE_TEST_STARTS=starts)
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    supervisor = subprocess.Popen([sys.executable, "-m", "tests.services.service_workers"],
+                                  cwd=root, env=env)
+    try:
+        wait_for(lambda: os.path.exists(starts) and len(read_starts(starts)) == 2)
+        workers = {int(pid): worker_id for worker_id, pid in read_starts(starts)}
+        assert sorted(workers.values()) == ["0", "1"]
+
+        # the connections are distributed between the workers
+        served_by = set()
+        wait_for(lambda: served_by.add(whoami(port)) or len(served_by) == 2)
+        assert served_by == set(workers)
+
+        # a crashed worker is restarted with the same worker id
+        crashed = next(pid for pid, worker_id in workers.items() if worker_id == "1")
+        os.kill(crashed, signal.SIGKILL)
+        wait_for(lambda: len(read_starts(starts)) == 3)
+        worker_id, pid = read_starts(starts)[-1]
+        assert worker_id == "1"
+        assert int(pid) not in workers
+        wait_for(lambda: whoami(port) == int(pid))
+
+        # the stop signals are forwarded to the workers
+        supervisor.send_signal(signal.SIGTERM)
+        assert supervisor.wait(timeout=10) == 0
+        for pid in (int(pid) for _, pid in read_starts(starts)[1:]):
+            with pytest.raises(ProcessLookupError):
+                os.kill(pid, 0)
+    finally:
+        if supervisor.poll() is None:
+            supervisor.kill()
+            supervisor.wait()
+
+
+class PerWorkerService(MicroService):
+    name = "test.per_worker"
+    per_worker_components = ("plugins", "event_transports")
+
+
+def test_per_worker_components():
+    service = PerWorkerService()
+    assert service._runs_in_this_worker("periodic_tasks")
+
+    service.worker_id = 0
+    assert service._runs_in_this_worker("on_service_start")
+    assert service._runs_in_this_worker("periodic_tasks")
+    assert service.get_metrics()["worker"] == {"id": 0, "pid": os.getpid()}
+
+    service.worker_id = 1
+    assert service._runs_in_this_worker("plugins")
+    assert service._runs_in_this_worker("event_transports")
+    assert not service._runs_in_this_worker("on_service_start")
+    assert not service._runs_in_this_worker("periodic_tasks")
+
+
+def test_invalid_worker_configuration():
+    class InvalidComponentService(MicroService):
+        name = "test.invalid_component"
+        per_worker_components = ("plugins", "http")
+
+    with pytest.raises(ServiceConfigurationError):
+        InvalidComponentService()
+
+    with pytest.raises(ServiceConfigurationError):
+        PerWorkerService().start(workers=0)
+
+    with pytest.raises(ValueError):
+        WorkerSupervisor(PerWorkerService(), workers=0)
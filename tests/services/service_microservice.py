@@ -1,3 +1,7 @@
+import threading
+
+from tornado import gen
+
 from gemstone.core import MicroService, exposed_method
 
 TEST_HOST, TEST_PORT = ("localhost", 65503)
@@ -33,6 +37,23 @@ class TestService(MicroService):
     def test_raises(self):
         raise ValueError("This is a test")
 
+    @exposed_method()
+    def test_raises_type_error(self, a):
+        raise TypeError("test() missing 1 required positional argument: 'b'")
+
+    @exposed_method()
+    def current_thread(self):
+        return threading.current_thread().name
+
+    @exposed_method()
+    async def native_current_thread(self, delay=0):
+        await gen.sleep(delay)
+        return threading.current_thread().name
+
+    @exposed_method(check_types=True)
+    def typed_multiply(self, a: int, b: float = 1.0):
+        return a * b
+
     def authenticate_request(self, handler):
         api_token = handler.request.headers.get("x-testing-token")
         return api_token == "testing_token"
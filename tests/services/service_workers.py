@@ -0,0 +1,24 @@
+import os
+
+from gemstone.core import MicroService, exposed_method
+
+
+class WorkersService(MicroService):
+    name = "test.workers"
+    host = "127.0.0.1"
+    port = int(os.environ.get("GEMSTONE_TEST_PORT", 8000))
+    workers = 2
+    worker_restart_delay = 0.1
+    io_loop_watchdog_interval = None
+
+    def on_service_start(self):
+        with open(os.environ["GEMSTONE_TEST_STARTS"], "a") as f:
+            f.write("{} {}\n".format(self.worker_id, os.getpid()))
+
+    @exposed_method()
+    async def whoami(self):
+        return os.getpid()
+
+
+if __name__ == '__main__':
+    WorkersService().start()
@@ -0,0 +1,148 @@
+import time
+
+import simplejson as json
+import pytest
+
+from gemstone.core import MicroService, exposed_method
+from gemstone.core.cache import ResponseCache, make_cache_key
+from gemstone.errors import ServerOverloadedError
+
+
+def test_response_cache_lru():
+    cache = ResponseCache(max_entries=2)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == (True, 1)
+    cache.set("c", 3)  # evicts "b", the least recently used
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+    assert cache.get_metrics() == {"entries": 2, "hits": 3, "misses": 1, "evictions": 1,
+                                   "expirations": 0}
+
+
+def test_response_cache_ttl():
+    cache = ResponseCache(ttl=0.05)
+    cache.set("a", 1)
+    assert cache.get("a") == (True, 1)
+    time.sleep(0.06)
+    assert cache.get("a") == (False, None)
+    assert cache.get_metrics()["expirations"] == 1
+    assert len(cache) == 0
+
+
+def test_response_cache_invalidate():
+    cache = ResponseCache()
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate("a")
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (True, 2)
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_make_cache_key():
+    assert make_cache_key((1, {"a": [1, 2]}), {}) == make_cache_key((1, {"a": [1, 2]}), {})
+    assert make_cache_key((), {"a": 1, "b": 2}) == make_cache_key((), {"b": 2, "a": 1})
+    assert make_cache_key((1,), {}) != make_cache_key((True,), {})
+    assert make_cache_key((1,), {}) != make_cache_key((1.0,), {})
+
+
+def test_cache_requires_handler_reference():
+    with pytest.raises(ValueError):
+        exposed_method(cache=True, requires_handler_reference=True)(lambda self, handler: 1)
+
+
+class CachedService(MicroService):
+    name = "test.cache"
+
+    def __init__(self, *args, **kwargs):
+        super(CachedService, self).__init__(*args, **kwargs)
+        self.calls = 0
+
+    @exposed_method(cache={"max_entries": 10})
+    def lookup(self, a, b=0):
+        self.calls += 1
+        return a + b
+
+    @exposed_method(cache=True)
+    def fails(self):
+        self.calls += 1
+        raise ValueError("not cached")
+
+
+@pytest.fixture
+def service():
+    service = CachedService()
+    service._initial_setup()
+    return service
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+def call(http_client, base_url, method, params):
+    body = {"jsonrpc": "2.0", "method": method, "params": params, "id": 1}
+    return http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                             headers={"content-type": "application/json"})
+
+
+@pytest.mark.gen_test
+def test_cached_method(http_client, base_url, service):
+    for params in ([1, 2], {"a": 1, "b": 2}, [1, 2]):
+        result = yield call(http_client, base_url, "lookup", params)
+        assert json.loads(result.body)["result"] == 3
+    assert service.calls == 1
+
+    result = yield call(http_client, base_url, "lookup", [1])
+    assert json.loads(result.body)["result"] == 1
+    assert service.calls == 2
+
+    service.invalidate_cache("lookup", [1, 2])
+    result = yield call(http_client, base_url, "lookup", {"b": 2, "a": 1})
+    assert json.loads(result.body)["result"] == 3
+    assert service.calls == 3
+
+    metrics = service.get_metrics()["cache"]["lookup"]
+    assert metrics["hits"] == 2
+    assert metrics["misses"] == 3
+    assert metrics["entries"] == 2
+
+    service.invalidate_cache("lookup")
+    assert service.get_metrics()["cache"]["lookup"]["entries"] == 0
+
+
+@pytest.mark.gen_test
+def test_cache_hits_are_not_admitted(http_client, base_url, service, monkeypatch):
+    result = yield call(http_client, base_url, "lookup", [1, 2])
+    assert json.loads(result.body)["result"] == 3
+
+    def reject(descriptor):
+        raise ServerOverloadedError("Overloaded", "method")
+
+    monkeypatch.setattr(service.admission, "enter_call", reject)
+    result = yield call(http_client, base_url, "lookup", [1, 2])
+    assert json.loads(result.body)["result"] == 3
+    result = yield call(http_client, base_url, "lookup", [2, 2])
+    assert json.loads(result.body)["error"]["code"] == -32003
+    assert service.calls == 1
+
+
+@pytest.mark.gen_test
+def test_errors_are_not_cached(http_client, base_url, service):
+    for _ in range(2):
+        result = yield call(http_client, base_url, "fails", [])
+        assert json.loads(result.body)["error"]["code"] == -32603
+    assert service.calls == 2
+
+
+def test_invalidate_cache_errors(service):
+    with pytest.raises(ValueError):
+        service.invalidate_cache("missing")
+    with pytest.raises(ValueError):
+        service.invalidate_cache("lookup", [1, 2, 3])
@@ -4,9 +4,11 @@ import json
 
 import pytest
 
+from gemstone.codecs import SimpleJsonCodec
 from gemstone.util import as_completed
 from gemstone.client.remote_service import RemoteService
 from gemstone.client.structs import Result, MethodCall, BatchResult, AsyncMethodCall
+from gemstone.errors import CalledServiceError
 
 DUMMY_SERVICE_URL = "http://example.com/api"
 
@@ -18,7 +20,7 @@ def test_remote_service_initialize():
 
 
 def test_remote_service_make_request_obj():
-    service = RemoteService(DUMMY_SERVICE_URL)
+    service = RemoteService(DUMMY_SERVICE_URL, codec=SimpleJsonCodec())
 
     body = {
         "test": "ok"
@@ -36,6 +38,8 @@ def test_remote_service_make_request_obj():
 
 def dummy_urlopen(url, *args, **kwargs):
     class DummyResponse:
+        headers = {}
+
         def __init__(self, id=None, *a, **k):
             self.id = id
 
@@ -52,6 +56,8 @@ def dummy_urlopen(url, *args, **kwargs):
 
 def dummy_urlopen_batch(url, *args, **kwargs):
     class DummyResponse:
+        headers = {}
+
         def __init__(self, *ids):
             self.ids = ids
 
@@ -68,6 +74,24 @@ def dummy_urlopen_batch(url, *args, **kwargs):
     return DummyResponse(*ids)
 
 
+def dummy_urlopen_batch_streamed(url, *args, **kwargs):
+    class DummyResponse:
+        headers = {}
+
+        def __init__(self, *ids):
+            self.data = json.dumps(
+                [{"jsonrpc": "2.0", "error": None, "result": i, "id": i} for i in ids]).encode()
+            self.read_chunks = 0
+
+        def read1(self, size):
+            self.read_chunks += 1
+            chunk, self.data = self.data[:7], self.data[7:]
+            return chunk
+
+    body = json.loads(url.data.decode())
+    return DummyResponse(*[x["id"] for x in body])
+
+
 def test_simple_call(monkeypatch):
     service = RemoteService(DUMMY_SERVICE_URL)
 
@@ -106,6 +130,38 @@ def test_simple_batch_call(monkeypatch):
     assert result.get_response_for_call(MethodCall("invalid")) is None
 
 
+def test_batch_call_error_response(monkeypatch):
+    class DummyResponse:
+        headers = {}
+
+        def read(self):
+            return json.dumps({"jsonrpc": "2.0", "result": None, "id": None,
+                               "error": {"code": -32002, "message": "Batch too large"}}).encode()
+
+    service = RemoteService(DUMMY_SERVICE_URL)
+    monkeypatch.setattr(urllib.request, 'urlopen', lambda *args, **kwargs: DummyResponse())
+
+    with pytest.raises(CalledServiceError) as exc_info:
+        service.call_batch(MethodCall("test", []), MethodCall("test2", []))
+    assert exc_info.value.args[0]["code"] == -32002
+
+
+def test_iter_batch(monkeypatch):
+    service = RemoteService(DUMMY_SERVICE_URL)
+    monkeypatch.setattr(urllib.request, 'urlopen', dummy_urlopen_batch_streamed)
+
+    calls = [MethodCall("test", []) for _ in range(5)]
+    results = service.iter_batch(*calls)
+    assert inspect.isgenerator(results)
+
+    results = list(results)
+    assert len(results) == 5
+    for call, result in zip(calls, results):
+        assert isinstance(result, Result)
+        assert result.method_call == call
+        assert result.result == call.id
+
+
 def test_async_call(monkeypatch):
     service = RemoteService(DUMMY_SERVICE_URL)
     monkeypatch.setattr(urllib.request, 'urlopen', dummy_urlopen)
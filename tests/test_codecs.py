@@ -0,0 +1,114 @@
+import decimal
+
+import pytest
+
+from gemstone.codecs import SimpleJsonCodec, OrjsonCodec, MsgPackCodec, get_default_codec, \
+    get_accepted_codecs, orjson, msgpack
+from gemstone.errors import CodecDecodeError
+
+CODECS = [SimpleJsonCodec]
+if orjson:
+    CODECS.append(OrjsonCodec)
+if msgpack:
+    CODECS.append(MsgPackCodec)
+
+
+@pytest.mark.parametrize("codec_cls", CODECS)
+def test_codec_roundtrip(codec_cls):
+    codec = codec_cls()
+    obj = {"jsonrpc": "2.0", "method": "test", "params": [1, 2.5, "ş", None, True], "id": 1}
+
+    data = codec.dumps(obj)
+    assert isinstance(data, bytes)
+    assert codec.loads(data) == obj
+    if not codec.binary:
+        assert codec.loads(data.decode()) == obj
+
+
+@pytest.mark.parametrize("codec_cls", CODECS)
+def test_codec_invalid_payload(codec_cls):
+    codec = codec_cls()
+
+    with pytest.raises(CodecDecodeError):
+        codec.loads(b'{"jsonrpc": "2.0", "met')
+
+    with pytest.raises(CodecDecodeError):
+        codec.loads(b'\xff\xfe')
+
+
+@pytest.mark.skipif(not orjson, reason="orjson is not installed")
+def test_orjson_codec_fallback():
+    codec = OrjsonCodec()
+
+    assert codec.loads(codec.dumps({"a": 2 ** 70})) == {"a": 2 ** 70}
+    for value in (2 ** 64, 2 ** 70 + 1, -2 ** 63 - 1):
+        for payload in (codec.dumps([value, 1.5, "x"]), codec.dumps([value]).decode()):
+            decoded = codec.loads(payload)
+            assert decoded[0] == value
+            assert isinstance(decoded[0], int)
+    assert codec.loads(b"[18446744073709551615, -9223372036854775808]") == \
+        [2 ** 64 - 1, -2 ** 63]
+    assert codec.loads(codec.dumps({"a": decimal.Decimal("1.5")})) == {"a": 1.5}
+    assert codec.loads(codec.dumps({1: "a"})) == {"1": "a"}
+
+
+def test_default_codec():
+    codec = get_default_codec()
+    if orjson:
+        assert isinstance(codec, OrjsonCodec)
+    else:
+        assert isinstance(codec, SimpleJsonCodec)
+    assert codec.content_type == "application/json"
+
+
+@pytest.mark.skipif(not msgpack, reason="msgpack is not installed")
+def test_msgpack_codec_binary_data():
+    codec = MsgPackCodec()
+    obj = {"params": [b"\x00\xff" * 1000, "text"], 1: "integer key"}
+
+    data = codec.dumps(obj)
+    assert codec.loads(data) == obj
+    # no base64 inflation
+    assert len(data) < 2100
+
+    with pytest.raises(CodecDecodeError):
+        codec.loads(data.decode("latin-1"))
+
+
+@pytest.mark.skipif(not msgpack, reason="msgpack is not installed")
+@pytest.mark.parametrize("length", [0, 15, 16, 70000])
+def test_msgpack_codec_array_framing(length):
+    codec = MsgPackCodec()
+    items = [b"\x01"] * length
+    prefix, separator, suffix = codec.array_framing(length)
+
+    data = prefix + separator.join(codec.dumps(item) for item in items) + suffix
+    assert codec.loads(data) == items
+    assert list(codec.iter_array([data[:5], data[5:]])) == items
+
+
+def test_accepted_codecs():
+    codecs = get_accepted_codecs()
+    if msgpack:
+        assert [codec.content_type for codec in codecs] == ["application/msgpack"]
+    else:
+        assert codecs == []
+
+
+@pytest.mark.parametrize("codec_cls", CODECS)
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_codec_iter_array(codec_cls, chunk_size):
+    codec = codec_cls()
+    items = [{"a": 'x\\"]},[', "b": [1, {"c": "\\"}]}, 1, "s,]", None, [[]], {"id": 3}]
+    prefix, separator, suffix = codec.array_framing(len(items))
+    data = prefix + separator.join(codec.dumps(item) for item in items) + suffix
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+    assert list(codec.iter_array(chunks)) == items
+    empty_prefix, _, empty_suffix = codec.array_framing(0)
+    assert list(codec.iter_array([empty_prefix + empty_suffix])) == []
+    # not an array
+    assert list(codec.iter_array([codec.dumps({"a": 1})])) == [{"a": 1}]
+
+    with pytest.raises(CodecDecodeError):
+        list(codec.iter_array(chunks[:-1]))
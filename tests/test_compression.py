@@ -0,0 +1,101 @@
+import os
+import tracemalloc
+
+import pytest
+
+from gemstone.compression import GzipCompressor, BrotliCompressor, ZstdCompressor, \
+    CompressionMetrics, get_available_compressors, get_compressor, brotli, zstandard
+from gemstone.errors import ContentEncodingError, ContentTooLargeError
+
+COMPRESSORS = [GzipCompressor]
+if get_compressor("br"):
+    COMPRESSORS.append(BrotliCompressor)
+if zstandard:
+    COMPRESSORS.append(ZstdCompressor)
+
+PAYLOAD = b'{"jsonrpc": "2.0", "result": [' + b", ".join(b"%d" % i for i in range(5000)) + b"]}"
+
+
+@pytest.mark.parametrize("compressor_cls", COMPRESSORS)
+def test_compressor_roundtrip(compressor_cls):
+    compressor = compressor_cls()
+
+    data = compressor.compress(PAYLOAD)
+    assert len(data) < len(PAYLOAD) / 2
+    assert compressor.decompress(data) == PAYLOAD
+
+    chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+    assert b"".join(compressor.iter_decompress(chunks)) == PAYLOAD
+
+
+@pytest.mark.parametrize("compressor_cls", COMPRESSORS)
+def test_compressor_invalid_payload(compressor_cls):
+    compressor = compressor_cls()
+    data = compressor.compress(PAYLOAD)
+
+    with pytest.raises(ContentEncodingError):
+        compressor.decompress(data[:len(data) // 2])
+
+    with pytest.raises(ContentEncodingError):
+        compressor.decompress(os.urandom(64))
+
+    with pytest.raises(ContentTooLargeError):
+        compressor.decompress(data, max_size=len(PAYLOAD) - 1)
+    assert compressor.decompress(data, max_size=len(PAYLOAD)) == PAYLOAD
+
+
+@pytest.mark.parametrize("compressor_cls", COMPRESSORS)
+def test_compressor_decompression_bomb(compressor_cls):
+    compressor = compressor_cls()
+    bomb = compressor.compress(b"\0" * (64 * 1024 * 1024))
+
+    tracemalloc.start()
+    try:
+        with pytest.raises(ContentTooLargeError):
+            compressor.decompress(bomb, max_size=1024 * 1024)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # the output is limited while decompressing
+    assert peak < 4 * 1024 * 1024
+
+
+@pytest.mark.skipif(not zstandard, reason="zstandard is not installed")
+def test_zstd_decompression_steps():
+    compressor = ZstdCompressor()
+    payload = os.urandom(100000).hex().encode()
+    data = compressor.compress(payload)
+
+    # the input is not decompressed a few bytes at a time
+    chunks = list(compressor.iter_decompress([data], max_size=len(payload)))
+    assert b"".join(chunks) == payload
+    assert len(chunks) <= len(payload) // ZstdCompressor.OUTPUT_CHUNK_SIZE + 1
+    assert max(len(chunk) for chunk in chunks) <= ZstdCompressor.OUTPUT_CHUNK_SIZE
+
+
+def test_available_compressors():
+    encodings = [compressor.encoding for compressor in get_available_compressors()]
+    assert encodings[-1] == "gzip"
+    assert ("zstd" in encodings) == bool(zstandard)
+    assert ("br" in encodings) == hasattr(getattr(brotli, "Decompressor", None),
+                                          "can_accept_more_data")
+
+    assert isinstance(get_compressor("gzip"), GzipCompressor)
+    assert get_compressor("compress") is None
+    assert get_compressor("gzip", []) is None
+
+
+def test_compression_metrics():
+    metrics = CompressionMetrics()
+    metrics.record("responses", "gzip", 1000, 250, 0.5)
+    metrics.record("responses", "gzip", 3000, 750, 0.25, offloaded=True)
+    metrics.record("requests", "br", 100, 50, 0.125)
+    metrics.record_skipped("responses")
+
+    assert metrics.get_metrics() == {
+        "responses": {"gzip": {"count": 2, "offloaded": 1, "original_bytes": 4000,
+                               "compressed_bytes": 1000, "ratio": 4.0, "total_time": 0.75}},
+        "requests": {"br": {"count": 1, "offloaded": 0, "original_bytes": 100,
+                            "compressed_bytes": 50, "ratio": 2.0, "total_time": 0.125}},
+        "skipped": {"responses": 1}
+    }
@@ -0,0 +1,131 @@
+import threading
+import time
+import urllib.request
+
+import simplejson as json
+import pytest
+from tornado import gen
+
+from gemstone import deadlines
+from gemstone.client.remote_service import RemoteService
+from gemstone.core import MicroService, exposed_method
+from gemstone.errors import DeadlineExceededError
+
+
+def test_deadline_context():
+    assert deadlines.get_deadline() is None
+    assert deadlines.get_remaining_time() is None
+
+    token = deadlines.set_deadline(time.monotonic() + 10)
+    try:
+        assert 9 < deadlines.get_remaining_time() <= 10
+
+        # the deadline is propagated to other threads by bind_context
+        remaining = []
+        thread = threading.Thread(
+            target=deadlines.bind_context(lambda: remaining.append(deadlines.get_remaining_time())))
+        thread.start()
+        thread.join()
+        assert 9 < remaining[0] <= 10
+    finally:
+        deadlines.reset_deadline(token)
+
+    assert deadlines.get_deadline() is None
+
+
+def test_remote_service_sends_the_remaining_time(monkeypatch):
+    sent = []
+
+    def fake_urlopen(request, timeout=None):
+        sent.append((request.get_header(deadlines.TIMEOUT_HEADER.capitalize()), timeout))
+        raise urllib.request.URLError("unreachable")
+
+    monkeypatch.setattr(urllib.request, "urlopen", fake_urlopen)
+    service = RemoteService("http://example.com/api", timeout=5)
+
+    with pytest.raises(urllib.request.URLError):
+        service.call_method("test", [])
+
+    token = deadlines.set_deadline(time.monotonic() + 1)
+    try:
+        with pytest.raises(urllib.request.URLError):
+            service.call_method("test", [])
+    finally:
+        deadlines.reset_deadline(token)
+
+    assert sent[0] == ("5.000", 5)
+    assert float(sent[1][0]) <= 1
+    assert sent[1][1] <= 1
+
+    token = deadlines.set_deadline(time.monotonic() - 1)
+    try:
+        with pytest.raises(DeadlineExceededError):
+            service.call_method("test", [])
+    finally:
+        deadlines.reset_deadline(token)
+    assert len(sent) == 2
+
+
+class DeadlineService(MicroService):
+    name = "test.deadlines"
+    max_parallel_blocking_tasks = 2
+
+    def __init__(self, *args, **kwargs):
+        super(DeadlineService, self).__init__(*args, **kwargs)
+        self.calls = 0
+
+    @exposed_method(timeout=0.05)
+    async def slow(self):
+        self.calls += 1
+        await gen.sleep(1)
+        return "late"
+
+    @exposed_method()
+    def remaining_time(self):
+        self.calls += 1
+        return deadlines.get_remaining_time()
+
+
+@pytest.fixture
+def service():
+    service = DeadlineService()
+    service._initial_setup()
+    return service
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+def post(http_client, base_url, body, timeout=None):
+    headers = {"content-type": "application/json"}
+    if timeout is not None:
+        headers[deadlines.TIMEOUT_HEADER] = timeout
+    return http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                             headers=headers)
+
+
+@pytest.mark.gen_test
+def test_method_timeout(http_client, base_url, service):
+    response = yield post(http_client, base_url, {"jsonrpc": "2.0", "method": "slow", "id": 1})
+    assert json.loads(response.body)["error"] == {"code": -32005, "message": "Deadline exceeded"}
+
+
+@pytest.mark.gen_test
+def test_expired_calls_are_dropped(http_client, base_url, service):
+    body = {"jsonrpc": "2.0", "method": "remaining_time", "id": 1}
+    response = yield post(http_client, base_url, body, timeout="0")
+    assert json.loads(response.body)["error"]["code"] == -32005
+    assert service.calls == 0
+
+    response = yield post(http_client, base_url, body, timeout="2.5")
+    assert 0 < json.loads(response.body)["result"] <= 2.5
+
+    # the timeout extra field of a call
+    batch = [{"jsonrpc": "2.0", "method": "remaining_time", "id": 1, "timeout": 0.5},
+             {"jsonrpc": "2.0", "method": "remaining_time", "id": 2}]
+    response = yield post(http_client, base_url, batch)
+    results = {item["id"]: item["result"] for item in json.loads(response.body)}
+    assert 0 < results[1] <= 0.5
+    assert results[2] is None
@@ -0,0 +1,93 @@
+import inspect
+
+from gemstone.core import MicroService, exposed_method
+from tornado import gen
+
+from gemstone.core.dispatch import MethodDescriptor, EXECUTION_COROUTINE, EXECUTION_EXECUTOR, \
+    EXECUTION_NATIVE
+from gemstone.plugins import BasePlugin
+
+
+class NoopPlugin(BasePlugin):
+    name = "noop"
+
+
+class CountingPlugin(BasePlugin):
+    name = "counting"
+
+    def __init__(self):
+        super(CountingPlugin, self).__init__()
+        self.calls = []
+
+    def on_method_call(self, jsonrpc_request):
+        self.calls.append(jsonrpc_request)
+
+
+class DispatchService(MicroService):
+    name = "test.dispatch"
+
+    @exposed_method()
+    def public(self, a, b=1):
+        return a + b
+
+    @exposed_method("custom.private", private=True, requires_handler_reference=True)
+    def private(self, handler, x):
+        return x
+
+    @exposed_method()
+    async def native(self, x):
+        return x
+
+    @exposed_method()
+    def generator(self):
+        yield gen.moment
+        return 1
+
+    @exposed_method()
+    @gen.coroutine
+    def tornado_coroutine(self):
+        return 1
+
+    @exposed_method(is_coroutine=True)
+    def forced_coroutine(self):
+        return 1
+
+
+def test_method_table_is_built():
+    service = DispatchService()
+    service._gather_exposed_methods()
+
+    assert set(service.method_table) == {"public", "custom.private", "native", "generator",
+                                         "tornado_coroutine", "forced_coroutine"}
+
+    public = service.method_table["public"]
+    assert isinstance(public, MethodDescriptor)
+    assert public.name == "public"
+    assert public.private is False
+    assert public.requires_handler is False
+    assert public.execution == EXECUTION_EXECUTOR
+    assert list(public.signature.parameters) == ["a", "b"]
+
+    private = service.method_table["custom.private"]
+    assert private.private is True
+    assert private.requires_handler is True
+    assert list(private.signature.parameters) == ["handler", "x"]
+
+
+def test_execution_mode_detection():
+    service = DispatchService()
+    service._gather_exposed_methods()
+
+    assert service.method_table["native"].execution == EXECUTION_NATIVE
+    assert list(service.method_table["native"].signature.parameters) == ["x"]
+    assert service.method_table["generator"].execution == EXECUTION_COROUTINE
+    assert service.method_table["tornado_coroutine"].execution == EXECUTION_COROUTINE
+    assert service.method_table["forced_coroutine"].execution == EXECUTION_COROUTINE
+
+
+def test_descriptor_only_keeps_overridden_plugin_hooks():
+    counting = CountingPlugin()
+    descriptor = MethodDescriptor.from_method("test", lambda: None, [NoopPlugin(), counting])
+
+    assert descriptor.plugin_hooks == (counting.on_method_call,)
+    assert isinstance(descriptor.signature, inspect.Signature)
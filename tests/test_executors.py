@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+
+import simplejson as json
+import pytest
+
+from gemstone.core import MicroService, exposed_method
+from gemstone.core.executors import ThreadExecutor, ProcessExecutor, PRIORITY_HIGH, \
+    PRIORITY_NORMAL, PRIORITY_LOW
+from gemstone.errors import ServiceConfigurationError, DeadlineExceededError
+
+
+class ProcessService(MicroService):
+    name = "test.executors"
+
+    executors = [
+        ProcessExecutor("cpu", max_workers=2, max_tasks_per_worker=2),
+        ThreadExecutor("io", max_workers=2)
+    ]
+
+    @exposed_method(executor="cpu")
+    def sum_of_squares(self, n):
+        return {"result": sum(i * i for i in range(n)), "pid": os.getpid()}
+
+    @exposed_method(executor="process")
+    def pid(self):
+        return os.getpid()
+
+    @exposed_method(executor="io", priority=PRIORITY_HIGH)
+    def io_bound(self, value):
+        return value
+
+
+@pytest.fixture(scope="module")
+def service():
+    service = ProcessService()
+    service._initial_setup()
+    yield service
+    for executor in service._executors.values():
+        executor.shutdown()
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+def call(http_client, base_url, method, params):
+    body = {"jsonrpc": "2.0", "method": method, "params": params, "id": 1}
+    return http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                             headers={"content-type": "application/json"})
+
+
+def test_method_table_uses_named_executors(service):
+    assert service.method_table["sum_of_squares"].executor is service.get_executor("cpu")
+    assert service.method_table["io_bound"].executor is service.get_executor("io")
+    assert service.method_table["io_bound"].priority == PRIORITY_HIGH
+    assert service.method_table["pid"].priority == PRIORITY_NORMAL
+    assert isinstance(service.get_executor("process"), ProcessExecutor)
+    assert service.get_executor() is service.get_executor("default")
+
+    with pytest.raises(ServiceConfigurationError):
+        service.get_executor("missing")
+
+
+@pytest.mark.gen_test
+def test_process_executor(http_client, base_url, service):
+    response = yield call(http_client, base_url, "sum_of_squares", [1000])
+    result = json.loads(response.body)["result"]
+    assert result["result"] == sum(i * i for i in range(1000))
+    assert result["pid"] != os.getpid()
+
+    response = yield call(http_client, base_url, "pid", [])
+    assert json.loads(response.body)["result"] != os.getpid()
+
+    response = yield call(http_client, base_url, "io_bound", {"value": [1, 2]})
+    assert json.loads(response.body)["result"] == [1, 2]
+
+    metrics = service.get_metrics()["executors"]
+    assert metrics["cpu"]["completed"] == 1
+    assert metrics["cpu"]["queued"] == 0
+    assert metrics["io"]["completed"] == 1
+
+
+def test_process_executor_recycles_workers():
+    executor = ProcessExecutor("recycled", max_workers=1, max_tasks_per_worker=2)
+    try:
+        pids = [executor.submit(os.getpid).result() for _ in range(5)]
+    finally:
+        executor.shutdown()
+
+    assert len(set(pids)) == 3
+    metrics = executor.get_metrics()
+    assert metrics["recycled"] == 2
+    assert metrics["completed"] == 5
+    assert executor.get_queue_depth() == 0
+
+
+def run_ordered(executor, priorities, delay=0.0):
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    futures = [executor.schedule(block)]
+    started.wait(5)
+    for index, priority in enumerate(priorities):
+        futures.append(executor.schedule(lambda index=index: order.append(index), priority))
+        time.sleep(delay)
+    release.set()
+    for future in futures:
+        future.result(5)
+    return order
+
+
+def test_priorities():
+    executor = ThreadExecutor("priorities", max_workers=1)
+    try:
+        order = run_ordered(executor, [PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH,
+                                       PRIORITY_LOW, PRIORITY_HIGH])
+    finally:
+        executor.shutdown()
+
+    assert order == [2, 4, 1, 0, 3]
+    queue_wait = executor.get_metrics()["queue_wait"]
+    assert queue_wait[PRIORITY_HIGH]["count"] == 2
+    assert queue_wait[PRIORITY_NORMAL]["count"] == 2
+    assert queue_wait[PRIORITY_LOW]["count"] == 2
+    assert queue_wait[PRIORITY_LOW]["max"] >= queue_wait[PRIORITY_HIGH]["max"]
+
+
+def test_priority_aging():
+    executor = ThreadExecutor("aging", max_workers=1, aging_interval=0.02)
+    try:
+        # the low priority task waited more than two aging intervals
+        order = run_ordered(executor, [PRIORITY_LOW, PRIORITY_HIGH], delay=0.1)
+    finally:
+        executor.shutdown()
+
+    assert order == [0, 1]
+
+
+def test_expired_tasks_are_dropped():
+    executor = ThreadExecutor("deadlines", max_workers=1)
+    release = threading.Event()
+    try:
+        blocking = executor.schedule(lambda: release.wait(5))
+        expired = executor.schedule(lambda: "late", deadline=time.monotonic() + 0.01)
+        time.sleep(0.05)
+        release.set()
+        blocking.result(5)
+        with pytest.raises(DeadlineExceededError):
+            expired.result(5)
+    finally:
+        executor.shutdown()
+
+    assert executor.get_metrics()["expired"] == 1
+
+
+def test_coroutines_can_not_use_executors():
+    class InvalidService(MicroService):
+        name = "test.executors.invalid"
+
+        @exposed_method(executor="process")
+        async def native(self):
+            return 1
+
+    with pytest.raises(ServiceConfigurationError):
+        InvalidService()._initial_setup()
+
+
+def test_duplicate_executor_names():
+    class DuplicateService(MicroService):
+        name = "test.executors.duplicate"
+        executors = [ThreadExecutor("default")]
+
+    with pytest.raises(ServiceConfigurationError):
+        DuplicateService()
@@ -0,0 +1,165 @@
+import simplejson as json
+import pytest
+from tornado import gen
+from tornado.httpclient import HTTPError
+
+from gemstone.core import MicroService, exposed_method
+from gemstone.core.fairness import FairScheduler
+from gemstone.errors import ServerOverloadedError
+
+
+@pytest.mark.gen_test
+def test_deficit_round_robin():
+    scheduler = FairScheduler(max_concurrency=1, weights={"a": 2})
+    order = []
+
+    @gen.coroutine
+    def call(identity):
+        yield scheduler.acquire(identity)
+        order.append(identity)
+
+    yield scheduler.acquire("x")
+    waiters = [call("a") for _ in range(4)] + [call("b") for _ in range(4)]
+    assert scheduler.get_metrics()["queued"] == 8
+
+    current = "x"
+    for step in range(8):
+        scheduler.release(current)
+        while len(order) <= step:
+            yield gen.moment
+        current = order[-1]
+    scheduler.release(current)
+    yield waiters
+
+    assert order == ["a", "a", "b", "a", "a", "b", "b", "b"]
+    assert scheduler.get_metrics()["clients"] == {}
+
+
+@pytest.mark.gen_test
+def test_cancelled_waiters_leave_the_queue():
+    scheduler = FairScheduler(max_concurrency=1)
+
+    yield scheduler.acquire("a")
+    cancelled = scheduler.acquire("b")
+    queued = scheduler.acquire("c")
+    assert cancelled.cancel()
+    yield gen.moment
+    assert scheduler.get_metrics()["clients"] == {
+        "a": {"in_flight": 1, "queued": 0},
+        "c": {"in_flight": 0, "queued": 1}
+    }
+
+    scheduler.release("a")
+    yield queued
+    scheduler.release("c")
+    assert scheduler.get_metrics()["in_flight"] == 0
+    assert scheduler.get_metrics()["clients"] == {}
+
+
+@pytest.mark.gen_test
+def test_per_client_limits():
+    scheduler = FairScheduler(max_concurrency=2, max_in_flight_per_client=1,
+                              max_queued_per_client=1, retry_after=3)
+
+    yield scheduler.acquire("a")
+    queued = scheduler.acquire("a")
+    with pytest.raises(ServerOverloadedError) as exc_info:
+        yield scheduler.acquire("a")
+    assert exc_info.value.to_data() == {"reason": "client", "retry_after": 3}
+
+    # the other clients are not affected
+    yield scheduler.acquire("b")
+    assert scheduler.get_metrics()["clients"] == {
+        "a": {"in_flight": 1, "queued": 1},
+        "b": {"in_flight": 1, "queued": 0}
+    }
+
+    scheduler.release("a")
+    yield queued
+    scheduler.release("a")
+    scheduler.release("b")
+    assert scheduler.get_metrics()["in_flight"] == 0
+    assert scheduler.get_metrics()["rejected"] == 1
+
+
+class FairService(MicroService):
+    name = "test.fairness"
+
+    fair_scheduler = FairScheduler(max_concurrency=4, max_in_flight_per_client=1,
+                                   max_queued_per_client=0)
+
+    def get_client_identity(self, handler):
+        return handler.request.headers.get("X-Client")
+
+    def __init__(self, *args, **kwargs):
+        super(FairService, self).__init__(*args, **kwargs)
+        self.calls = []
+
+    @exposed_method()
+    async def slow(self):
+        await gen.sleep(0.05)
+        return "done"
+
+    @exposed_method()
+    async def hold(self, name, seconds):
+        self.calls.append(name)
+        await gen.sleep(seconds)
+        return name
+
+
+@pytest.fixture
+def service():
+    service = FairService()
+    service._initial_setup()
+    return service
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+@pytest.mark.gen_test
+def test_noisy_client_is_throttled(http_client, base_url, service):
+    batch = [{"jsonrpc": "2.0", "method": "slow", "id": 1},
+             {"jsonrpc": "2.0", "method": "slow", "id": 2}]
+    single = {"jsonrpc": "2.0", "method": "slow", "id": 3}
+
+    responses = yield [
+        http_client.fetch(base_url + "/api", method="POST", body=json.dumps(batch),
+                          headers={"content-type": "application/json", "X-Client": "noisy"}),
+        http_client.fetch(base_url + "/api", method="POST", body=json.dumps(single),
+                          headers={"content-type": "application/json", "X-Client": "quiet"})
+    ]
+    batch_responses = {item["id"]: item for item in json.loads(responses[0].body)}
+
+    assert batch_responses[1]["result"] == "done"
+    assert batch_responses[2]["error"]["data"]["reason"] == "client"
+    assert json.loads(responses[1].body)["result"] == "done"
+
+
+@pytest.mark.gen_test
+def test_queued_calls_of_closed_connections_never_run(http_client, base_url, service):
+    service.fair_scheduler = FairScheduler(max_concurrency=1)
+
+    def call(client, name, seconds, **kwargs):
+        body = {"jsonrpc": "2.0", "method": "hold", "params": [name, seconds], "id": 1}
+        return http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                                 headers={"content-type": "application/json",
+                                          "X-Client": client}, **kwargs)
+
+    running = call("a", "running", 0.3)
+    with pytest.raises(HTTPError):
+        yield call("b", "abandoned", 0, request_timeout=0.1)
+
+    for _ in range(50):
+        if not service.fair_scheduler.get_metrics()["queued"]:
+            break
+        yield gen.sleep(0.01)
+    assert service.fair_scheduler.get_metrics()["queued"] == 0
+
+    response = yield running
+    assert json.loads(response.body)["result"] == "running"
+    yield gen.sleep(0.05)
+    assert service.calls == ["running"]
+    assert service.get_metrics()["admission"]["cancelled_calls"] == 1
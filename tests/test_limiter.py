@@ -0,0 +1,126 @@
+import time
+
+import simplejson as json
+import pytest
+from tornado import gen
+
+from gemstone.core import MicroService, exposed_method
+from gemstone.core.executors import ThreadExecutor
+from gemstone.core.limiter import AdaptiveConcurrencyLimiter
+from gemstone.core.local import LocalService
+from gemstone.errors import ServerOverloadedError
+
+
+def test_limiter_aimd():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, min_limit=1, max_limit=3,
+                                         latency_threshold=0.1, backoff_ratio=0.5)
+    limiter.in_flight = 2
+
+    limiter.release(0.01)
+    assert limiter.limit == 3
+    limiter.in_flight += 1
+    limiter.release(0.01)
+    assert limiter.limit == 3
+
+    limiter.release(0.5)
+    assert limiter.limit == 1
+    limiter.in_flight += 1
+    limiter.release(0.01, dropped=True)
+    assert limiter.limit == 1
+
+    assert limiter.get_metrics() == {"limit": 1, "in_flight": 0, "waiting": 0, "rejected": 0,
+                                     "increases": 1, "decreases": 2}
+
+
+@pytest.mark.gen_test
+def test_limiter_queues_briefly():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1, max_wait=0.5)
+    yield limiter.acquire()
+
+    waiter = limiter.acquire()
+    yield gen.moment
+    assert limiter.waiting == 1
+    limiter.release(0.01)
+    yield waiter
+    assert limiter.in_flight == 1
+
+    limiter.max_wait = 0
+    with pytest.raises(ServerOverloadedError):
+        yield limiter.acquire()
+    assert limiter.rejected == 1
+
+
+class LimitedService(MicroService):
+    name = "test.limiter"
+
+    concurrency_limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1, max_wait=0)
+
+    @exposed_method()
+    async def slow(self):
+        await gen.sleep(0.05)
+        return "done"
+
+
+@pytest.fixture
+def service():
+    service = LimitedService()
+    service._initial_setup()
+    return service
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+@pytest.mark.gen_test
+def test_calls_over_the_limit_are_shed(http_client, base_url, service):
+    batch = [{"jsonrpc": "2.0", "method": "slow", "id": 1},
+             {"jsonrpc": "2.0", "method": "slow", "id": 2}]
+    response = yield http_client.fetch(base_url + "/api", method="POST", body=json.dumps(batch),
+                                       headers={"content-type": "application/json"})
+    responses = {item["id"]: item for item in json.loads(response.body)}
+
+    assert responses[1]["result"] == "done"
+    assert responses[2]["error"]["code"] == -32003
+    assert responses[2]["error"]["data"]["reason"] == "limiter"
+
+    metrics = service.get_metrics()["concurrency_limiter"]
+    assert metrics["limit"] == 1
+    assert metrics["in_flight"] == 0
+    assert metrics["rejected"] == 1
+
+
+class DownstreamRejectionService(MicroService):
+    name = "test.limiter.downstream"
+
+    # the calls are admitted, then rejected by the limiter of the executor
+    executors = [ThreadExecutor("single", max_workers=2, limiter=AdaptiveConcurrencyLimiter(
+        initial_limit=1, max_limit=1, max_wait=0))]
+
+    def __init__(self, *args, **kwargs):
+        super(DownstreamRejectionService, self).__init__(*args, **kwargs)
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=4,
+                                                              latency_threshold=10)
+
+    @exposed_method(executor="single")
+    def blocking(self):
+        time.sleep(0.05)
+        return "done"
+
+
+@pytest.mark.gen_test
+def test_downstream_rejections_lower_the_limit():
+    service = DownstreamRejectionService()
+    service._initial_setup()
+    proxy = LocalService(service)
+    try:
+        results = yield [proxy.call("blocking"), proxy.call("blocking")]
+    finally:
+        service.get_executor("single").shutdown()
+
+    assert sorted(str(result.error and result.error["data"]["reason"]) for result in results) \
+        == ["None", "limiter"]
+    metrics = service.get_metrics()["concurrency_limiter"]
+    assert metrics["decreases"] == 1
+    assert metrics["limit"] < 4
@@ -0,0 +1,129 @@
+import pytest
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from gemstone.client.structs import MethodCall, Notification
+from gemstone.core import MicroService, exposed_method
+from gemstone.core.local import LocalService, local_registry
+from gemstone.errors import DeadlineExceededError
+
+
+class TargetService(MicroService):
+    name = "test.local.target"
+
+    def __init__(self, *args, **kwargs):
+        super(TargetService, self).__init__(*args, **kwargs)
+        self.notified = []
+
+    @exposed_method()
+    def add(self, a, b):
+        return a + b
+
+    @exposed_method()
+    def append(self, items):
+        items.append("target")
+        return items
+
+    @exposed_method(private=True)
+    async def secret(self):
+        return "secret"
+
+    @exposed_method()
+    async def slow(self):
+        await gen.sleep(1)
+
+    @exposed_method()
+    def notified_with(self, value):
+        self.notified.append(value)
+
+
+class CallerService(MicroService):
+    name = "test.local.caller"
+    local_dispatch = True
+    local_copy_on_call = True
+
+
+@pytest.fixture
+def target():
+    service = TargetService()
+    service._initial_setup()
+    local_registry.register(service)
+    yield service
+    local_registry.unregister(service)
+
+
+@pytest.mark.gen_test
+def test_get_service_returns_local_proxy(io_loop, target):
+    caller = CallerService()
+    proxy = caller.get_service("test.local.*")
+    assert isinstance(proxy, LocalService)
+    assert proxy.microservice is target
+    assert proxy.copy_on_call
+    assert proxy.caller == "test.local.caller"
+
+    result = yield io_loop.run_in_executor(None, proxy.call_method, "add", [1, 2])
+    assert result.result == 3
+    assert result.error is None
+
+    # the coroutines use call()
+    result = yield proxy.call("add", {"a": 2, "b": 3})
+    assert result.result == 5
+    with pytest.raises(RuntimeError):
+        proxy.call_method("add", [1, 2])
+
+    # the in-process calls are trusted
+    result = yield proxy.call("secret")
+    assert result.result == "secret"
+
+    result = yield proxy.call("missing")
+    assert result.error["code"] == -32601
+
+
+@pytest.mark.gen_test
+def test_copy_on_call(io_loop, target):
+    items = ["caller"]
+    shared = LocalService(target)
+    result = yield shared.call("append", [items])
+    assert result.result is items
+    assert items == ["caller", "target"]
+
+    items = ["caller"]
+    copied = LocalService(target, copy_on_call=True)
+    result = yield copied.call("append", [items])
+    assert result.result == ["caller", "target"]
+    assert items == ["caller"]
+
+
+@pytest.mark.gen_test
+def test_local_batch_notifications_and_deadlines(io_loop, target):
+    proxy = LocalService(target)
+    first, second = MethodCall("add", [1, 1]), MethodCall("add", [2, 2])
+    batch = yield io_loop.run_in_executor(
+        None, proxy.call_batch, first, Notification("notified_with", ["x"]), second)
+    assert len(batch) == 2
+    assert batch.get_response_for_call(first).result == 2
+    assert batch.get_response_for_call(second).result == 4
+
+    async_call = yield io_loop.run_in_executor(None, proxy.call_method_async, "add", [3, 3])
+    yield io_loop.run_in_executor(None, async_call.result, True)
+    assert async_call.result().result == 6
+
+    proxy.notify("notified_with", ["y"])
+    while len(target.notified) < 2:
+        yield gen.sleep(0.01)
+    assert sorted(target.notified) == ["x", "y"]
+
+    result = yield LocalService(target, timeout=0.05).call("slow")
+    assert result.error["code"] == -32005
+
+
+def test_blocking_calls_time_out(target):
+    # the IOLoop of the target service does not run
+    target.io_loop = IOLoop(make_current=False)
+    try:
+        with pytest.raises(DeadlineExceededError):
+            LocalService(target, timeout=0.05).call_method("add", [1, 2])
+        with pytest.raises(DeadlineExceededError):
+            LocalService(target, timeout=0.05).call_batch(MethodCall("add", [1, 2]))
+    finally:
+        target.io_loop.close()
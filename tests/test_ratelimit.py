@@ -0,0 +1,118 @@
+import simplejson as json
+import pytest
+
+from gemstone.core import MicroService, exposed_method
+from gemstone.core import ratelimit
+from gemstone.core.ratelimit import TokenBucketLimiter, parse_rate
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def test_parse_rate():
+    assert parse_rate("100/s") == (100.0, 1)
+    assert parse_rate("30 / minute") == (30.0, 60)
+    assert parse_rate("0.5/h") == (0.5, 3600)
+
+    for invalid in ("100", "100/d", "-1/s", "0/s", "a/s"):
+        with pytest.raises(ValueError):
+            parse_rate(invalid)
+
+
+def test_token_bucket(clock):
+    limiter = TokenBucketLimiter("2/s", burst=3)
+
+    assert [limiter.acquire() for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire() == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert limiter.acquire() == 0
+    assert limiter.acquire() == pytest.approx(0.5)
+
+    # the buckets are independent
+    assert limiter.acquire("other") == 0
+    assert limiter.get_metrics() == {"rate": "2/s", "burst": 3, "allowed": 5, "rejected": 2,
+                                     "keys": 2}
+
+
+def test_idle_buckets_are_evicted(clock):
+    limiter = TokenBucketLimiter("1/s", burst=2)
+    limiter.acquire("a")
+    clock.now += 1
+    limiter.acquire("b")
+
+    clock.now += 1.5
+    limiter.acquire("c")
+    # "a" was full again, so it was discarded
+    assert list(limiter._buckets) == ["b", "c"]
+
+    clock.now += 10
+    limiter.acquire("c")
+    assert list(limiter._buckets) == ["c"]
+
+
+class RateLimitedService(MicroService):
+    name = "test.ratelimit"
+
+    rate_limit = "1/h"
+
+    def get_client_identity(self, handler):
+        return handler.request.headers.get("X-Client")
+
+    @exposed_method(rate_limit="2/h", rate_limit_per_client=True)
+    def per_client(self):
+        return "ok"
+
+    @exposed_method()
+    def default_limit(self):
+        return "ok"
+
+
+@pytest.fixture
+def service():
+    service = RateLimitedService()
+    service._initial_setup()
+    return service
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+@pytest.mark.gen_test
+def test_rate_limited_calls(http_client, base_url, service):
+    results = []
+    for method, client in [("per_client", "a"), ("per_client", "a"), ("per_client", "a"),
+                           ("per_client", "b"), ("default_limit", "a"),
+                           ("default_limit", "b")]:
+        body = {"jsonrpc": "2.0", "method": method, "id": 1}
+        response = yield http_client.fetch(base_url + "/api", method="POST",
+                                           body=json.dumps(body),
+                                           headers={"content-type": "application/json",
+                                                    "X-Client": client})
+        results.append(json.loads(response.body))
+
+    assert [item["result"] for item in results] == ["ok", "ok", None, "ok", "ok", None]
+
+    error = results[2]["error"]
+    assert error["code"] == -32004
+    assert error["message"] == "Rate limit exceeded"
+    assert error["data"]["limit"] == "2/h"
+    assert 0 < error["data"]["retry_after"] <= 1800
+
+    metrics = service.get_metrics()["rate_limits"]
+    assert metrics["per_client"]["keys"] == 2
+    assert metrics["default_limit"]["rejected"] == 1
@@ -0,0 +1,115 @@
+import simplejson as json
+import pytest
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.httpclient import HTTPError
+
+from gemstone.core import MicroService, exposed_method
+from gemstone.core.singleflight import SingleFlightGroup
+
+
+@pytest.mark.gen_test
+def test_single_flight_group():
+    group = SingleFlightGroup()
+    futures = []
+
+    def make_future():
+        futures.append(Future())
+        return futures[-1]
+
+    first = group.run("key", make_future)
+    second = group.run("key", make_future)
+    other = group.run("other", make_future)
+
+    assert first is second
+    assert first is not other
+    assert group.get_metrics() == {"in_flight": 2, "executions": 2, "shared": 1}
+
+    futures[0].set_result(1)
+    futures[1].set_result(2)
+    yield gen.moment
+
+    assert group.get_metrics()["in_flight"] == 0
+    third = group.run("key", make_future)
+    assert third is not first
+
+
+class SingleFlightService(MicroService):
+    name = "test.single_flight"
+
+    def __init__(self, *args, **kwargs):
+        super(SingleFlightService, self).__init__(*args, **kwargs)
+        self.calls = 0
+
+    @exposed_method(single_flight=True)
+    async def expensive(self, key):
+        self.calls += 1
+        await gen.sleep(0.05)
+        return "value-{}".format(key)
+
+
+@pytest.fixture
+def service():
+    service = SingleFlightService()
+    service._initial_setup()
+    return service
+
+
+@pytest.fixture
+def app(service):
+    return service.make_tornado_app()
+
+
+@pytest.mark.gen_test
+def test_single_flight_batch_and_concurrent_requests(http_client, base_url, service):
+    batch = [{"jsonrpc": "2.0", "method": "expensive", "params": ["a"], "id": i}
+             for i in range(1, 6)]
+    batch.append({"jsonrpc": "2.0", "method": "expensive", "params": {"key": "b"}, "id": 6})
+    single = {"jsonrpc": "2.0", "method": "expensive", "params": {"key": "a"}, "id": "x"}
+
+    responses = yield [
+        http_client.fetch(base_url + "/api", method="POST", body=json.dumps(batch),
+                          headers={"content-type": "application/json"}),
+        http_client.fetch(base_url + "/api", method="POST", body=json.dumps(single),
+                          headers={"content-type": "application/json"})
+    ]
+    batch_body = json.loads(responses[0].body)
+    single_body = json.loads(responses[1].body)
+
+    assert sorted(item["id"] for item in batch_body) == list(range(1, 7))
+    for item in batch_body:
+        assert item["result"] == ("value-b" if item["id"] == 6 else "value-a")
+    assert single_body["id"] == "x"
+    assert single_body["result"] == "value-a"
+
+    assert service.calls == 2
+    assert service.get_metrics()["single_flight"]["expensive"]["shared"] == 5
+
+
+@pytest.mark.gen_test
+def test_single_flight_callers_deadlines_and_disconnects(http_client, base_url, service):
+    # the first caller gives up before the shared execution finishes
+    batch = [{"jsonrpc": "2.0", "method": "expensive", "params": ["a"], "id": 1,
+              "timeout": 0.01},
+             {"jsonrpc": "2.0", "method": "expensive", "params": ["a"], "id": 2}]
+    response = yield http_client.fetch(base_url + "/api", method="POST",
+                                       body=json.dumps(batch),
+                                       headers={"content-type": "application/json"})
+    results = {item["id"]: item for item in json.loads(response.body)}
+    assert results[1]["error"]["code"] == -32005
+    assert results[2]["result"] == "value-a"
+    assert service.calls == 1
+
+    # the first caller disconnects
+    body = {"jsonrpc": "2.0", "method": "expensive", "params": ["b"], "id": 1}
+    abandoned = http_client.fetch(base_url + "/api", method="POST", body=json.dumps(body),
+                                  headers={"content-type": "application/json"},
+                                  request_timeout=0.02)
+    yield gen.sleep(0.005)
+    response = yield http_client.fetch(base_url + "/api", method="POST",
+                                       body=json.dumps(body),
+                                       headers={"content-type": "application/json"})
+    with pytest.raises(HTTPError):
+        yield abandoned
+    assert json.loads(response.body)["result"] == "value-b"
+    assert service.calls == 2
@@ -1,7 +1,7 @@
 import pytest
 
 from gemstone.core.structs import JsonRpcParseError, JsonRpcInvalidRequestError, JsonRpcRequest, \
-    JsonRpcResponse, JsonRpcRequestBatch, JsonRpcResponseBatch
+    JsonRpcResponse, JsonRpcRequestBatch, JsonRpcResponseBatch, GenericResponse
 
 
 def test_jsonrpc_request_from_dict_ok():
@@ -179,3 +179,14 @@ def test_jsonrpc_request_batch_valid():
     assert [x.id for x in parsed.iter_items()] == [1, 2, 3]
     assert set([x.method for x in parsed.iter_items()]) == {"test"}
     assert [x.params for x in parsed.iter_items()] == [{"a": 1, "b": 2}, {"a": 3, "b": 4}, {"a": 5, "b": 6}]
+
+
+def test_generic_error_responses_are_not_shared():
+    first = GenericResponse.error(GenericResponse.INTERNAL_ERROR, id=1, data={"info": "x"})
+    second = GenericResponse.error(GenericResponse.INTERNAL_ERROR, id=2)
+
+    assert first.to_dict()["error"]["data"] == {"info": "x"}
+    assert second.to_dict() == {"jsonrpc": "2.0", "result": None, "id": 2,
+                                "error": {"code": -32603, "message": "Internal error"}}
+    assert GenericResponse.INTERNAL_ERROR.id is None
+    assert "data" not in GenericResponse.INTERNAL_ERROR.error
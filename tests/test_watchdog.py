@@ -0,0 +1,72 @@
+import time
+
+import pytest
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
+
+from gemstone.core import MicroService
+from gemstone.core.watchdog import IOLoopWatchdog
+
+
+def blocking_callback():
+    time.sleep(0.3)
+
+
+@pytest.mark.gen_test
+def test_watchdog_measures_lag_and_detects_blocking(io_loop):
+    watchdog = IOLoopWatchdog(io_loop, interval=0.01, threshold=0.1)
+    watchdog.start()
+
+    yield gen.sleep(0.1)
+    blocking_callback()
+    yield gen.sleep(0.1)
+    watchdog.stop()
+
+    metrics = watchdog.get_metrics()
+    assert metrics["lag"]["samples"] > 0
+    assert metrics["lag"]["p50"] <= metrics["lag"]["p99"] <= metrics["lag"]["max"]
+    assert metrics["lag"]["max"] >= 0.1
+
+    assert metrics["blocking"]["count"] == 1
+    incident = metrics["blocking"]["incidents"][0]
+    assert incident["duration"] >= 0.1
+    assert any("blocking_callback" in line for line in incident["stack"])
+
+
+@pytest.mark.gen_test
+def test_watchdog_no_blocking(io_loop):
+    watchdog = IOLoopWatchdog(io_loop, interval=0.01, threshold=0.2)
+    watchdog.start()
+    yield gen.sleep(0.1)
+    watchdog.stop()
+
+    metrics = watchdog.get_metrics()
+    assert metrics["lag"]["samples"] > 0
+    assert metrics["blocking"]["count"] == 0
+
+
+def test_watchdog_invalid_parameters(io_loop):
+    with pytest.raises(ValueError):
+        IOLoopWatchdog(io_loop, interval=0)
+
+
+def test_watchdog_stops_with_the_service():
+    class WatchedService(MicroService):
+        name = "test.watchdog"
+        io_loop_watchdog_interval = 0.01
+
+    io_loop = IOLoop(make_current=False)
+    sockets = bind_sockets(0, address="127.0.0.1")
+    try:
+        service = WatchedService(io_loop=io_loop)
+        io_loop.call_later(0.1, io_loop.stop)
+        service._serve({"http": sockets, "tcp_transport": []})
+
+        watchdog = service.io_loop_watchdog
+        watchdog._watch_thread.join(1)
+        assert not watchdog._watch_thread.is_alive()
+    finally:
+        for sock in sockets:
+            sock.close()
+        io_loop.close(all_fds=True)